@@ -5,6 +5,7 @@ import sys, os
 from filehandling import BatchProcess
 from particletracker.suppress_warnings import *
 from particletracker.project import PTWorkflow
+from particletracker.project.batch import run_batch
 from particletracker.gui.main_gui import MainWindow
 
 
@@ -50,7 +51,7 @@ def track_gui(movie_filename=None, settings_filename=None):
 
 
 
-def batchprocess(moviefilter, settings_filename=None):
+def batchprocess(moviefilter, settings_filename=None, workers=1):
     '''
     batchprocess enables you to process all files specified with a filefilter using a single settings.param file
 
@@ -58,14 +59,15 @@ def batchprocess(moviefilter, settings_filename=None):
     ----------
     filefilter: This is a full filename including filepath which may include wildcard characters
     paramfile: This is a full filename including filepath for a .param config file
+    workers: Number of movies to process at the same time in separate processes. 
+        The default of 1 processes the movies one after another.
 
-    Returns None
+    The outcome of each movie is recorded in _temp/batchprocess_manifest.json. A movie that 
+    fails does not stop the batch and if the batch is run again movies already processed with 
+    the same settings are skipped.
+
+    Returns BatchManifest
     -------
 
     '''
-
-    for filename in BatchProcess(moviefilter):
-        tracker = PTWorkflow(video_filename=filename, param_filename=settings_filename)
-        tracker.process()
-
-
+    return run_batch(list(BatchProcess(moviefilter)), settings_filename=settings_filename, workers=workers)
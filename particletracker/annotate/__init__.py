@@ -1,13 +1,17 @@
 from tqdm import tqdm
 import os
 
+import cv2
 import numpy as np
 
-from labvision.video import WriteVideo
 from labvision.images.basics import display
 
 from ..annotate import annotation_methods as am
-from ..general.parameters import get_method_name, get_param_val, get_method_key
+from ..general.parameters import get_param_val, MethodChain, compile_methods
+from ..general.dataframes import FrameSlicer, required_columns
+from .render import render_frames, render_scale
+from .encoder import open_video_sink
+from .overlay import OverlayWriter, movie_output
 
 
 
@@ -19,53 +23,76 @@ class TrackingAnnotator:
         self.data=data
         self.pp_store = data.post_store
         self.output_filename = self.cap.filename[:-4] + '_annotate.mp4'
+        self.overlay_filename = self.cap.filename[:-4] + '_overlay.hdf5'
+        self.methods = MethodChain(am, 'annotate')
 
-    def annotate(self, f_index=None, lock_part=-1):  
+    def annotate(self, f_index=None, lock_part=-1, df=None):  
+        """df is the single frame dataframe handed over by the postprocessor. It
+        is ignored when processing the whole movie or if postprocessing is locked."""
         print("Annotating...") 
-        video_output = get_param_val(self.parameters['config']['video_output']['output'])
+        output = movie_output(self.parameters)
+        video_output = output == 'video'
         
         #If no movie is requested and processing whole then return nothing
-        if f_index is None and not video_output:
+        if f_index is None and output is None:
             return None
         
         #If whole movie and want video
         if f_index is None and video_output:
-            scale= get_param_val(self.parameters['config']['video_output']['scale'])
-            output_vid=WriteVideo(self.output_filename, frame=self.cap.read_frame(n=0), scale=scale)
+            output_vid=self.open_video()
 
         #whole movie
         if f_index is None:
             start = self.cap.frame_range[0]
             stop = self.cap.frame_range[1]
             step = self.cap.frame_range[2]
-            df = self.pp_store.df
+            df = self.load_data()
         else:
             start=f_index
             stop=f_index+1
             step=1
-            #If postprocessing is locked read the full dataframe _postprocess.hdf5 otherwise use _temp.hdf5
+            #If postprocessing is locked read the full dataframe _postprocess.hdf5 otherwise use the handed over frame
             if lock_part==2:
-                df = self.pp_store.df
-                create_temp_hdf(self.pp_store, f_index)
-            else:
-                self.pp_store.clear_temp_df()
-                df = self.pp_store.temp_df
+                df = self.load_data()
+
+        #The shapes can be recorded in an overlay file rather than drawn into a new video
+        if f_index is None and output == 'overlay':
+            self.export_overlay(df, range(start, stop, step))
+            return
+
+        #A whole movie can be drawn at the size of the output video rather than full size
+        scale = render_scale(self.parameters) if f_index is None else 1
+
+        #Whole movie can be rendered by several processes
+        workers = self.parameters['config'].get('_annotate_workers', 1)
+        if f_index is None and workers > 1:
+            progress = tqdm(render_frames(self.cap.filename, self.parameters, df,
+                                          range(start, stop, step), workers=workers, scale=scale),
+                            'Annotating', total=len(range(start, stop, step)))
+            for f, frame in progress:
+                output_vid.add_frame(frame)
+                progress.set_postfix_str(output_vid.status(), refresh=False)
+            output_vid.close()
+            print('Annotation complete')
+            return
 
         self.cap.set_frame(start)
 
+        #Find where each frame's data is once rather than searching the full dataframe every frame
+        frames_df = FrameSlicer(df)
+        #State kept between frames of a whole movie eg trajectory tails
+        cache = {} if f_index is None else None
+
         #Do the annotation
-        for f in tqdm(range(start, stop, step), 'Annotating'):
-            frame = self.cap.read_frame()
-            
-            try:
-                for method in self.parameters['annotate']['annotate_method']:
-                    method_name, call_num = get_method_name(method)
-                    frame = getattr(am, method_name)(df.copy(), frame, f_index=f, parameters=self.parameters, call_num=call_num, section='annotate')
-            except:
-                print('No data to annotate')
-
-            if f_index is None and video_output:
-                output_vid.add_frame(frame)
+        progress = tqdm(range(start, stop, step), 'Annotating')
+        with self.fixed():
+            for f in progress:
+                frame = self.cap.read_frame()
+                frame = self.annotate_frame(frames_df, frame, f, cache=cache, scale=scale)
+
+                if f_index is None and video_output:
+                    output_vid.add_frame(frame)
+                    progress.set_postfix_str(output_vid.status(), refresh=False)
 
         # close movie or return annotated frame
         if f_index is None and video_output:
@@ -74,6 +101,78 @@ class TrackingAnnotator:
         else:
             return frame
 
-def create_temp_hdf(pp_store, f_index):
-    df = pp_store.get_df(f_index=f_index)
-    df.to_hdf(pp_store.temp_filename, key='data')
\ No newline at end of file
+    def load_data(self):
+        """Loads the postprocessed data for the whole movie. Only the columns the annotation
+        methods use are read unless one of them doesn't declare its columns (see uses_columns)"""
+        return self.pp_store.load_columns(required_columns(am, self.parameters, 'annotate'))
+
+    def open_video(self):
+        """Creates the writer for the annotated movie. Frames are encoded on a background 
+        thread by the encoder selected in config['video_output'] (see encoder.py)"""
+        return open_video_sink(self.output_filename, self.cap.read_frame(n=0), self.parameters)
+
+    def open_overlay(self):
+        """Creates the writer for an overlay file (see overlay.py)"""
+        return OverlayWriter(self.overlay_filename, np.shape(self.cap.read_frame(n=0)))
+
+    def export_overlay(self, df, frames):
+        """Records the annotations of frames in an overlay file. No video is decoded or encoded."""
+        overlay = self.open_overlay()
+        frames_df = FrameSlicer(df)
+        cache = {}
+        with self.fixed():
+            for f in tqdm(frames, 'Annotating'):
+                self.annotate_frame(frames_df, overlay.canvas(f), f, cache=cache)
+        overlay.close()
+        print('Annotation complete')
+
+    def annotate_frame(self, df, frame, f_index, cache=None, scale=1):
+        """Applies all the annotation methods to a single frame"""
+        return annotate_frame(df, frame, f_index, self.parameters, cache=cache, scale=scale,
+                              methods=self.methods.compile(self.parameters))
+
+    def fixed(self):
+        """Context in which the annotation methods are compiled once eg for a whole movie (see MethodChain)"""
+        return self.methods.fixed(self.parameters)
+
+
+def annotate_frame(df, frame, f_index, parameters, cache=None, scale=1, methods=None):
+    """Applies all the annotation methods to a single frame
+    
+    df is either a dataframe or a FrameSlicer of one. frame can also be an OverlayCanvas
+    in which case the shapes are recorded rather than drawn (see overlay.py). Each method is given only the rows
+    for frame f_index or for methods with a span, the rows of the frames within span/2
+    of f_index. This is a function rather than a method so that worker processes 
+    can use it (see render.py). 
+    
+    cache is a dictionary methods can use to keep data between consecutive frames 
+    of a movie. It should be None when frames are annotated in no particular order.
+    
+    If scale is not 1 the frame is resized by scale before anything is drawn and the 
+    methods draw in scaled coordinates with scaled line widths and font sizes. The 
+    returned frame is then the resized frame.
+    
+    methods is the list of compiled annotation methods (see compile_methods). If None 
+    they are compiled from parameters for this frame."""
+    if not isinstance(df, FrameSlicer):
+        df = FrameSlicer(df)
+    if scale != 1:
+        frame = resize_frame(frame, scale)
+    try:
+        if methods is None:
+            methods = compile_methods(am, parameters, 'annotate')
+        for method in methods:
+            if method.half_span is not None:
+                df_method = df.window(f_index - method.half_span, f_index + method.half_span)
+            else:
+                df_method = df.frame(f_index)
+            frame = method(df_method, frame, f_index=f_index, cache=cache, scale=scale)
+    except:
+        print('No data to annotate')
+    return frame
+
+
+def resize_frame(frame, scale):
+    """Shrinks a frame to the size it will have in the output video"""
+    h, w = frame.shape[:2]
+    return cv2.resize(frame, (int(w*scale), int(h*scale)), interpolation=cv2.INTER_AREA)
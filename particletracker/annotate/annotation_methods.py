@@ -1,3 +1,4 @@
+import collections
 import cv2
 import numpy as np
 import warnings
@@ -6,9 +7,10 @@ import pandas as pd
 
 from ..general.parameters import get_param_val, get_method_key, param_parse
 from .cmap import colour_array, place_colourbar_in_image
+from .primitives import draw_circles, draw_text, draw_lines, draw_arrows, fill_polygons
 from ..customexceptions import *
 from ..user_methods import *
-from ..general.dataframes import df_single, df_range
+from ..general.dataframes import df_single, df_range, uses_columns
 
 warnings.simplefilter('ignore')
 
@@ -21,6 +23,7 @@ Text annotation
 """
 @error_handling
 @param_parse
+@uses_columns()
 def text_label(_, frame, f_index=None, parameters=None, *args, **kwargs):
     """
     Text labels place a static label on an image at specific location.
@@ -68,17 +71,17 @@ def text_label(_, frame, f_index=None, parameters=None, *args, **kwargs):
     """
     text=parameters['text']
     position = parameters['position']
-    annotated_frame=cv2.putText(frame, text, position, cv2.FONT_HERSHEY_COMPLEX_SMALL,
-                                int(parameters['font_size']),
-                                parameters['font_colour'],
-                                int(parameters['font_thickness']),
-                                cv2.LINE_AA)
+    annotated_frame = draw_text(frame, [text], [position], parameters['font_colour'],
+                                font_size=int(parameters['font_size']),
+                                thickness=int(parameters['font_thickness']),
+                                scale=kwargs.get('scale', 1))
 
     return annotated_frame
 
 @error_handling
 @param_parse
 @df_single
+@uses_columns(column_params=('var_column',))
 def var_label(df_single, frame, f_index=None, parameters=None, *args, **kwargs):
     """
     Var labels puts text on an image at specific location for each frame. The value
@@ -137,17 +140,17 @@ def var_label(df_single, frame, f_index=None, parameters=None, *args, **kwargs):
         text = str(info)
     position = parameters['position']        
 
-    annotated_frame=cv2.putText(frame, text, position, cv2.FONT_HERSHEY_COMPLEX_SMALL,
-                                int(parameters['font_size']),
-                                parameters['font_colour'],
-                                int(parameters['font_thickness']),
-                                cv2.LINE_AA)
+    annotated_frame = draw_text(frame, [text], [position], parameters['font_colour'],
+                                font_size=int(parameters['font_size']),
+                                thickness=int(parameters['font_thickness']),
+                                scale=kwargs.get('scale', 1))
 
     return annotated_frame
 
 @error_handling
 @param_parse
 @df_single
+@uses_columns('x', 'y', column_params=('values_column',))
 def particle_labels(df_single, frame, f_index=None, parameters=None, *args, **kwargs):
     """
     Annotates image with particle info from one column. The most common use
@@ -206,13 +209,12 @@ def particle_labels(df_single, frame, f_index=None, parameters=None, *args, **kw
     if np.all(df_empty):
         return frame
 
-    for index, particle_val in enumerate(particle_values):
-        frame = cv2.putText(frame, str(particle_val), (int(float(x[index])), int(float(y[index]))),
-                            cv2.FONT_HERSHEY_COMPLEX_SMALL,
-                            int(parameters['font_size']),
-                            parameters['font_colour'],
-                            int(parameters['font_thickness']),
-                            cv2.LINE_AA)
+    xy = np.stack((x, y), axis=1).astype(np.float64)
+    frame = draw_text(frame, [str(particle_val) for particle_val in particle_values], xy,
+                      parameters['font_colour'],
+                      font_size=int(parameters['font_size']),
+                      thickness=int(parameters['font_thickness']),
+                      scale=kwargs.get('scale', 1))
 
     return frame
 
@@ -241,6 +243,7 @@ def _get_class_subset(df_frame, parameters):
 @error_with_hint(additional_message="HINT: Annotating boxes requires you to run contour_boxes in postprocessing. Did you forget?")
 @param_parse
 @df_single
+@uses_columns('box_pts', column_params=('classifier_column', 'cmap_column'))
 def boxes(df_single, frame, f_index=None, parameters=None, *args, **kwargs):
     """
     Boxes places a rotated rectangle on the image that encloses the contours of specified particles.
@@ -301,12 +304,15 @@ def boxes(df_single, frame, f_index=None, parameters=None, *args, **kwargs):
 
     (colours, colourbar) = colour_array(subset_df, f_index, parameters)
 
-    for index, box in enumerate(box_pts):
-        frame = _draw_contours(frame, box, col=colours[index],
-                                thickness=int(parameters['thickness']))
+    scale = kwargs.get('scale', 1)
+    boxes = [box[0] for box in box_pts]
+    if int(parameters['thickness']) == -1:
+        frame = fill_polygons(frame, boxes, colours, scale=scale)
+    else:
+        frame = draw_lines(frame, boxes, colours, thickness=int(parameters['thickness']), closed=True, scale=scale)
         
     if colourbar is not None:
-        frame = place_colourbar_in_image(frame, colourbar, parameters) 
+        frame = place_colourbar_in_image(frame, colourbar, parameters, scale=kwargs.get('scale', 1)) 
     return frame
 
 
@@ -321,6 +327,7 @@ def _contour_inside_img(sz, contour):
 @error_handling
 @param_parse
 @df_single
+@uses_columns(column_params=('xdata_column', 'ydata_column', 'rdata_column', 'classifier_column', 'cmap_column'))
 def circles(df_single, frame, f_index=None, parameters=None, *args, **kwargs):
     """
     Circles places a ring on every specified particle
@@ -396,19 +403,17 @@ def circles(df_single, frame, f_index=None, parameters=None, *args, **kwargs):
     
     (colours, colourbar) = colour_array(subset_df, f_index, parameters)
     
-    if np.shape(circles) == (3,):#One object
-        frame = cv2.circle(frame, (int(circles[0]), int(circles[1])), int(circles[2]), colours[0], int(thickness))
-    else:
-        for i, circle in enumerate(circles):
-            frame = cv2.circle(frame, (int(circle[0]), int(circle[1])), int(circle[2]), colours[i], int(thickness))
+    circles = np.reshape(circles, (-1, 3))
+    frame = draw_circles(frame, circles[:, :2], circles[:, 2], colours, thickness=int(thickness), scale=kwargs.get('scale', 1))
     
     if colourbar is not None:
-        frame = place_colourbar_in_image(frame, colourbar, parameters) 
+        frame = place_colourbar_in_image(frame, colourbar, parameters, scale=kwargs.get('scale', 1)) 
     return frame
 
 @error_handling
 @param_parse
 @df_single
+@uses_columns('contours', column_params=('classifier_column', 'cmap_column'))
 def contours(df_single, frame, f_index=None, parameters=None, *args, **kwargs):
     """
     Contours draws the tracked contour returned from Contours tracking
@@ -472,24 +477,27 @@ def contours(df_single, frame, f_index=None, parameters=None, *args, **kwargs):
 
     for index, contour in enumerate(contour_pts):
         frame = _draw_contours(frame, contour, col=colours[index],
-                                        thickness=int(thickness))
+                                        thickness=int(thickness), scale=kwargs.get('scale', 1))
     
     if colourbar is not None:
-        frame = place_colourbar_in_image(frame, colourbar, parameters) 
+        frame = place_colourbar_in_image(frame, colourbar, parameters, scale=kwargs.get('scale', 1)) 
     return frame
 
 @error_handling
-def _draw_contours(img, contours, col=(0,0,255), thickness=1):
-    if (np.size(np.shape(col)) == 0) | (np.size(np.shape(col)) == 1):
-        img = cv2.drawContours(img, contours, -1, col, thickness)
+def _draw_contours(img, contours, col=(0,0,255), thickness=1, scale=1):
+    #Same pixels as cv2.drawContours
+    contours = list(contours)
+    colours = np.broadcast_to(np.reshape(col, (-1, 3)), (len(contours), 3))
+    if thickness == -1:
+        img = fill_polygons(img, contours, colours, scale=scale)
     else:
-        for i, contour in enumerate(contours):
-            img = cv2.drawContours(img, contour, -1, col[i], int(thickness))
+        img = draw_lines(img, contours, colours, thickness=int(thickness), closed=True, scale=scale)
     return img        
 
 @error_with_hint(additional_message="HINT: To run networks you must have selected neighbours in postprocessing")
 @param_parse
 @df_single
+@uses_columns('x', 'y', 'particle', 'neighbours', column_params=('classifier_column', 'cmap_column'))
 def networks(df_single, frame, f_index=None, parameters=None, *args, **kwargs):
     """
     Networks draws a network of lines between particles
@@ -541,26 +549,50 @@ def networks(df_single, frame, f_index=None, parameters=None, *args, **kwargs):
     
     """
     df = _get_class_subset(df_single, parameters)
-    df=df.set_index('particle')
-    particle_ids = df.index.values
     (colours, colourbar) = colour_array(df, f_index, parameters)
     thickness = parameters['thickness']
 
-    for index, particle in enumerate(particle_ids):
-        pt = df.loc[particle, ['x', 'y']].values
-        pt1 = (int(pt[0]), int(pt[1]))
-        neighbour_ids = df.loc[particle, 'neighbours']
-        for neighbour in neighbour_ids:
-            pt = df.loc[neighbour, ['x','y']].values
-            pt2 = (int(pt[0]), int(pt[1]))
-            frame = cv2.line(frame,pt1, pt2, colours[index], int(thickness), lineType=cv2.LINE_AA)
+    segments, particle_index = _network_segments(df)
+
+    #One polylines call per colour rather than one line per edge
+    frame = draw_lines(frame, segments, np.reshape(colours, (-1, 3))[particle_index], thickness=int(thickness), line_type=cv2.LINE_AA, scale=kwargs.get('scale', 1))
     if colourbar is not None:
-        frame = place_colourbar_in_image(frame, colourbar, parameters) 
+        frame = place_colourbar_in_image(frame, colourbar, parameters, scale=kwargs.get('scale', 1)) 
     return frame
 
+def _network_segments(df):
+    """Converts the neighbours column into line segments
+
+    Returns
+    -------
+    segments : np.ndarray of shape (num_edges, 2, 2) with the start and end point of each edge
+    particle_index : np.ndarray with the row in df of the particle each edge starts from
+    """
+    neighbour_lists = df['neighbours'].to_numpy()
+    counts = np.array([len(n) if isinstance(n, (list, tuple, np.ndarray)) else 0 for n in neighbour_lists])
+    if counts.sum() == 0:
+        return np.zeros((0, 2, 2), dtype=np.int32), np.zeros(0, dtype=np.intp)
+    neighbour_ids = np.concatenate([n for n, count in zip(neighbour_lists, counts) if count > 0]).astype(np.int64)
+    particle_index = np.repeat(np.arange(len(df)), counts)
+
+    #Look up the row of every neighbour id in one go
+    particle_ids = df['particle'].to_numpy().astype(np.int64)
+    order = np.argsort(particle_ids)
+    pos = np.searchsorted(particle_ids, neighbour_ids, sorter=order)
+    pos = np.minimum(pos, len(order) - 1)
+    neighbour_index = order[pos]
+    found = particle_ids[neighbour_index] == neighbour_ids
+    particle_index, neighbour_index = particle_index[found], neighbour_index[found]
+
+    xy = df[['x', 'y']].to_numpy(dtype=np.float64).astype(np.int32)
+    segments = np.stack((xy[particle_index], xy[neighbour_index]), axis=1)
+    return segments, particle_index
+
+
 @error_with_hint(additional_message="HINT: To run Voronoi Annotation you must have selected Voronoi in the postprocessing section")
 @param_parse
 @df_single
+@uses_columns('voronoi', column_params=('classifier_column', 'cmap_column'))
 def voronoi(df_single,frame, f_index=None, parameters=None, *args, **kwargs):
     """
     Voronoi draws the voronoi network that surrounds each particle
@@ -627,20 +659,20 @@ def voronoi(df_single,frame, f_index=None, parameters=None, *args, **kwargs):
 
     for index, contour in enumerate(contour_pts):
         frame = _draw_polygon(frame, contour, col=colours[index],
-                                        thickness=int(thickness))
+                                        thickness=int(thickness), scale=kwargs.get('scale', 1))
     if colourbar is not None:
-        frame = place_colourbar_in_image(frame, colourbar, parameters) 
+        frame = place_colourbar_in_image(frame, colourbar, parameters, scale=kwargs.get('scale', 1)) 
     return frame
 
 
-def _draw_polygon(img, pts, col=(0,0,255), thickness=1, closed=True):
+def _draw_polygon(img, pts, col=(0,0,255), thickness=1, closed=True, scale=1):
     if np.any(np.isnan(pts[0])):
         return img
     
     if thickness == -1:
-        img = cv2.fillPoly(img, [pts[0].astype(np.int32)], col)
+        img = fill_polygons(img, [pts[0]], np.reshape(col, (1, 3)), scale=scale)
     else:
-        img = cv2.polylines(img, [pts[0].astype(np.int32)], closed, col, thickness) 
+        img = draw_lines(img, [pts[0]], np.reshape(col, (1, 3)), thickness=thickness, closed=closed, scale=scale)
     return img
 
 """
@@ -653,6 +685,7 @@ Particle motion annotation
 @error_handling
 @param_parse
 @df_single
+@uses_columns('x', 'y', column_params=('dx_column', 'dy_column', 'classifier_column', 'cmap_column'))
 def vectors(df_single, frame, f_index=None, parameters=None, *args, **kwargs):
     """
     Vectors draw info onto images in the form of arrows. 
@@ -723,23 +756,74 @@ def vectors(df_single, frame, f_index=None, parameters=None, *args, **kwargs):
 
     (colours, colourbar) = colour_array(df_single, f_index, parameters)
     
-    for i, vector in enumerate(vectors):
-        frame = cv2.arrowedLine(frame, (int(vector[0]), int(vector[1])),
-                                (int(vector[0]+vector[2]*vector_scale),int(vector[1]+vector[3]*vector_scale)),
-                                color=colours[i], thickness=int(thickness),line_type=int(line_type),shift=0,tipLength=tip_length)
+    vectors = vectors.astype(np.float64)
+    starts = vectors[:, :2].astype(np.int64)
+    ends = np.stack((starts[:, 0] + vectors[:, 2]*vector_scale, starts[:, 1] + vectors[:, 3]*vector_scale), axis=1)
+    frame = draw_arrows(frame, starts, ends, colours, thickness=int(thickness), line_type=int(line_type), tip_length=tip_length, scale=kwargs.get('scale', 1))
         
     if colourbar is not None:
-        frame = place_colourbar_in_image(frame, colourbar, parameters) 
+        frame = place_colourbar_in_image(frame, colourbar, parameters, scale=kwargs.get('scale', 1)) 
     return frame
 
 
+class _TrajectoryTails:
+    """Rolling buffer of the recent points of each particle used by trajectories.
+
+    The points of each particle are kept in frame order in their own deque. Moving on a frame
+    appends the points of the new frame and drops those of frames that are now too old, so
+    the work done depends on the number of points that change rather than the length of the
+    trajectories. If the frames are not visited in order the buffer is rebuilt.
+    """
+    def __init__(self):
+        self.tails = {}
+        self.frames = collections.deque()
+        self.last_frame = None
+        self.columns = None
+
+    def update(self, df, f_index, first_frame, x_column, y_column):
+        """Moves the buffer on so it holds the points from first_frame to f_index of df which
+        must be sorted by frame"""
+        frames = df.index.to_numpy()
+        if self.last_frame is None or (x_column, y_column) != self.columns \
+                or f_index <= self.last_frame or first_frame > self.last_frame:
+            self.__init__()
+            self.columns = (x_column, y_column)
+            new_start = first_frame
+        else:
+            new_start = self.last_frame + 1
+
+        while self.frames and self.frames[0][0] < first_frame:
+            _, particle_ids = self.frames.popleft()
+            for particle in particle_ids:
+                tail = self.tails[particle]
+                tail.popleft()
+                if not tail:
+                    del self.tails[particle]
+
+        new_df = df.iloc[np.searchsorted(frames, new_start, side='left'):np.searchsorted(frames, f_index, side='right')]
+        new_df = new_df[new_df['particle'].notna()]
+        new_frames = new_df.index.to_numpy()
+        particle_ids = new_df['particle'].to_numpy()
+        pts = new_df[[x_column, y_column]].to_numpy(dtype=np.float64).astype(np.int32)
+        for f in np.unique(new_frames):
+            in_frame = slice(np.searchsorted(new_frames, f, side='left'), np.searchsorted(new_frames, f, side='right'))
+            self.frames.append((f, particle_ids[in_frame]))
+            for particle, pt in zip(particle_ids[in_frame], pts[in_frame]):
+                self.tails.setdefault(particle, collections.deque()).append(pt)
+        self.last_frame = f_index
+
+    def polylines(self, particle_ids):
+        """Points of each particle's trajectory in the form cv2.polylines needs"""
+        return [np.array(self.tails.get(particle, ()), np.int32).reshape((-1, 1, 2)) for particle in particle_ids]
+
+
 """
 These methods require more than one frames data to be analysed so you'll need to run use part first.
 
 """
 @error_with_hint(additional_message="HINT: To visualise annotate trajectories in the gui you must have already run a complete processing routine. This must have used linking. This is because this relies on data from other frames. You can of course process the movie and include trajectories.")
 @param_parse
-@df_range
+@uses_columns('particle', column_params=('x_column', 'y_column', 'classifier_column', 'cmap_column'))
 def trajectories(df_range, frame, f_index=None, parameters=None, *args, **kwargs):
     """
     Trajectories draws the historical track of each particle onto an image. 
@@ -797,28 +881,28 @@ def trajectories(df_range, frame, f_index=None, parameters=None, *args, **kwargs
     #This can only be run on a linked trajectory
     x_col_name = parameters['x_column']
     y_col_name = parameters['y_column']
+    first_frame = max(f_index - np.floor(parameters['span'] / 2), 0)
 
     #In this case subset_df is only used to get the particle_ids and colours of trajectories.
-    subset_df = _get_class_subset(df_range.loc[f_index], parameters)
+    frames = df_range.index.to_numpy()
+    current = df_range.iloc[np.searchsorted(frames, f_index, side='left'):np.searchsorted(frames, f_index, side='right')]
+    subset_df = _get_class_subset(current, parameters)
     particle_ids = subset_df['particle'].values
 
     (colours, colourbar) = colour_array(subset_df, f_index, parameters)
     thickness = parameters['thickness']
-    traj_length = parameters['span']
-
-    if (f_index-traj_length) < 0:
-        traj_length = f_index
 
-    #tests showed mucking about with the index was faster than selecting on particle column
-    df_range.index.name='frame'
-    df2 = df_range.loc[f_index-traj_length:f_index]     
-    df3 = df2.set_index(['particle'], append=True).swaplevel(i=0,j=1).sort_index(level='particle')
+    #When annotating a whole movie the tails are kept between frames and only the new frame is added
+    cache = kwargs.get('cache')
+    if cache is None:
+        tails = _TrajectoryTails()
+    else:
+        tails = cache.setdefault(get_method_key('trajectories', kwargs.get('call_num')), _TrajectoryTails())
+    tails.update(df_range, f_index, first_frame, x_col_name, y_col_name)
 
-    for index, particle in enumerate(particle_ids):
-        traj_pts = df3[[x_col_name,y_col_name]].loc[particle]
-        traj_pts = np.array(traj_pts.values, np.int32).reshape((-1,1,2))
-        frame = cv2.polylines(frame,[traj_pts],False,colours[index],int(thickness))
+    #One polylines call per colour
+    frame = draw_lines(frame, tails.polylines(particle_ids), colours, thickness=int(thickness), scale=kwargs.get('scale', 1))
 
     if colourbar is not None:
-        frame = place_colourbar_in_image(frame, colourbar, parameters)     
+        frame = place_colourbar_in_image(frame, colourbar, parameters, scale=kwargs.get('scale', 1))     
     return frame
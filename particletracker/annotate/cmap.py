@@ -1,8 +1,9 @@
 import matplotlib.pyplot as plt
-import matplotlib.colors as colors
 import matplotlib as mpl
 import numpy as np
+import cv2
 import io
+from functools import lru_cache
 from PIL import Image
 
 from ..general.parameters import get_param_val
@@ -18,38 +19,70 @@ def colour_array(subset_df, f, parameters):
         colourbar = None
     elif cmap_type == 'dynamic':
         cmap_column = parameters['cmap_column']
-        colour_data = subset_df[[cmap_column]].values
+        colour_data = subset_df[cmap_column].to_numpy()
         if np.iscomplexobj(colour_data):
             colour_data = np.angle(colour_data)
         cmap_max = parameters['cmap_max']
         cmap_min = parameters['cmap_min']
-        try:
-            cmap_name = parameters['cmap_name']
-            assert cmap_name in plt.colormaps(), "Colormap isn't available, setting to jet"
-        except Exception as e:
-                cmap_name = 'jet'
-                # print('reached this point')
-                # raise CmapError(e)
-                print("Cmap set to jet")
-
-        norm = colors.Normalize(vmin=cmap_min, vmax=cmap_max, clip=True)
-        colour_obj = plt.get_cmap(cmap_name, np.size(colour_data))
-        colour_vals = 255 * colour_obj(norm(colour_data))
-        colours = []
-        for colour in colour_vals:
-            colours.append((colour[0,2], colour[0,1], colour[0,0]))
-        colours = np.array(colours)
+        cmap_name = parameters['cmap_name']
+        colours = map_colours(colour_data, cmap_name, cmap_min, cmap_max)
         if parameters['colour_bar'] is None:
             colourbar = None
         else:
             _,_,w,h= parameters['colour_bar']
-            colourbar = create_colourbar(int(w),int(h), cmap_name, cmap_min, cmap_max)  
+            colourbar = create_colourbar(int(w),int(h), _valid_cmap_name(cmap_name), cmap_min, cmap_max)  
     return (colours, colourbar)
 
 
+def map_colours(values, cmap_name, cmap_min, cmap_max):
+    """Maps values to (B,G,R) colours using a cached lookup table.
+
+    Values are clipped to the range cmap_min to cmap_max. NaN values are black.
+
+    Returns
+    -------
+    np.ndarray of shape (len(values), 3)
+    """
+    lut = colour_lut(cmap_name)
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if cmap_max == cmap_min:
+        scaled = np.zeros(np.shape(values))
+    else:
+        scaled = (values - cmap_min) / (cmap_max - cmap_min)
+    #Same binning as matplotlib so colours match those of a colour bar
+    scaled = np.clip(np.nan_to_num(scaled, nan=0.0), 0, 1)
+    indices = np.minimum((scaled * len(lut)).astype(np.intp), len(lut) - 1)
+    colours = lut[indices]
+    colours[np.isnan(values)] = 0
+    return colours
+
+
+@lru_cache(maxsize=None)
+def colour_lut(cmap_name, n=256):
+    """256 entry (B,G,R) lookup table for a matplotlib colour map. Only built once per cmap.
+
+    Values are rounded to whole numbers as OpenCV would when drawing, so colours that
+    draw the same are equal. The table is read-only since it is shared between calls."""
+    colour_obj = plt.get_cmap(_valid_cmap_name(cmap_name), n)
+    lut = np.rint(255 * colour_obj(np.arange(n))[:, [2, 1, 0]])
+    lut.setflags(write=False)
+    return lut
+
+
+@lru_cache(maxsize=None)
+def _valid_cmap_name(cmap_name):
+    if cmap_name in plt.colormaps():
+        return cmap_name
+    print("Colormap isn't available, setting to jet")
+    return 'jet'
+
+
+@lru_cache(maxsize=32)
 def create_colourbar(w,h, cmap, cmap_min, cmap_max):
     """
     Create a colorbar as a NumPy array with specified dimensions and colormap.
+    The result is cached so matplotlib only draws each colour bar once. It is
+    read-only since it is shared between frames.
 
     Parameters:
     - w: Width of the white rectangle.
@@ -103,13 +136,14 @@ def create_colourbar(w,h, cmap, cmap_min, cmap_max):
     colorbar_image = np.array(img)
     
     #convert rgba to rgb
-    colorbar_image = colorbar_image[:, :, :3]
+    colorbar_image = colorbar_image[:, :, :3].copy()
+    colorbar_image.setflags(write=False)
     
     plt.close(fig)
     
     return colorbar_image
 
-def place_colourbar_in_image(image, colourbar, parameters):
+def place_colourbar_in_image(image, colourbar, parameters, scale=1):
     """
     Place the colorbar into the image at the specified position (x, y).
     Crop the colorbar if it exceeds the image boundaries.
@@ -119,14 +153,20 @@ def place_colourbar_in_image(image, colourbar, parameters):
     - colorbar: Colorbar as a NumPy array.
     - x: X-coordinate for the top-left corner of the colorbar.
     - y: Y-coordinate for the top-left corner of the colorbar.
+    - scale: Scale factor of the image if it has been resized for output. The colour bar and its position are scaled to match.
 
     Returns:
     - image: Image with the colorbar placed at the specified position.
     """
+    if not isinstance(image, np.ndarray):
+        #Colour bars aren't recorded in overlays (see overlay.py)
+        return image
     x,y,_,_=parameters['colour_bar']
 
-    x=int(x)
-    y=int(y)
+    x=int(x*scale)
+    y=int(y*scale)
+    if scale != 1:
+        colourbar = scaled_colourbar(colourbar, scale)
     
     img_height, img_width, _ = image.shape
     cb_height, cb_width, _ = colourbar.shape
@@ -135,7 +175,6 @@ def place_colourbar_in_image(image, colourbar, parameters):
     max_width = min(cb_width, img_width - x)
     max_height = min(cb_height, img_height - y)
     # Crop the colorbar if it exceeds the image boundaries
-    print(2)
     cropped_colourbar = colourbar[:max_height, :max_width,:].copy()
     
     
@@ -143,7 +182,21 @@ def place_colourbar_in_image(image, colourbar, parameters):
     cropped_colourbar[-1,:,:] = 0
     cropped_colourbar[:,0,:] = 0
     cropped_colourbar[:,-1,:] = 0
-    print(4)
     # Place the blended region back into the image
     image[y:y+max_height, x:x+max_width] = cropped_colourbar
     return image
+
+
+_scaled_colourbars = {}
+
+def scaled_colourbar(colourbar, scale):
+    """Colour bar resized by scale. The resized copies of the cached colour bars are kept
+    so each is only resized once."""
+    key = (id(colourbar), scale)
+    if key not in _scaled_colourbars:
+        if len(_scaled_colourbars) >= 32:
+            _scaled_colourbars.clear()
+        h, w = colourbar.shape[:2]
+        size = (max(1, int(w*scale)), max(1, int(h*scale)))
+        _scaled_colourbars[key] = (colourbar, cv2.resize(colourbar, size, interpolation=cv2.INTER_AREA))
+    return _scaled_colourbars[key][1]
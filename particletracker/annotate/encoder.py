@@ -0,0 +1,260 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from labvision.video import WriteVideo
+
+from ..general.parameters import get_param_val
+from ..customexceptions import error_with_hint
+from .render import render_scale
+
+
+"""
+Writing of the annotated movie. Frames are handed to a VideoSink which encodes them on a
+background thread so that encoding does not hold up decoding and drawing. The sink holds a
+bounded queue of frames; if the encoder falls behind, add_frame waits for space.
+
+The encoder used is chosen with config['video_output']['encoder']:
+
+labvision   labvision.video.WriteVideo (the original writer)
+ffmpeg      Pipes raw frames to an ffmpeg process. Codec, preset, crf and thread count are configurable.
+opencv      cv2.VideoWriter
+png, tiff   Lossless image sequence written to a folder named after the movie
+"""
+
+ENCODERS = ('labvision', 'ffmpeg', 'opencv', 'png', 'tiff')
+
+
+@error_with_hint(additional_message="HINT: The ffmpeg encoder needs ffmpeg on the path or the imageio-ffmpeg package.")
+def open_video_sink(filename, frame, parameters):
+    """Creates the sink for an annotated movie
+
+    Parameters
+    ----------
+    filename : str
+        Path of the output movie. Image sequences are written to a folder with the same name minus the extension.
+    frame : np.ndarray
+        First full size frame of the movie
+    parameters : dict
+        Full parameters dictionary. Settings are read from parameters['config'].
+
+    Returns
+    -------
+    VideoSink
+    """
+    config = parameters['config']
+    video_output = config['video_output']
+    encoder = get_param_val(video_output.get('encoder', 'labvision'))
+    scale = get_param_val(video_output['scale'])
+    fps = get_param_val(video_output['fps'])
+    codec = config.get('_encoder_codec', None)
+
+    h, w = frame.shape[:2]
+    #Same rounding as annotate.resize_frame so frames drawn at the output scale need no resizing
+    size = (int(w*(scale/100)), int(h*(scale/100)))
+
+    if encoder == 'labvision' and render_scale(parameters) != 1:
+        #Frames are already drawn at the output size so WriteVideo mustn't scale them again
+        writer = LabvisionWriter(filename, cv2.resize(frame, size), 100)
+    elif encoder == 'labvision':
+        writer = LabvisionWriter(filename, frame, scale)
+    elif encoder == 'ffmpeg':
+        writer = FFmpegWriter(filename, size, fps, codec=codec or 'libx264',
+                              preset=get_param_val(video_output.get('preset', 'medium')),
+                              crf=get_param_val(video_output.get('crf', 23)),
+                              threads=config.get('_encoder_threads', 0))
+    elif encoder == 'opencv':
+        writer = OpenCVWriter(filename, size, fps, codec=codec or 'mp4v')
+    elif encoder in ('png', 'tiff'):
+        writer = ImageSequenceWriter(os.path.splitext(filename)[0], size, extension=encoder)
+    else:
+        raise ValueError(f"Unknown encoder {encoder}, options are {ENCODERS}")
+    return VideoSink(writer, queue_size=config.get('_encoder_queue', 16))
+
+
+class VideoSink:
+    """Encodes frames on a background thread
+
+    add_frame puts the frame in a queue of at most queue_size frames and returns straight away
+    unless the queue is full. Frames must not be changed after they are added. Errors raised
+    by the writer are raised again by the next call to add_frame or close.
+
+    Parameters
+    ----------
+    writer : object
+        Any object with write(frame) and close() methods eg FFmpegWriter
+    queue_size : int
+        Maximum number of frames waiting to be encoded
+    """
+    def __init__(self, writer, queue_size=16):
+        self.writer = writer
+        self.frames_added = 0
+        self.frames_written = 0
+        self.max_queued = 0
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._error = None
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._encode, daemon=True)
+        self._thread.start()
+
+    def add_frame(self, frame):
+        self._put(frame)
+        self.frames_added += 1
+        self.max_queued = max(self.max_queued, self._queue.qsize())
+
+    def close(self):
+        """Waits for the queued frames to be encoded and closes the writer"""
+        if self._thread.is_alive():
+            self._put(None)
+            self._thread.join()
+        self.writer.close()
+        self._raise_error()
+        print(f'Encoded {self.frames_written} frames at {self.throughput:.1f} fps, max queue {self.max_queued} frames')
+
+    @property
+    def throughput(self):
+        """Frames encoded per second since the sink was opened"""
+        return self.frames_written / max(time.perf_counter() - self._start, 1e-9)
+
+    def status(self):
+        """Summary of the queue and encoding rate for progress bars"""
+        return f'queue={self._queue.qsize()}/{self._queue.maxsize} encode={self.throughput:.1f}fps'
+
+    def _put(self, item):
+        #Waits in short steps so that an error in the writer can't leave us waiting forever
+        while True:
+            self._raise_error()
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+
+    def _encode(self):
+        try:
+            while True:
+                frame = self._queue.get()
+                if frame is None:
+                    return
+                self.writer.write(frame)
+                self.frames_written += 1
+        except BaseException as e:
+            self._error = e
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+
+class LabvisionWriter:
+    """labvision's WriteVideo which scales frames itself"""
+    def __init__(self, filename, frame, scale):
+        self.video = WriteVideo(filename, frame=frame, scale=scale)
+
+    def write(self, frame):
+        self.video.add_frame(frame)
+
+    def close(self):
+        self.video.close()
+
+
+class FFmpegWriter:
+    """Pipes raw BGR frames to ffmpeg
+
+    Parameters
+    ----------
+    filename : str
+    size : tuple
+        (width, height) of the output. Frames of a different size are resized.
+    fps : float
+    codec : str
+        ffmpeg video codec eg libx264, libx265, mpeg4
+    preset : str
+        Speed of the encoder for codecs that have presets eg ultrafast for quick previews, medium, slow
+    crf : int
+        Quality for codecs that support it. Lower is better.
+    threads : int
+        Threads used by ffmpeg. 0 lets ffmpeg decide.
+    """
+    def __init__(self, filename, size, fps, codec='libx264', preset='medium', crf=23, threads=0):
+        self.size = size
+        command = [ffmpeg_exe(), '-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{size[0]}x{size[1]}', '-r', str(fps), '-i', '-',
+                   '-c:v', str(codec), '-threads', str(int(threads))]
+        if codec in ('libx264', 'libx265'):
+            command += ['-preset', str(preset), '-crf', str(int(crf))]
+        #yuv420p is the most widely playable but needs even dimensions
+        command += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', filename]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        try:
+            self.process.stdin.write(np.ascontiguousarray(_fit(frame, self.size)).tobytes())
+        except BrokenPipeError:
+            raise IOError('ffmpeg stopped: ' + self.process.stderr.read().decode(errors='ignore'))
+
+    def close(self):
+        if self.process.stdin.closed:
+            return
+        self.process.stdin.close()
+        error = self.process.stderr.read().decode(errors='ignore')
+        if self.process.wait() != 0:
+            raise IOError('ffmpeg failed: ' + error)
+
+
+class OpenCVWriter:
+    """cv2.VideoWriter. codec is a four character code eg mp4v, XVID, MJPG"""
+    def __init__(self, filename, size, fps, codec='mp4v'):
+        self.size = size
+        self.video = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*codec), fps, size)
+        if not self.video.isOpened():
+            raise IOError(f'OpenCV could not open {filename} with codec {codec}')
+
+    def write(self, frame):
+        self.video.write(_fit(frame, self.size))
+
+    def close(self):
+        self.video.release()
+
+
+class ImageSequenceWriter:
+    """Writes each frame as a numbered png or tiff image in folder"""
+    def __init__(self, folder, size, extension='png'):
+        self.folder = folder
+        self.size = size
+        self.extension = extension
+        self.count = 0
+        os.makedirs(folder, exist_ok=True)
+
+    def write(self, frame):
+        filename = os.path.join(self.folder, f'frame_{self.count:06d}.{self.extension}')
+        if not cv2.imwrite(filename, _fit(frame, self.size)):
+            raise IOError(f'Could not write {filename}')
+        self.count += 1
+
+    def close(self):
+        pass
+
+
+def ffmpeg_exe():
+    """ffmpeg on the path or else the copy that comes with imageio-ffmpeg (installed with moviepy)"""
+    exe = shutil.which('ffmpeg')
+    if exe is None:
+        import imageio_ffmpeg
+        exe = imageio_ffmpeg.get_ffmpeg_exe()
+    return exe
+
+
+def _fit(frame, size):
+    """3 channel frame of size (width, height)"""
+    if frame.ndim == 2:
+        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+    if (frame.shape[1], frame.shape[0]) != tuple(size):
+        frame = cv2.resize(frame, tuple(size), interpolation=cv2.INTER_AREA)
+    return frame
@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+from .primitives import draw_circles, draw_text, draw_lines, fill_polygons
+from ..general.parameters import get_param_val
+
+
+"""
+Vector overlays. Rather than drawing the annotations into every frame of a new video, the
+shapes the annotation methods draw can be recorded in a file. The shapes of any frame can
+then be drawn over the original movie frame when it is needed so no frames have to be
+decoded or encoded to make the file.
+
+The annotation methods draw onto an OverlayCanvas instead of a frame. The drawing
+primitives (primitives.py) record each call they are given in the integer pixel
+coordinates they would have drawn at. Drawing the recorded shapes with Overlay.draw
+therefore gives the same frame as annotating it directly. Colour bars are not recorded.
+
+The file is an hdf5 file with two tables:
+
+shapes      One row per shape. The index is the frame number. kind is one of KINDS and call
+            counts the calls to the primitives within each frame. Circles use x, y, radius,
+            text uses x, y, text and font_size and polylines and polygons use count points
+            of the points table starting at row start.
+points      x, y of the points of all the polylines and polygons
+"""
+
+KINDS = ('circle', 'text', 'polyline', 'polygon')
+
+
+def overlay_output(parameters):
+    """True if the whole movie annotation should be written as an overlay file rather than a video"""
+    video_output = parameters['config']['video_output']
+    return get_param_val(video_output['output']) and get_param_val(video_output.get('encoder', None)) == 'overlay'
+
+
+def movie_output(parameters):
+    """What annotating the whole movie writes: 'overlay', 'video' or None if nothing is requested.
+    Both TrackingAnnotator.annotate and the single pass processing (PTWorkflow.process_fused) use this."""
+    if not get_param_val(parameters['config']['video_output']['output']):
+        return None
+    return 'overlay' if overlay_output(parameters) else 'video'
+
+
+class OverlayWriter:
+    """Collects the shapes recorded on the canvas of each frame and writes them to filename on close
+
+    Parameters
+    ----------
+    filename : str
+    frame_shape : tuple
+        Shape of the movie frames the overlay will be drawn on
+    """
+    def __init__(self, filename, frame_shape):
+        self.filename = filename
+        self.frame_shape = tuple(frame_shape)
+        self._shapes = []
+        self._points = []
+        self._num_points = 0
+
+    def canvas(self, f_index):
+        """Something to annotate frame f_index on in place of the frame itself"""
+        return OverlayCanvas(self, f_index)
+
+    def status(self):
+        return f'shapes={sum(len(shapes["kind"]) for shapes in self._shapes)}'
+
+    def close(self):
+        columns = {'frame': np.int32, 'call': np.int32, 'kind': np.int8, 'b': np.uint8, 'g': np.uint8, 'r': np.uint8,
+                   'thickness': np.int16, 'line_type': np.int8, 'closed': bool, 'x': np.int32, 'y': np.int32,
+                   'radius': np.int32, 'font_size': np.int16, 'start': np.int64, 'count': np.int32}
+        shapes = pd.DataFrame({column: np.concatenate([s[column] for s in self._shapes] + [np.zeros(0, dtype)]).astype(dtype)
+                               for column, dtype in columns.items()})
+        shapes['text'] = [text for s in self._shapes for text in s['text']]
+        shapes = shapes.set_index('frame')
+        points = np.concatenate(self._points + [np.zeros((0, 2), np.int32)])
+        points = pd.DataFrame({'x': points[:, 0], 'y': points[:, 1]})
+
+        #Compression mostly removes the space taken by the text column
+        with pd.HDFStore(self.filename, 'w', complevel=9, complib='blosc') as store:
+            store.put('shapes', shapes)
+            store.put('points', points)
+            store.get_storer('shapes').attrs.frame_shape = self.frame_shape
+        print(f'Overlay of {len(shapes)} shapes written to {self.filename}')
+
+    def _add(self, shapes, polylines=None):
+        if polylines:
+            counts = np.array([len(polyline) for polyline in polylines], dtype=np.int64)
+            shapes['start'] = self._num_points + np.concatenate(([0], np.cumsum(counts)[:-1]))
+            shapes['count'] = counts
+            self._points.append(np.concatenate(polylines).astype(np.int32))
+            self._num_points += int(counts.sum())
+        self._shapes.append(shapes)
+
+
+class OverlayCanvas:
+    """Stands in for the frame given to the annotation methods and records what is drawn on it"""
+    def __init__(self, writer, f_index):
+        self.writer = writer
+        self.f_index = f_index
+        self.shape = writer.frame_shape
+        self.calls = 0
+
+    def record(self, kind, colours, xy=None, radii=None, texts=None, polylines=None,
+               thickness=1, line_type=8, closed=False, font_size=0):
+        """Records one call to a drawing primitive. See primitives.py"""
+        n = len(colours)
+        if n == 0:
+            return
+        colours = np.asarray(colours, dtype=np.float64).reshape(n, -1)[:, :3]
+        colours = np.broadcast_to(np.clip(np.rint(colours), 0, 255), (n, 3))
+        zeros = np.zeros(n, dtype=np.int64)
+        xy = zeros[:, None].repeat(2, axis=1) if xy is None else np.asarray(xy).reshape(n, 2)
+        shapes = {'frame': np.full(n, self.f_index), 'call': np.full(n, self.calls), 'kind': np.full(n, KINDS.index(kind)),
+                  'b': colours[:, 0], 'g': colours[:, 1], 'r': colours[:, 2],
+                  'thickness': np.full(n, thickness), 'line_type': np.full(n, line_type), 'closed': np.full(n, closed),
+                  'x': xy[:, 0], 'y': xy[:, 1], 'radius': zeros if radii is None else np.asarray(radii),
+                  'font_size': np.full(n, font_size), 'start': zeros, 'count': zeros,
+                  'text': [''] * n if texts is None else list(texts)}
+        self.writer._add(shapes, polylines)
+        self.calls += 1
+
+
+class Overlay:
+    """Reads an overlay file so that the shapes of any frame can be drawn over the movie
+
+    Example
+    -------
+    overlay = Overlay('movie_overlay.hdf5')
+    frame = overlay.draw(readvid.read_frame(n=10), 10)
+    """
+    def __init__(self, filename):
+        with pd.HDFStore(filename, 'r') as store:
+            self.shapes = store['shapes']
+            self.points = store['points'][['x', 'y']].to_numpy()
+            self.frame_shape = store.get_storer('shapes').attrs.frame_shape
+        self._frames = self.shapes.index.to_numpy()
+
+    def frame(self, f_index):
+        """Shapes of frame f_index"""
+        return self.shapes.iloc[np.searchsorted(self._frames, f_index, side='left'):np.searchsorted(self._frames, f_index, side='right')]
+
+    def draw(self, frame, f_index, scale=1):
+        """Draws the shapes of frame f_index onto frame. scale is the size of frame relative to the movie"""
+        shapes = self.frame(f_index)
+        if len(shapes) == 0:
+            return frame
+        calls = shapes['call'].to_numpy()
+        bounds = np.flatnonzero(np.diff(calls)) + 1
+        for call in np.split(np.arange(len(shapes)), bounds):
+            frame = self._draw_call(frame, shapes.iloc[call], scale)
+        return frame
+
+    def _draw_call(self, frame, shapes, scale):
+        first = shapes.iloc[0]
+        kind = KINDS[first['kind']]
+        colours = shapes[['b', 'g', 'r']].to_numpy(dtype=np.float64)
+        xy = shapes[['x', 'y']].to_numpy()
+        if kind == 'circle':
+            return draw_circles(frame, xy, shapes['radius'].to_numpy(), colours, thickness=first['thickness'], scale=scale)
+        if kind == 'text':
+            return draw_text(frame, shapes['text'].tolist(), xy, tuple(colours[0]), font_size=first['font_size'],
+                             thickness=first['thickness'], scale=scale)
+        polylines = [self.points[start:start + count] for start, count in zip(shapes['start'], shapes['count'])]
+        if kind == 'polygon':
+            return fill_polygons(frame, polylines, colours, scale=scale)
+        return draw_lines(frame, polylines, colours, thickness=first['thickness'], line_type=first['line_type'],
+                          closed=bool(first['closed']), scale=scale)
@@ -0,0 +1,174 @@
+import cv2
+import numpy as np
+
+
+"""
+Batch drawing of the shapes used by the annotation methods. Each function draws every
+shape in a frame from arrays of coordinates and colours so the annotation methods
+don't need to loop over the particles themselves.
+
+Lines and arrows are grouped by colour and drawn with one cv2.polylines call per
+colour. Shapes of the same colour are drawn in order, so only where shapes of different
+colours overlap can the pixels differ from drawing each shape in turn. Circles, text and
+filled polygons are drawn with one OpenCV call per shape but the coordinates and colours
+are converted to python numbers in one go. Polygons can't be grouped because one
+cv2.fillPoly call leaves the overlap of two polygons unfilled. Stamping a cached
+mask of each circle at every position with numpy was tried but is slower than OpenCV
+for the radii used in practice.
+
+Every function takes a scale which multiplies the coordinates, sizes and line widths.
+This is used to draw straight onto a frame that has already been shrunk to the size of
+the output video (see annotate_frame) rather than drawing at full resolution.
+
+If frame is not an image but an OverlayCanvas (see overlay.py) the shapes are recorded
+rather than drawn, in the integer pixel coordinates they would have been drawn at.
+"""
+
+
+def scale_thickness(thickness, scale=1):
+    """Line width to use on a frame resized by scale. Negative widths (filled shapes) are
+    unchanged and lines are never made thinner than 1 pixel."""
+    thickness = int(thickness)
+    if scale == 1 or thickness < 0:
+        return thickness
+    return max(1, int(round(thickness * scale)))
+
+
+def colour_groups(colours):
+    """Splits shapes by colour
+
+    Parameters
+    ----------
+    colours : np.ndarray of shape (n, 3)
+
+    Yields
+    ------
+    (colour tuple, indices of the shapes with that colour)
+    """
+    colours = np.asarray(colours)
+    if len(colours) == 0:
+        return
+    #OpenCV only accepts python numbers in a colour tuple
+    if (colours == colours[0]).all():
+        yield tuple(colours[0].tolist()), np.arange(len(colours))
+        return
+    unique_colours, colour_index = np.unique(colours, axis=0, return_inverse=True)
+    colour_index = colour_index.ravel()
+    for i, colour in enumerate(unique_colours):
+        yield tuple(colour.tolist()), np.flatnonzero(colour_index == i)
+
+
+def draw_circles(frame, xy, radii, colours, thickness=1, scale=1):
+    """Draws a circle at each point. thickness -1 fills the circle.
+
+    Parameters
+    ----------
+    frame : np.ndarray or OverlayCanvas
+    xy : np.ndarray of shape (n, 2)
+        Centres. Values are truncated to integers as int() would.
+    radii : np.ndarray of shape (n,) or a single value
+    colours : np.ndarray of shape (n, 3)
+    thickness : int
+    scale : float
+        Scale factor of the frame relative to the coordinates
+    """
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2) * scale
+    radii = np.broadcast_to(np.asarray(radii, dtype=np.float64) * scale, (len(xy),))
+    valid = np.isfinite(xy).all(axis=1) & np.isfinite(radii)
+    circles = np.column_stack((xy[valid], radii[valid])).astype(np.int64)
+    if not isinstance(frame, np.ndarray):
+        frame.record('circle', np.asarray(colours)[valid], xy=circles[:, :2], radii=circles[:, 2], thickness=int(thickness))
+        return frame
+    circles = circles.tolist()
+    colours = np.asarray(colours, dtype=np.float64)[valid].tolist()
+    thickness = scale_thickness(thickness, scale)
+    for (x, y, radius), colour in zip(circles, colours):
+        frame = cv2.circle(frame, (x, y), radius, colour, thickness)
+    return frame
+
+
+def draw_text(frame, texts, xy, colour, font_size=1, thickness=1, scale=1):
+    """Writes each string in texts with its bottom left corner at the corresponding point"""
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2) * scale
+    valid = np.isfinite(xy).all(axis=1)
+    positions = xy[valid].astype(np.int64).tolist()
+    texts = [text for text, ok in zip(texts, valid) if ok]
+    if not isinstance(frame, np.ndarray):
+        frame.record('text', np.tile(np.reshape(colour, (1, -1))[:, :3], (len(texts), 1)), xy=positions,
+                     texts=[str(text) for text in texts], thickness=int(thickness), font_size=int(font_size))
+        return frame
+    font_size, thickness = int(font_size) * scale, scale_thickness(thickness, scale)
+    for text, (x, y) in zip(texts, positions):
+        frame = cv2.putText(frame, str(text), (x, y), cv2.FONT_HERSHEY_COMPLEX_SMALL,
+                            font_size, colour, thickness, cv2.LINE_AA)
+    return frame
+
+
+def draw_lines(frame, segments, colours, thickness=1, line_type=cv2.LINE_8, closed=False, scale=1):
+    """Draws polylines grouped by colour
+
+    Parameters
+    ----------
+    segments : list of np.ndarray of points or np.ndarray of shape (n, num_pts, 2)
+    colours : np.ndarray of shape (n, 3)
+    """
+    if not isinstance(frame, np.ndarray):
+        frame.record('polyline', colours, polylines=[_scale_points(segment, 1).reshape((-1, 2)) for segment in segments],
+                     thickness=int(thickness), line_type=int(line_type), closed=closed)
+        return frame
+    thickness = scale_thickness(thickness, scale)
+    for colour, indices in colour_groups(colours):
+        if isinstance(segments, np.ndarray):
+            pts = _scale_points(segments[indices], scale)
+        else:
+            pts = [_scale_points(segments[i], scale).reshape((-1, 1, 2)) for i in indices]
+        frame = cv2.polylines(frame, pts, closed, colour, thickness, lineType=int(line_type))
+    return frame
+
+
+def fill_polygons(frame, polygons, colours, scale=1):
+    """Fills each polygon in turn"""
+    if not isinstance(frame, np.ndarray):
+        frame.record('polygon', colours, polylines=[_scale_points(polygon, 1).reshape((-1, 2)) for polygon in polygons])
+        return frame
+    colours = np.asarray(colours, dtype=np.float64).reshape((-1, 3)).tolist()
+    for polygon, colour in zip(polygons, colours):
+        frame = cv2.fillPoly(frame, [_scale_points(polygon, scale).reshape((-1, 1, 2))], colour)
+    return frame
+
+
+def draw_arrows(frame, starts, ends, colours, thickness=1, line_type=cv2.LINE_8, tip_length=0.1, scale=1):
+    """Draws arrows from starts to ends in the same way as cv2.arrowedLine
+
+    The shaft and the two sides of the head of every arrow are drawn as separate lines
+    in the same order as cv2.arrowedLine.
+    """
+    starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2) * scale
+    ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2) * scale
+    valid = np.isfinite(starts).all(axis=1) & np.isfinite(ends).all(axis=1)
+    starts = starts[valid].astype(np.int64)
+    ends = ends[valid].astype(np.int64)
+    colours = np.asarray(colours, dtype=np.float64)[valid]
+
+    #Arrow head as calculated by cv2.arrowedLine
+    diff = (starts - ends).astype(np.float64)
+    tip_size = np.hypot(diff[:, 0], diff[:, 1]) * tip_length
+    angle = np.arctan2(diff[:, 1], diff[:, 0])
+    heads = []
+    for side in (np.pi / 4, -np.pi / 4):
+        heads.append(np.stack((np.rint(ends[:, 0] + tip_size * np.cos(angle + side)),
+                               np.rint(ends[:, 1] + tip_size * np.sin(angle + side))), axis=1))
+
+    #shaft, side, side of the first arrow then the second etc
+    lines = np.stack((np.stack((starts, ends), axis=1),
+                      np.stack((heads[0], ends), axis=1),
+                      np.stack((heads[1], ends), axis=1)), axis=1).reshape((-1, 2, 2))
+    thickness = scale_thickness(thickness, scale)
+    return draw_lines(frame, lines, np.repeat(colours, 3, axis=0), thickness=thickness, line_type=line_type)
+
+
+def _scale_points(pts, scale):
+    """Integer pixel coordinates of points on a frame resized by scale"""
+    if scale == 1:
+        return np.asarray(pts).astype(np.int32)
+    return (np.asarray(pts, dtype=np.float64) * scale).astype(np.int32)
@@ -0,0 +1,106 @@
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ..crop import ReadCropVideo
+from ..general.dataframes import FrameSlicer
+from ..general.parameters import get_param_val, compile_methods
+
+
+"""
+Parallel rendering of annotated frames. The frames to annotate are split into chunks
+which worker processes decode and annotate independently. The chunks are collected in order
+so that whatever writes the output (video or images) receives the frames in order. At most
+a few chunks per worker are held in memory at once.
+"""
+
+#Each worker process opens its own copy of the video.
+_worker = {}
+
+
+def render_frames(video_filename, parameters, df, frames, workers=2, chunk_size=None, scale=1):
+    """Annotates frames in parallel
+
+    Parameters
+    ----------
+    video_filename : str
+    parameters : dict
+        Full parameters dictionary
+    df : pd.DataFrame
+        Postprocessed data for the whole movie
+    frames : iterable of int
+        Frame numbers to annotate
+    workers : int
+        Number of worker processes
+    chunk_size : int or None
+        Number of consecutive frames given to a worker at once. Defaults to splitting
+        the frames into about 4 chunks per worker, with no more than 64 frames per chunk.
+    scale : float
+        Frames are resized by scale before they are annotated (see annotate_frame)
+
+    Yields
+    ------
+    (f_index, annotated frame) in frame order
+    """
+    frames = list(frames)
+    if chunk_size is None:
+        chunk_size = int(np.clip(np.ceil(len(frames) / (4 * workers)), 1, 64))
+    chunks = [frames[i:i + chunk_size] for i in range(0, len(frames), chunk_size)]
+
+    frames_df = FrameSlicer(df)
+    half_span = _max_half_span(parameters)
+    #Bounded reorder buffer. Chunks finish out of order but are only released in order.
+    max_pending = 2 * workers
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(video_filename, parameters)) as pool:
+        pending = collections.deque()
+        for chunk in chunks:
+            df_chunk = frames_df.window(chunk[0] - half_span, chunk[-1] + half_span)
+            pending.append(pool.submit(_render_chunk, df_chunk, chunk, scale))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _max_half_span(parameters):
+    """Methods like trajectories need data from the frames either side"""
+    spans = [0]
+    for method in parameters['annotate']['annotate_method']:
+        method_params = parameters['annotate'][method]
+        if type(method_params) is dict and 'span' in method_params:
+            spans.append(get_param_val(method_params['span']))
+    return np.floor(max(spans) / 2)
+
+
+def render_scale(parameters):
+    """Scale factor to draw a whole movie's annotations at.
+
+    config['video_output']['scale'] is the size of the output video as a percentage of the
+    original. If config['_render_at_scale'] is True the frames are shrunk to this size before
+    they are annotated, otherwise they are annotated at full size and shrunk when written."""
+    scale = get_param_val(parameters['config']['video_output']['scale'])
+    if not parameters['config'].get('_render_at_scale', False) or scale >= 100:
+        return 1
+    return scale / 100
+
+
+def _init_worker(video_filename, parameters):
+    _worker['cap'] = ReadCropVideo(parameters=parameters, filename=video_filename)
+    _worker['parameters'] = parameters
+
+
+def _render_chunk(df, frames, scale=1):
+    """Decodes and annotates a chunk of frames in a worker process"""
+    #Imported here to avoid a circular import with the annotate package
+    from . import annotate_frame, annotation_methods as am
+
+    cap = _worker['cap']
+    parameters = _worker['parameters']
+    frames_df = FrameSlicer(df)
+    cap.set_frame(frames[0])
+    cache = {}
+    methods = compile_methods(am, parameters, 'annotate')
+    return [(f, annotate_frame(frames_df, cap.read_frame(n=f), f, parameters, cache=cache, scale=scale, methods=methods)) for f in frames]
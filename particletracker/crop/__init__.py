@@ -48,6 +48,7 @@ class ReadCropVideo(ReadVideo):
     def reset_mask(self):
         #None for a mask means same size as crop.
         self.mask = self._create_ones_mask()
+        self.mask_box = None
 
         for method in self.parameters['crop_method']:
             if 'crop' not in method:
@@ -94,6 +95,7 @@ class ReadCropVideo(ReadVideo):
                     self.mask = cv2.add(self.mask, mask)
         if no_mask:
             self.mask = self._create_ones_mask()
+        self.mask_box = mask_box(self.mask)
                     
     def mask_ellipse(self, pts):
         img = self._create_zeros_mask()
@@ -140,8 +142,12 @@ class ReadCropVideo(ReadVideo):
         return mask
 
     @error_return_frame
-    def apply_mask(self,frame):
-        return cv2.bitwise_and(frame, self.mask)        
+    def apply_mask(self, frame, region=None):
+        """Masks frame, or if region (x0, y0, x1, y1) is given a frame cut to that region (see track.mask_region)"""
+        if region is None:
+            return cv2.bitwise_and(frame, self.mask)
+        x0, y0, x1, y1 = region
+        return cv2.bitwise_and(frame, self.mask[y0:y1, x0:x1])
     
     @error_return_frame
     def apply_crop(self, frame):
@@ -153,6 +159,15 @@ class ReadCropVideo(ReadVideo):
         return cropped_frame
     
 
+def mask_box(mask):
+    """Bounding rectangle (x0, y0, x1, y1) of the non zero pixels of mask. None if it is
+    the whole mask or the mask is empty."""
+    x, y, w, h = cv2.boundingRect(mask)
+    if w == 0 or (x, y, w, h) == (0, 0, mask.shape[1], mask.shape[0]):
+        return None
+    return (x, y, x + w, y + h)
+
+
 def crop(frame, parameters):
     if np.size(np.shape(frame)) == 3:
             if parameters['crop_box'] is not None:
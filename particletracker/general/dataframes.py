@@ -1,22 +1,32 @@
 from functools import lru_cache
 import functools
+import hashlib
 import pandas as pd
 import numpy as np
+import json
 import os
+import pickle
+import shutil
 
 from particletracker.customexceptions import error_with_hint
+from particletracker.general.parameters import get_method_name, get_param_val
+from particletracker.general.schema import apply_schema, check_schema
 
 
 class DataManager:
     """Manages data files and caching for particle tracking workflow"""
 
-    def __init__(self, base_filename=None, lock_part=-1):
+    def __init__(self, base_filename=None, lock_part=-1, data_format='hdf5', compact_dtypes=False, hdf5_profile='default'):
         # If this is an image sequence base_filename will terminate in an astrix which we remove.
         base_path, base_filename = os.path.split(
             base_filename.replace('*', ''))
         self.base_filename = base_path + '/_temp/' + base_filename
         self.temp_filename = self.base_filename + '_temp.hdf5'
         self._stores = [None, None, None]  # _track, _link, _postprocess
+        self._temp_df = None
+        self._temp_written = True
+        #How the whole movie data files of this project are written. See DataStorage
+        self.storage = DataStorage(data_format=data_format, compact_dtypes=compact_dtypes, hdf5_profile=hdf5_profile)
         self.update_lock(lock_part=lock_part)
 
     def update_lock(self, lock_part=-1):
@@ -65,8 +75,32 @@ class DataManager:
         """
         self._stores[store_index] = updated_store
 
+    @property
+    def temp_df(self):
+        """Single frame dataframe handed between stages when processing one frame"""
+        if self._temp_df is None:
+            return pd.DataFrame()
+        return self._temp_df
+
+    def set_temp_df(self, df):
+        """Stores the output of the final stage for a single frame. Nothing is written
+        to disk until write_temp_df is called."""
+        self._temp_df = df
+        self._temp_written = False
+
+    def write_temp_df(self):
+        """Writes the current single frame data to _temp.hdf5. This only happens when 
+        something (eg the pandas viewer) needs it, and only once per frame."""
+        if self._temp_written or self._temp_df is None:
+            return
+        with DataWrite(self.temp_filename) as store:
+            store.write_data(self._temp_df)
+        self._temp_written = True
+
     def clear_data(self):
         """Clear all data caches"""
+        self._temp_df = None
+        self._temp_written = True
         for idx, store in enumerate(self._stores):
             if idx > DataRead.lock_part:
                 if store is not None:
@@ -99,6 +133,7 @@ class DataRead:
         self.output_filename = output_filename
         self.store_index = store_index
         self._df = None
+        self._columns_df = None
         self._temp_df = None
 
     @property
@@ -108,6 +143,26 @@ class DataRead:
             self._df = self._load(full=True)
         return self._df
 
+    def load_columns(self, columns=None):
+        """Returns the full dataframe with only some of its columns. 
+
+        Only the columns asked for are read from the file (see read_columns) which 
+        saves a lot of time and memory if large columns like contours aren't needed. 
+        The result is cached until the data is cleared. If the whole dataframe is already 
+        loaded that is returned instead.
+
+        Parameters
+        ----------
+        columns : list of str or None
+            None loads all the columns like .df
+        """
+        if columns is None or self._df is not None:
+            return self.df
+        columns = tuple(columns)
+        if self._columns_df is None or self._columns_df[0] != columns:
+            self._columns_df = (columns, self._load(full=True, columns=columns))
+        return self._columns_df[1]
+
     @property
     def temp_df(self):
         """Returns temporary dataframe. Loads lazily"""
@@ -115,11 +170,14 @@ class DataRead:
             self._temp_df = self._load(full=False)
         return self._temp_df
 
-    def _load(self, full=False):
+    def _load(self, full=False, columns=None):
         """internal loading method"""
         try:
             if full:
-                df = pd.read_hdf(self.read_filename, key='data')
+                df = read_columns(self.read_filename, columns=columns)
+                wrong_types = check_schema(df)
+                if wrong_types:
+                    print(f'Unexpected column types in {self.read_filename}: {wrong_types}')
             else:
                 df = pd.read_hdf(self.temp_filename, key='data')
             if not df.index.is_monotonic_increasing:
@@ -129,6 +187,11 @@ class DataRead:
             print(f'Error loading file: {e}')
             return pd.DataFrame()
     
+    @property
+    def fingerprint(self):
+        """Fingerprint stored with the full input file. See general.fingerprints"""
+        return read_fingerprint(self.read_filename)
+
     def get_df(self, f_index=None):
         """Returns single frame from the whole dataframe in _df.
 
@@ -155,17 +218,499 @@ class DataRead:
 
     def clear_df(self):
         self._df = None
+        self._columns_df = None
     
     def clear_temp_df(self):
         self._temp_df = None
 
 
+def read_columns(filename, columns=None, key='data', frames=None):
+    """Reads a dataframe from a data file loading only the columns given.
+
+    Data files are referred to by their .hdf5 name whichever format they are stored in 
+    (see DATA_FORMATS). Columns that aren't in the file are ignored.
+
+    Parameters
+    ----------
+    filename : str
+    columns : list of str or None
+        None reads every column
+    key : str
+        Only used by hdf5 files
+    frames : tuple or None
+        (first, last) frame to read inclusive. None reads every frame.
+    """
+    if key == 'data' and data_format_of(filename) == 'parquet':
+        return BACKENDS['parquet'].read(filename, columns=columns, frames=frames)
+    return BACKENDS['hdf5'].read(filename, columns=columns, key=key, frames=frames)
+
+
+"""
+Whole movie data can be stored in different formats chosen with config['_data_format']. 
+Every part of the code refers to a data file by its .hdf5 name (eg _track.hdf5); the 
+functions below find whichever format is actually on disk. Writing a file in one format 
+removes any copy in the other so there is only ever one version of the data.
+
+hdf5        A single hdf5 file written by pandas in fixed format
+parquet     A folder with the extension .parquet containing a parquet file for each range of frames
+"""
+
+DATA_FORMATS = ('hdf5', 'parquet')
+
+#Settings of HDF5Backend which can be chosen by name with config['_hdf5_profile']. The profile
+#can also be a dictionary of the settings. See general.storage_benchmark to compare them.
+HDF5_PROFILES = {'default': {},
+                 'fast': {'complib': 'blosc:lz4', 'complevel': 1},
+                 'balanced': {'complib': 'blosc:zstd', 'complevel': 5},
+                 'small': {'complib': 'zlib', 'complevel': 9},
+                 'table': {'complib': 'blosc:lz4', 'complevel': 1, 'format': 'table', 'chunk_frames': 100}}
+
+
+def parquet_path(filename):
+    """Folder in which the parquet version of the data file filename is stored"""
+    return os.path.splitext(filename)[0] + '.parquet'
+
+
+def data_format_of(filename):
+    """Format the data file filename is stored in or None if it doesn't exist"""
+    if os.path.isfile(filename):
+        return 'hdf5'
+    if os.path.isdir(parquet_path(filename)):
+        return 'parquet'
+    return None
+
+
+def data_exists(filename):
+    """True if the data file exists in any format"""
+    return data_format_of(filename) is not None
+
+
+def write_data_file(filename, df, fingerprint=None, data_format='hdf5', backend=None):
+    """Writes a whole dataframe to filename in data_format removing any copy in another format.
+    backend writes the data if given, otherwise the default backend of data_format"""
+    if data_format not in BACKENDS:
+        raise ValueError(f"Unknown data format {data_format}, options are {DATA_FORMATS}")
+    (backend or BACKENDS[data_format]).write(filename, df, fingerprint=fingerprint)
+    for other_format, backend in BACKENDS.items():
+        if other_format != data_format:
+            backend.remove(filename)
+
+
+def finalise_data_file(filename, output_filename, keep_source=True):
+    """Puts a data file, in whatever format it is stored, at output_filename with a checksum sidecar
+
+    The data is hard linked, or renamed if keep_source is False, and only copied if that isn't 
+    possible (see transfer_file). The sha256 checksums of the files are written next to the 
+    output in the format of sha256sum eg movie.hdf5.sha256, so the data can be checked with 
+    sha256sum -c movie.hdf5.sha256
+    """
+    data_format = data_format_of(filename)
+    if data_format is None:
+        return
+    BACKENDS[data_format].finalise(filename, output_filename, keep_source=keep_source)
+    for other_format, backend in BACKENDS.items():
+        if other_format != data_format:
+            backend.remove(output_filename)
+
+
+def transfer_file(filename, output_filename, keep_source=True):
+    """Makes output_filename a copy of filename and returns its sha256 checksum
+
+    On the same filesystem no data is copied. A hard link is made if keep_source is True 
+    so both names share the data, which is safe because data files are never changed in 
+    place (see HDF5Backend.write), otherwise the file is renamed. Across devices, or where 
+    hard links aren't supported, the file is copied in blocks calculating the checksum as 
+    it goes. The output only appears under its final name once it is complete.
+    """
+    part = output_filename + '.part'
+    if os.path.lexists(part):
+        os.remove(part)
+    try:
+        if keep_source:
+            os.link(filename, part)
+        else:
+            os.replace(filename, part)
+        checksum = file_checksum(part)
+    except OSError:
+        checksum = _copy_with_checksum(filename, part)
+        if not keep_source:
+            os.remove(filename)
+    os.replace(part, output_filename)
+    return checksum
+
+
+def file_checksum(filename, block_size=16 * 1024 * 1024):
+    """sha256 of a file as a hex string"""
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _copy_with_checksum(filename, output_filename, block_size=16 * 1024 * 1024):
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as source, open(output_filename, 'wb') as output:
+        for block in iter(lambda: source.read(block_size), b''):
+            sha.update(block)
+            output.write(block)
+        output.flush()
+        os.fsync(output.fileno())
+    return sha.hexdigest()
+
+
+def write_checksums(path, checksums):
+    """Writes path.sha256 containing checksums, a dictionary of filename relative to the folder of path : sha256"""
+    with open(path + '.sha256.part', 'w') as f:
+        for name, checksum in checksums.items():
+            f.write(f'{checksum}  {name}\n')
+    os.replace(path + '.sha256.part', path + '.sha256')
+
+
+class HDF5Backend:
+    """Dataframe stored with key 'data' and the fingerprint as an attribute
+
+    Parameters
+    ----------
+    complib : str or None
+        Compression library eg 'zlib', 'blosc', 'blosc:lz4', 'blosc:zstd'. None is uncompressed.
+    complevel : int
+        Compression level 0-9
+    format : str
+        'fixed' is the quickest to write and read whole. 'table' stores the rows in chunks 
+        of about chunk_frames frames which are searched so that a range of frames can be 
+        read without reading the whole file. Only strings and numbers can be stored in a 
+        table so data with object columns (eg contours, neighbours) is stored fixed.
+    chunk_frames : int
+        Frames per chunk of a table
+    """
+    def __init__(self, complib=None, complevel=0, format='fixed', chunk_frames=100):
+        self.complib = complib
+        self.complevel = complevel
+        self.format = format
+        self.chunk_frames = chunk_frames
+
+    def write(self, filename, df, fingerprint=None):
+        #A new file replaces the old one rather than rewriting it. Rewriting the data of an existing 
+        #file doesn't free the space it used and would change any hard links to it (see transfer_file)
+        with pd.HDFStore(filename + '.part', 'w', complib=self.complib, complevel=self.complevel or None) as store:
+            if self.format == 'table' and len(df) > 0 and self._table_storable(df):
+                self._write_table(store, df)
+            else:
+                store.put('data', df)
+            if fingerprint is not None:
+                store.get_storer('data').attrs.fingerprint = fingerprint
+        os.replace(filename + '.part', filename)
+
+    def _table_storable(self, df):
+        return all(df[column].dtype != object or pd.api.types.infer_dtype(df[column], skipna=True) in ('string', 'empty')
+                   for column in df.columns)
+
+    def _write_table(self, store, df):
+        """pandas doesn't set the chunk shape of a table so the table is copied to one with chunks of chunk_frames frames"""
+        num_frames = max(1, df.index.nunique())
+        chunk_rows = max(1, int(np.ceil(len(df) * self.chunk_frames / num_frames)))
+        store.append('data', df, chunksize=chunk_rows, expectedrows=len(df), index=False)
+        table = store.get_storer('data').table
+        if table.chunkshape != (chunk_rows,):
+            chunked_table = table.copy(newname='_table', chunkshape=(chunk_rows,))
+            table.remove()
+            chunked_table.rename('table')
+        store.create_table_index('data')
+
+    def read(self, filename, columns=None, key='data', frames=None):
+        """Fixed format dataframes are stored in blocks, one for each type of column. Only 
+        the blocks containing the columns asked for are read so that, for example, the large 
+        object columns (contours, voronoi, box_pts, neighbours) are skipped if only x, y 
+        and particle are needed. Tables only read the rows of the frames asked for."""
+        with pd.HDFStore(filename, 'r') as store:
+            storer = store.get_storer(key)
+            if storer.is_table:
+                if columns is not None:
+                    columns = [column for column in columns if column in storer.non_index_axes[0][1]]
+                where = None if frames is None else f'index >= {float(frames[0])} & index <= {float(frames[1])}'
+                return store.select(key, where=where, columns=columns)
+            if columns is None:
+                df = store.select(key)
+            else:
+                df = self._read_blocks(storer, columns)
+        if frames is not None:
+            if not df.index.is_monotonic_increasing:
+                df = df.sort_index(kind='stable')
+            df = df.loc[frames[0]:frames[1]]
+        return df
+
+    def _read_blocks(self, storer, columns):
+        index = storer.read_index('axis1')
+        items = storer.read_index('axis0')
+        wanted = [column for column in items if column in set(columns)]
+        dfs = []
+        for i in range(storer.nblocks):
+            block_items = storer.read_index(f'block{i}_items')
+            if not any(column in wanted for column in block_items):
+                continue
+            values = storer.read_array(f'block{i}_values')
+            df = pd.DataFrame(values.T, columns=block_items, index=index, copy=False)
+            if values.dtype == object and pd.api.types.infer_dtype(values.ravel(), skipna=True) == 'string':
+                #Same conversion as read_hdf
+                df = df.infer_objects()
+            dfs.append(df)
+        if len(dfs) == 0:
+            return pd.DataFrame(index=index)
+        return pd.concat(dfs, axis=1)[wanted]
+
+    def read_fingerprint(self, filename):
+        try:
+            with pd.HDFStore(filename, mode='r') as store:
+                return getattr(store.get_storer('data').attrs, 'fingerprint', None)
+        except Exception:
+            return None
+
+    def finalise(self, filename, output_filename, keep_source=True):
+        checksum = transfer_file(filename, output_filename, keep_source=keep_source)
+        write_checksums(output_filename, {os.path.basename(output_filename): checksum})
+
+    def remove(self, filename):
+        for name in (filename, filename + '.sha256'):
+            if os.path.isfile(name):
+                os.remove(name)
+
+
+class ParquetBackend:
+    """Dataframe stored as a folder of parquet files, each holding partition_frames frames
+    eg movie_track.parquet/frames_00000000_00000999.parquet
+    
+    Reads use several threads, memory map the files and only decode the columns asked for. 
+    Each file is split into row groups of about row_group_frames frames. Reading a range of 
+    frames passes a filter on frame to arrow which skips every file and row group whose 
+    frames lie outside the range (predicate pushdown). 
+    
+    Object columns holding arrays or lists (contours, box_pts, neighbours etc) can't be 
+    stored by arrow are pickled and complex columns are stored as the bytes of each value. 
+    Their names and the fingerprint are kept in the metadata
+    of the schema. Needs the pyarrow package.
+    """
+    METADATA_KEY = b'particletracker'
+
+    def __init__(self, partition_frames=1000, row_group_frames=50):
+        self.partition_frames = partition_frames
+        self.row_group_frames = row_group_frames
+
+    def write(self, filename, df, fingerprint=None):
+        pa, pq = _import_pyarrow()
+        folder = parquet_path(filename)
+        df, encoded = self._encode(df.rename_axis('frame'))
+        metadata = json.dumps({'fingerprint': fingerprint, 'encoded': encoded}).encode()
+
+        #Written to a new folder which only replaces the old one once it is complete
+        shutil.rmtree(folder + '.part', ignore_errors=True)
+        os.makedirs(folder + '.part')
+        frames = df.index.to_numpy()
+        if not df.index.is_monotonic_increasing:
+            order = np.argsort(frames, kind='stable')
+            df, frames = df.iloc[order], frames[order]
+        first_frames, starts = np.unique(frames // self.partition_frames, return_index=True)
+        stops = np.append(starts[1:], len(frames))
+        for start, stop in zip(starts, stops):
+            part_name = f'frames_{frames[start]:08d}_{frames[stop - 1]:08d}.parquet'
+            self._write_part(pa, pq, df.iloc[start:stop], folder + '.part/' + part_name, metadata)
+        if len(first_frames) == 0:
+            #Keeps the columns and fingerprint of an empty dataframe
+            self._write_part(pa, pq, df, folder + '.part/frames_empty.parquet', metadata)
+        shutil.rmtree(folder, ignore_errors=True)
+        os.replace(folder + '.part', folder)
+
+    def _write_part(self, pa, pq, df, part_filename, metadata):
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        table = table.replace_schema_metadata({**table.schema.metadata, self.METADATA_KEY: metadata})
+        num_frames = max(1, df.index.nunique())
+        row_group_size = max(1, int(np.ceil(len(df) * self.row_group_frames / num_frames)))
+        pq.write_table(table, part_filename, row_group_size=row_group_size)
+
+    def read(self, filename, columns=None, frames=None):
+        pa, pq = _import_pyarrow()
+        folder = parquet_path(filename)
+        schema = pq.read_schema(self._parts(folder)[0])
+        if columns is not None:
+            columns = ['frame'] + [column for column in schema.names if column in set(columns) and column != 'frame']
+        filters = None if frames is None else [('frame', '>=', frames[0]), ('frame', '<=', frames[1])]
+        table = pq.read_table(folder, columns=columns, filters=filters, use_threads=True,
+                              memory_map=True, use_pandas_metadata=True)
+        df = table.to_pandas()
+        if df.index.name != 'frame':
+            df = df.set_index('frame')
+        for column, encoding in self._metadata(schema)['encoded'].items():
+            if column in df.columns:
+                df[column] = self._decode(df[column], encoding)
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index(kind='stable')
+        return df
+
+    def read_fingerprint(self, filename):
+        try:
+            _, pq = _import_pyarrow()
+            return self._metadata(pq.read_schema(self._parts(parquet_path(filename))[0]))['fingerprint']
+        except Exception:
+            return None
+
+    def finalise(self, filename, output_filename, keep_source=True):
+        folder, output_folder = parquet_path(filename), parquet_path(output_filename)
+        shutil.rmtree(output_folder + '.part', ignore_errors=True)
+        os.makedirs(output_folder + '.part')
+        checksums = {}
+        for part_filename in self._parts(folder):
+            name = os.path.basename(part_filename)
+            checksums[os.path.basename(output_folder) + '/' + name] = transfer_file(
+                part_filename, os.path.join(output_folder + '.part', name), keep_source=keep_source)
+        shutil.rmtree(output_folder, ignore_errors=True)
+        os.replace(output_folder + '.part', output_folder)
+        if not keep_source:
+            shutil.rmtree(folder, ignore_errors=True)
+        write_checksums(output_folder, checksums)
+
+    def remove(self, filename):
+        shutil.rmtree(parquet_path(filename), ignore_errors=True)
+        if os.path.isfile(parquet_path(filename) + '.sha256'):
+            os.remove(parquet_path(filename) + '.sha256')
+
+    def _metadata(self, schema):
+        return json.loads(schema.metadata[self.METADATA_KEY])
+
+    def _parts(self, folder):
+        return sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.endswith('.parquet'))
+
+    def _encode(self, df):
+        """Replaces columns arrow can't store with bytes. Returns the new dataframe and 
+        a dictionary of column name : 'pickle' or the complex dtype"""
+        encoded = {}
+        for column in df.columns:
+            if df[column].dtype == object and pd.api.types.infer_dtype(df[column], skipna=True) not in ('string', 'empty', 'boolean'):
+                encoded[column] = 'pickle'
+            elif df[column].dtype.kind == 'c':
+                encoded[column] = df[column].dtype.str
+        if encoded:
+            df = df.copy(deep=False)
+            for column, encoding in encoded.items():
+                if encoding == 'pickle':
+                    df[column] = [pickle.dumps(value) for value in df[column]]
+                else:
+                    df[column] = [value.tobytes() for value in df[column].to_numpy()]
+        return df, encoded
+
+    def _decode(self, values, encoding):
+        if encoding == 'pickle':
+            return [pickle.loads(value) for value in values]
+        return np.frombuffer(b''.join(values), dtype=np.dtype(encoding))
+
+
+@error_with_hint(additional_message="HINT: The parquet data format needs the pyarrow package.")
+def _import_pyarrow():
+    import pyarrow
+    import pyarrow.parquet
+    return pyarrow, pyarrow.parquet
+
+
+def hdf5_backend(profile='default'):
+    """HDF5Backend with the settings of profile, the name of one of HDF5_PROFILES or a dictionary"""
+    if isinstance(profile, str):
+        if profile not in HDF5_PROFILES:
+            raise ValueError(f"Unknown hdf5 profile {profile}, options are {tuple(HDF5_PROFILES)}")
+        profile = HDF5_PROFILES[profile]
+    return HDF5Backend(**(profile or {}))
+
+
+BACKENDS = {'hdf5': HDF5Backend(), 'parquet': ParquetBackend()}
+
+
+class DataStorage:
+    """How whole movie data files are written, set from config['_data_format'], 
+    config['_compact_dtypes'] and config['_hdf5_profile'].
+
+    Each DataManager has its own so projects with different settings can be processed 
+    in the same python session. The default is an uncompressed hdf5 file of the data as it is.
+
+    Parameters
+    ----------
+    data_format : str
+        One of DATA_FORMATS
+    compact_dtypes : bool
+        If True columns are stored as the types in general.schema
+    hdf5_profile : str or dict
+        Settings of the HDF5Backend, see hdf5_backend
+    """
+    def __init__(self, data_format='hdf5', compact_dtypes=False, hdf5_profile='default'):
+        if data_format not in BACKENDS:
+            raise ValueError(f"Unknown data format {data_format}, options are {DATA_FORMATS}")
+        self.data_format = data_format
+        self.compact_dtypes = compact_dtypes
+        self.backend = hdf5_backend(hdf5_profile) if data_format == 'hdf5' else BACKENDS[data_format]
+
+    def write(self, filename, df, fingerprint=None):
+        if self.compact_dtypes:
+            df = apply_schema(df)
+        write_data_file(filename, df, fingerprint=fingerprint, data_format=self.data_format, backend=self.backend)
+
+
+def uses_columns(*columns, column_params=()):
+    """uses_columns decorator declares which columns of the data a method reads so that 
+    only those need to be loaded (see required_columns).
+
+    Parameters
+    ----------
+    columns : str
+        Names of columns the method always uses
+    column_params : tuple of str
+        Names of the method's parameters whose values are column names
+    """
+    def decorator(func):
+        func.columns = columns
+        func.column_params = column_params
+        return func
+    return decorator
+
+
+def required_columns(methods, parameters, section):
+    """Columns needed by the methods selected in one section of the parameters
+
+    Parameters
+    ----------
+    methods : module
+        Module containing the methods eg annotate.annotation_methods
+    parameters : dict
+        Full parameters dictionary
+    section : str
+        eg 'annotate'
+
+    Returns
+    -------
+    list of str or None if any of the methods doesn't declare its columns (see uses_columns)
+    """
+    columns = {'particle'}
+    for method in parameters[section][section + '_method']:
+        method_name, _ = get_method_name(method)
+        func = getattr(methods, method_name, None)
+        if not hasattr(func, 'columns'):
+            return None
+        columns.update(func.columns)
+        method_params = parameters[section][method]
+        for param in func.column_params:
+            value = get_param_val(method_params.get(param)) if type(method_params) is dict else None
+            if isinstance(value, str):
+                columns.add(value)
+    return sorted(columns)
+
+
 def df_single(func):
     """df_single decorator is designed to send a single frame of the data to a function"""
     @functools.wraps(func)
     def wrapper_param_format(*args, **kwargs):
         df = args[0]
-        new_args = (df.loc[kwargs['f_index']],) + args[1:]
+        f_index = kwargs['f_index']
+        if len(df) > 0 and df.index[0] == f_index and df.index[-1] == f_index and df.index.is_monotonic_increasing:
+            #Already sliced to this frame (see FrameSlicer) so skip the search of the index
+            new_args = args
+        else:
+            new_args = (df.loc[f_index],) + args[1:]
         
         return func(*new_args, **kwargs)
     return wrapper_param_format
@@ -206,13 +751,52 @@ def df_range(func):
     return wrapper_param_format
 
 
+class FrameSlicer:
+    """Finds the rows belonging to each frame of a dataframe once so that the data for 
+    a frame, or a range of frames, can be sliced out without searching the whole dataframe.
+
+    The slices share data with the original dataframe and should be treated as read-only.
+    """
+    def __init__(self, df):
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index(kind='stable')
+        self.df = df
+        frames = df.index.to_numpy()
+        #first row and one past the last row of each frame
+        self._frames, self._starts = np.unique(frames, return_index=True)
+        self._stops = np.append(self._starts[1:], len(frames))
+
+    def frame(self, f_index):
+        """Rows of a single frame"""
+        i = np.searchsorted(self._frames, f_index)
+        if i == len(self._frames) or self._frames[i] != f_index:
+            return self.df.iloc[0:0]
+        return self.df.iloc[self._starts[i]:self._stops[i]]
+
+    def window(self, start, finish):
+        """Rows of all frames from start to finish inclusive"""
+        i = np.searchsorted(self._frames, start, side='left')
+        j = np.searchsorted(self._frames, finish, side='right')
+        if i >= j:
+            return self.df.iloc[0:0]
+        return self.df.iloc[self._starts[i]:self._stops[j - 1]]
+
+
 class DataWrite:
 
-    def __init__(self, output_filename):
-        """Initialize output file for writing"""
+    def __init__(self, output_filename, fingerprint=None, storage=None):
+        """Initialize output file for writing
+        
+        fingerprint is an optional string stored with the data identifying the settings
+        and inputs it was built from. See general.fingerprints
+        
+        storage is the DataStorage of the project (DataManager.storage). None writes an 
+        uncompressed hdf5 file of the data as it is."""
         self._output_file = output_filename.replace('*', '')
         self._output_frames = []
         self._output_df = None
+        self._fingerprint = fingerprint
+        self._storage = storage or DataStorage()
 
     def write_data(self, df, f_index=None):
         """
@@ -256,11 +840,14 @@ class DataWrite:
         try:
             if self._output_df is not None:
                 # Write full dataframe
-                self._output_df.to_hdf(self._output_file, key='data')
+                final_df = self._output_df
             elif self._output_frames:
                 # Concatenate and write collected frames
                 final_df = pd.concat(self._output_frames)
-                final_df.to_hdf(self._output_file, key='data')
+            else:
+                final_df = None
+            if final_df is not None:
+                self._storage.write(self._output_file, final_df, fingerprint=self._fingerprint)
         except Exception as e:
             print(f'Error in writing data: {e}')
             raise  # Re-raise the exception after cleanup
@@ -278,6 +865,126 @@ class DataWrite:
         return None
 
 
+class DataCheckpoint:
+
+    def __init__(self, output_filename, frames, fingerprint=None, interval=500, storage=None):
+        """Writes whole movie data in chunks so that a run that is stopped part way
+        through can be resumed.
+
+        Every interval frames the buffered data is written to its own chunk file in a
+        _checkpoints folder next to the output file. Chunks left by a previous run
+        with the same fingerprint are reused, whatever order they were completed in,
+        and only the frames they do not cover need processing (see remaining_frames). When 
+        close_output is called the chunks are combined into output_filename and removed.
+
+        Parameters
+        ----------
+        output_filename : str
+            Path to the final HDF5 file
+        frames : iterable of int
+            All the frame numbers that make up the finished file
+        fingerprint : str or None
+            Identifies the settings the data is built from. Chunks with a different
+            fingerprint are discarded. See general.fingerprints
+        interval : int
+            Number of frames between checkpoints. 0 or None writes only at the end.
+        storage : DataStorage or None
+            How the output file is written, see DataWrite. The chunks are always uncompressed hdf5.
+        """
+        self._output_file = output_filename.replace('*', '')
+        self._checkpoint_folder = os.path.splitext(self._output_file)[0] + '_checkpoints/'
+        self._frames = list(frames)
+        self._fingerprint = fingerprint
+        self._interval = interval
+        self._storage = storage
+        self._output_frames = []
+        self._completed = {}
+        self._load_checkpoints()
+
+    def _load_checkpoints(self):
+        """Finds the chunks left by previous runs and the frames they contain"""
+        if not os.path.exists(self._checkpoint_folder):
+            return
+        for filename in sorted(os.listdir(self._checkpoint_folder)):
+            filename = self._checkpoint_folder + filename
+            if not filename.endswith('.hdf5') or read_fingerprint(filename) != self._fingerprint:
+                os.remove(filename)
+                continue
+            try:
+                frames = pd.read_hdf(filename, key='data').index.unique()
+            except Exception as e:
+                print(f'Error loading checkpoint {filename}: {e}')
+                os.remove(filename)
+                continue
+            self._completed[filename] = set(frames)
+        if self._completed:
+            num_done = len(set().union(*self._completed.values()).intersection(self._frames))
+            print(f'Resuming from checkpoint, {num_done} of {len(self._frames)} frames already processed')
+
+    @property
+    def remaining_frames(self):
+        """Frames not contained in any checkpoint, in processing order"""
+        completed = set().union(*self._completed.values())
+        return [f for f in self._frames if f not in completed]
+
+    def write_data(self, df, f_index):
+        """Buffers the data for frame f_index and writes a checkpoint every interval frames"""
+        df = df.copy()
+        df.index = pd.Index([f_index] * len(df), name='frame')
+        self._output_frames.append(df)
+        if self._interval and len(self._output_frames) >= self._interval:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Writes buffered frames to a new chunk file. The backend only gives the file its
+        final name once it is complete so an interrupted write is never mistaken for a chunk."""
+        if not self._output_frames:
+            return
+        os.makedirs(self._checkpoint_folder, exist_ok=True)
+        chunk_df = pd.concat(self._output_frames)
+        first, last = chunk_df.index.min(), chunk_df.index.max()
+        filename = f"{self._checkpoint_folder}frames_{first:08d}_{last:08d}.hdf5"
+        BACKENDS['hdf5'].write(filename, chunk_df, fingerprint=self._fingerprint)
+        self._completed[filename] = set(chunk_df.index.unique())
+        self._output_frames = []
+
+    def close_output(self):
+        """Combine all the chunks into the output file and remove the checkpoints"""
+        self.checkpoint()
+        wanted = set(self._frames)
+        chunks = []
+        for filename, frames in self._completed.items():
+            #Chunks may overlap if several runs worked on the same frames
+            chunk = pd.read_hdf(filename, key='data')
+            chunks.append(chunk[chunk.index.isin(wanted)])
+            wanted -= frames
+        with DataWrite(self._output_file, fingerprint=self._fingerprint, storage=self._storage) as store:
+            if chunks:
+                store.write_data(pd.concat(chunks).sort_index(kind='stable'))
+        shutil.rmtree(self._checkpoint_folder, ignore_errors=True)
+        self._completed = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close_output()
+        else:
+            #Keep everything processed so far so the run can be resumed
+            self.checkpoint()
+        return None
+
+
+def read_fingerprint(filename):
+    """Returns the fingerprint stored in a data file or None if there isn't one"""
+    data_format = data_format_of(filename)
+    if data_format is None:
+        return None
+    fingerprint = BACKENDS[data_format].read_fingerprint(filename)
+    return None if fingerprint is None else str(fingerprint)
+
+
 def combine_data_frames(df, modified_df):
     """
     Merges single-frame modified data (modified_df) back into 
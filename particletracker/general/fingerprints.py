@@ -0,0 +1,101 @@
+import glob
+import hashlib
+import os
+
+from .parameters import get_param_val
+
+
+"""
+Each whole movie data file (_track, _link, _postprocess) stores a fingerprint of
+everything it was built from. If the fingerprint of a stored file matches the
+fingerprint calculated from the current settings the stage does not need to be rerun.
+Fingerprints are chained so that the fingerprint of a stage includes the fingerprint
+of the data it was built from.
+"""
+
+#The parameter sections that determine the output of _track, _link and _postprocess
+STAGE_SECTIONS = (('crop', 'preprocess', 'track'),
+                  ('link',),
+                  ('postprocess',))
+
+
+def stage_fingerprint(parameters, part, input_fingerprint=None):
+    """Calculates the fingerprint for a stage of the processing
+
+    Parameters
+    ----------
+    parameters : dict
+        Full parameters dictionary
+    part : int
+        0 = track, 1 = link, 2 = postprocess
+    input_fingerprint : str or None
+        Fingerprint of the data the stage reads. Tracking reads the video so this
+        is ignored for part 0.
+
+    Returns
+    -------
+    str
+    """
+    if part == 0:
+        video_filename = parameters['config']['_video_filename']
+        inputs = [_file_signature(video_filename), parameters['config']['_frame_range']]
+    else:
+        inputs = [input_fingerprint]
+
+    for section in STAGE_SECTIONS[part]:
+        inputs.append(_active_params(parameters, section))
+        inputs.extend([_file_signature(filename) for filename in _input_files(parameters, section)])
+    return hashlib.sha1(repr(inputs).encode()).hexdigest()
+
+
+def expected_fingerprints(parameters):
+    """Fingerprints of (_track, _link, _postprocess) if each were built from the current settings"""
+    fingerprints = []
+    fingerprint = None
+    for part in range(len(STAGE_SECTIONS)):
+        fingerprint = stage_fingerprint(parameters, part, fingerprint)
+        fingerprints.append(fingerprint)
+    return fingerprints
+
+
+def _active_params(parameters, section):
+    """Only the methods in use can change the output"""
+    if section == 'crop':
+        return parameters['crop']
+    params = parameters[section]
+    methods = params[section + '_method']
+    active = {section + '_method': methods}
+    for method in methods:
+        if type(params[method]) is dict:
+            active[method] = {key: get_param_val(value) for key, value in params[method].items()}
+        else:
+            active[method] = params[method]
+    return active
+
+
+def _input_files(parameters, section):
+    """Returns files other than the video whose contents affect a section eg bkg images or csv files"""
+    if section not in parameters or section == 'crop':
+        return []
+    path, movie_filename = os.path.split(parameters['config']['_video_filename'])
+    params = parameters[section]
+    filenames = []
+    for method in params[section + '_method']:
+        if type(params[method]) is not dict:
+            continue
+        for key, value in params[method].items():
+            value = get_param_val(value)
+            if ('filename' in key or 'filepath' in key) and isinstance(value, str):
+                filenames.append(os.path.join(params[method].get('data_path', path), value))
+            elif key == 'subtract_bkg_filename' and value is None:
+                filenames.append(os.path.join(path, os.path.splitext(movie_filename)[0].replace('*', '') + '_bkgimg.png'))
+    return filenames
+
+
+def _file_signature(filename):
+    """Name, size and modification time of a file or the files in an image sequence"""
+    if filename is None:
+        return None
+    filenames = sorted(glob.glob(filename)) if '*' in filename else [filename]
+    return [(os.path.basename(name), os.path.getsize(name), int(os.path.getmtime(name)))
+            for name in filenames if os.path.exists(name)]
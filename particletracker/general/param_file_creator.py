@@ -9,10 +9,29 @@ def create_param_file(filename):
               '_frame_range': (0, None, 1),
               '_cleanup': True,
               '_locked_part' : -1,
+              '_fused_processing': True,
+              '_incremental_processing': True,
+              '_checkpoint_interval': 500,
+              '_annotate_workers': 1,
+              '_render_at_scale': False,
+              '_encoder_codec': None,
+              '_encoder_threads': 0,
+              '_encoder_queue': 16,
+              '_data_format': 'hdf5',
+              '_compact_dtypes': False,
+              '_hdf5_profile': 'default',
+              '_keep_temp_data': True,
+              '_preprocess_buffers': True,
+              '_preprocess_tiles': 1,
+              '_track_mask_region': True,
+              '_preview_scale': 0.5,
               '_video_filename':None,
               'video_output': {'output':[True, ('True','False')], 
                          'fps': [30, 5, 60, 1], 
-                         'scale':[100, 5, 100, 1]
+                         'scale':[100, 5, 100, 1],
+                         'encoder':['labvision', ('labvision', 'ffmpeg', 'opencv', 'png', 'tiff', 'overlay')],
+                         'preset':['medium', ('ultrafast', 'veryfast', 'fast', 'medium', 'slow')],
+                         'crf':[23, 0, 51, 1]
                           }
               }
 
@@ -46,6 +65,11 @@ def create_param_file(filename):
                          'subtract_bkg_invert': [True, ('True', 'False')],
                          'subtract_bkg_norm': [True, ('True', 'False')]
                          },
+        'subtract_rolling_bkg': {'window': [10, 2, 200, 1],
+                                 'bkg_type': ['median', ('mean', 'median')],
+                                 'invert': [True, ('True', 'False')],
+                                 'norm': [True, ('True', 'False')]
+                                 },
         'absolute_diff': {'normalise': [True, ('True', 'False')],
                           'value': [125, 1, 255, 1]
                           },
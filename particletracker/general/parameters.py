@@ -1,3 +1,4 @@
+import contextlib
 import functools
 import os
 
@@ -42,6 +43,14 @@ def get_span(params):
                         span = params[key][key_inner][0]
     return span
 
+def frame_local(params, section):
+    """Returns True if none of the active methods in a section e.g parameters['postprocess'] 
+    need data from other frames. Methods that do have a span parameter."""
+    for method in params[section + '_method']:
+        if type(params[method]) is dict and 'span' in params[method].keys():
+            return False
+    return True
+
 def get_parent(func):
     filename = func.__file__
 
@@ -97,12 +106,119 @@ def param_parse(func):
     you'll need to implement this inside  your function and not have the decorator.
 
     There is an example in preprocessing >  subtract_bkg
+
+    If the function is called with parsed=True the parameters are assumed to have been
+    parsed already (see compile_methods) and are passed on as they are.
     # """
     @functools.wraps(func)
-    def wrapper_param_format(*args, **kwargs):
-        method_key = get_method_key(func.__name__, call_num=kwargs['call_num'])
-        params = kwargs['parameters'][kwargs['section']][method_key]
-        params = {key : get_param_val(value) for (key, value) in params.items()}
-        kwargs['parameters'] = params
+    def wrapper_param_format(*args, parsed=False, **kwargs):
+        if not parsed:
+            method_key = get_method_key(func.__name__, call_num=kwargs['call_num'])
+            params = kwargs['parameters'][kwargs['section']][method_key]
+            params = {key : get_param_val(value) for (key, value) in params.items()}
+            kwargs['parameters'] = params
         return func(*args, **kwargs)
+    wrapper_param_format.parses_params = True
     return wrapper_param_format
+
+
+class CompiledMethod:
+    """One of the methods selected in a section of the parameters with its arguments bound.
+
+    The method name and call number are split and the function looked up once. Methods
+    with the param_parse decorator are bound to their parsed parameters, others to the
+    full parameters dictionary which they read when called. half_span is None unless
+    the method has a span parameter. func is the method itself.
+    """
+    __slots__ = ('method', 'func', 'call', 'half_span')
+
+    def __init__(self, methods, parameters, section, method):
+        method_name, call_num = get_method_name(method)
+        func = getattr(methods, method_name)
+        method_params = parameters[section].get(method)
+        if getattr(func, 'parses_params', False) and type(method_params) is dict:
+            params = {key : get_param_val(value) for (key, value) in method_params.items()}
+            self.call = functools.partial(func, parameters=params, parsed=True, call_num=call_num, section=section)
+        else:
+            self.call = functools.partial(func, parameters=parameters, call_num=call_num, section=section)
+        if type(method_params) is dict and 'span' in method_params:
+            self.half_span = get_param_val(method_params['span']) // 2
+        else:
+            self.half_span = None
+        self.method = method
+        self.func = func
+
+    def __call__(self, *args, **kwargs):
+        return self.call(*args, **kwargs)
+
+
+def compile_methods(methods, parameters, section):
+    """The methods selected in one section of the parameters as a list of CompiledMethod
+    to be called in order
+
+    Parameters
+    ----------
+    methods : module
+        Module containing the methods eg preprocess.preprocessing_methods
+    parameters : dict
+        Full parameters dictionary
+    section : str
+        eg 'preprocess'
+    """
+    return [CompiledMethod(methods, parameters, section, method)
+            for method in parameters[section][section + '_method']]
+
+
+#Number of times parameters have been changed in place, see parameters_changed
+_version = 0
+
+
+def parameters_changed():
+    """Must be called after a value in a parameters dictionary is changed in place, eg by a
+    slider in the gui, so that the methods compiled from it are compiled again (see MethodChain).
+    A new parameters dictionary doesn't need it."""
+    global _version
+    _version += 1
+
+
+def parameters_version():
+    """Changes whenever parameters_changed is called, so anything built from a parameters 
+    dictionary can tell when it needs building again"""
+    return _version
+
+
+class MethodChain:
+    """The compiled methods of one section of the parameters (see compile_methods).
+
+    They are compiled the first time they are needed and reused for every frame until
+    they are given a different parameters dictionary or parameters_changed is called, eg 
+    when a slider is moved in the gui. While a whole movie is processed, when the parameters 
+    can't change, they aren't checked at all (see fixed).
+    """
+
+    def __init__(self, methods, section):
+        self.methods = methods
+        self.section = section
+        self._parameters = None
+        self._version = None
+        self._compiled = None
+        self._fixed = False
+
+    def compile(self, parameters):
+        if self._fixed:
+            return self._compiled
+        if parameters is not self._parameters or _version != self._version:
+            self._compiled = compile_methods(self.methods, parameters, self.section)
+            self._parameters = parameters
+            self._version = _version
+        return self._compiled
+
+    @contextlib.contextmanager
+    def fixed(self, parameters):
+        """Within the block the methods are compiled from parameters once and not checked again"""
+        self.compile(parameters)
+        self._fixed = True
+        try:
+            yield self
+        finally:
+            self._fixed = False
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+
+"""
+Compact column types for the whole movie data files. Without them every number the
+tracking methods produce is stored as float64, particle ids as int64 and some outputs
+(classify, hexatic_order) as python objects which are pickled. apply_schema is used
+when a data file is written (see DataWrite) and check_schema when one is read.
+
+SCHEMA gives the type of each column the built in methods produce. Columns that aren't
+in SCHEMA are left alone except that object columns holding only True and False become
+bool and complex128 columns become complex64. A column is only converted if no
+information is lost, eg an id column containing NaN is stored as float32 instead of
+int32, ids too large for int32 are left as they are and columns of integers, eg the
+positions found by the contours method, are stored as int32 rather than float32.
+
+float32 keeps positions to better than 0.001 pixel in images up to 8000 pixels across
+which is well below the accuracy of any of the tracking methods.
+"""
+
+SCHEMA = {
+    #tracking
+    'x': np.float32, 'y': np.float32, 'r': np.float32, 'area': np.float32, 'intensities': np.float32,
+    'mass': np.float32, 'size': np.float32, 'ecc': np.float32, 'signal': np.float32,
+    'raw_mass': np.float32, 'ep': np.float32,
+    #linking
+    'particle': np.int32,
+    #postprocessing
+    'box_cx': np.float32, 'box_cy': np.float32, 'box_angle': np.float32, 'box_length': np.float32,
+    'box_width': np.float32, 'box_area': np.float32, 'voronoi_area': np.float32,
+    'hexatic_order_complex': np.complex64, 'hexatic_order_magnitude': np.float32,
+    'hexatic_order_phase': np.float32, 'number_of_neighbours': np.int32,
+}
+
+#Values an object column may infer as and still be converted to a number
+_NUMERIC_OBJECTS = ('floating', 'integer', 'mixed-integer-float', 'complex', 'decimal', 'empty')
+
+
+def apply_schema(df, schema=None):
+    """Returns df with its columns converted to the compact types
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+    schema : dict or None
+        Column name : dtype. Defaults to SCHEMA
+
+    Returns
+    -------
+    pd.DataFrame sharing the data of any columns that are unchanged
+    """
+    schema = SCHEMA if schema is None else schema
+    converted = {}
+    for column in df.columns.unique():
+        values = df[column]
+        if isinstance(values, pd.DataFrame):
+            continue
+        if column in schema:
+            new_values = _convert(values, np.dtype(schema[column]))
+        elif values.dtype == object and len(values) > 0 and pd.api.types.infer_dtype(values, skipna=False) == 'boolean':
+            new_values = values.to_numpy().astype(bool)
+        elif values.dtype == np.complex128:
+            new_values = values.to_numpy().astype(np.complex64)
+        else:
+            new_values = None
+        if new_values is not None:
+            converted[column] = new_values
+
+    if not converted:
+        return df
+    df = df.copy(deep=False)
+    for column, new_values in converted.items():
+        df[column] = new_values
+    return df
+
+
+def check_schema(df, schema=None):
+    """Columns of df whose values can't be of the type given in the schema
+
+    Files written before the schema, or without config['_compact_dtypes'] = True, store
+    wider types (eg float64) or numbers as objects. These are accepted. Only columns
+    holding something else, eg strings in x, are returned.
+
+    Returns
+    -------
+    dict of column name : dtype found
+    """
+    schema = SCHEMA if schema is None else schema
+    wrong = {}
+    for column, dtype in schema.items():
+        if column not in df.columns or isinstance(df[column], pd.DataFrame):
+            continue
+        values = df[column]
+        if values.dtype == object:
+            ok = pd.api.types.infer_dtype(values, skipna=True) in _NUMERIC_OBJECTS
+        else:
+            ok = values.dtype.kind in _compatible_kinds(np.dtype(dtype))
+        if not ok:
+            wrong[column] = values.dtype
+    return wrong
+
+
+def _compatible_kinds(dtype):
+    """numpy kinds that can hold the values of a column of type dtype"""
+    return {'f': 'fiub', 'c': 'cfiub', 'i': 'iuf', 'u': 'iuf', 'b': 'b'}.get(dtype.kind, dtype.kind)
+
+
+def _convert(values, dtype):
+    """values as dtype, or None if they are already that type or can't be converted without loss"""
+    if values.dtype == dtype:
+        return None
+    array = values.to_numpy()
+    if array.dtype == object:
+        if len(array) > 0 and pd.api.types.infer_dtype(array, skipna=True) not in _NUMERIC_OBJECTS:
+            return None
+        try:
+            array = array.astype(np.complex128 if dtype.kind == 'c' else np.float64)
+        except (TypeError, ValueError):
+            return None
+    if array.dtype.kind not in _compatible_kinds(dtype) or array.dtype.kind == 'b':
+        return None
+    if dtype.kind in 'fc' and array.dtype.kind in 'iu':
+        #Integer values, eg positions from contours, stay integers
+        dtype = np.dtype(np.int32)
+        if array.dtype == dtype:
+            return None
+
+    if dtype.kind in 'iu':
+        if array.dtype.kind == 'f':
+            if not np.isfinite(array).all():
+                #Ids that are missing for some rows can't be integers
+                return None if array.dtype == np.float32 else array.astype(np.float32)
+            if not (array == np.round(array)).all():
+                return None
+        info = np.iinfo(dtype)
+        if len(array) > 0 and (array.min() < info.min or array.max() > info.max):
+            return None
+    return array.astype(dtype)
@@ -0,0 +1,130 @@
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from .dataframes import HDF5_PROFILES, hdf5_backend
+
+
+"""
+Compares the hdf5 profiles (see HDF5_PROFILES in general.dataframes) on real data so that
+one can be chosen for config['_hdf5_profile']. For each data file and profile the
+dataframe is written to and read back from a file in folder, ideally on the disk the
+data will be kept on (eg a NAS), and the size and throughput are reported. Throughput is
+the size of the dataframe in memory divided by the time taken. The movies in testdata are
+short so their data is repeated, as if the movie were longer, to give at least min_rows rows.
+
+From the command line:
+
+    python -m particletracker.general.storage_benchmark [folder]
+
+processes each movie in testdata with its test_<movie>.param settings and benchmarks
+the resulting data. folder defaults to a temporary folder.
+"""
+
+
+def benchmark_profiles(data_files, profiles=None, folder=None, repeats=3, min_rows=0):
+    """Measures the size and read/write speed of data files stored with each hdf5 profile
+
+    Parameters
+    ----------
+    data_files : list of str
+        Whole movie data files eg movie.hdf5
+    profiles : dict or None
+        name : profile. Defaults to HDF5_PROFILES
+    folder : str or None
+        Where the test files are written. Defaults to a temporary folder.
+    repeats : int
+        The fastest of repeats writes and reads is used
+    min_rows : int
+        The data is repeated to make at least this many rows
+
+    Returns
+    -------
+    pd.DataFrame with a row for each data file and profile
+    """
+    profiles = HDF5_PROFILES if profiles is None else profiles
+    temp_folder = folder is None
+    folder = tempfile.mkdtemp() if temp_folder else folder
+    results = []
+    for data_file in data_files:
+        df = _repeat_frames(hdf5_backend().read(data_file), min_rows)
+        memory_mb = df.memory_usage(deep=True).sum() / 1e6
+        first, last = df.index.min(), df.index.max()
+        frames = (first, first + (last - first) // 10)
+        for name, profile in profiles.items():
+            backend = hdf5_backend(profile)
+            filename = os.path.join(folder, f'_benchmark_{name}.hdf5')
+            write_time = _fastest(lambda: backend.write(filename, df), repeats)
+            read_time = _fastest(lambda: backend.read(filename), repeats)
+            range_time = _fastest(lambda: backend.read(filename, frames=frames), repeats)
+            size_mb = os.path.getsize(filename) / 1e6
+            os.remove(filename)
+            results.append({'data': os.path.basename(data_file), 'profile': name, 'rows': len(df),
+                            'memory_MB': memory_mb, 'file_MB': size_mb, 'ratio': memory_mb / size_mb,
+                            'write_MBps': memory_mb / write_time, 'read_MBps': memory_mb / read_time,
+                            'read_10%_frames_s': range_time})
+    if temp_folder:
+        shutil.rmtree(folder, ignore_errors=True)
+    return pd.DataFrame(results)
+
+
+def _repeat_frames(df, min_rows):
+    """Data of a longer movie made by repeating the frames of df"""
+    if len(df) == 0 or len(df) >= min_rows:
+        return df
+    repeats = int(np.ceil(min_rows / len(df)))
+    num_frames = df.index.max() - df.index.min() + 1
+    frames = df.index.to_numpy()
+    df = pd.concat([df] * repeats)
+    df.index = pd.Index(np.concatenate([frames + i * num_frames for i in range(repeats)]), name='frame')
+    return df
+
+
+def _fastest(func, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _process_testdata(testdata):
+    """Processes the bundled movies without annotation and returns their data files"""
+    #Imported here to avoid a circular import with project
+    from .. import batchprocess
+    from .writeread_param_dict import read_paramdict_file, write_paramdict_file
+
+    data_files = []
+    for movie in sorted(glob.glob(os.path.join(testdata, '*.mp4'))):
+        name = os.path.splitext(os.path.basename(movie))[0]
+        settings = os.path.join(testdata, f'test_{name}.param')
+        if name.endswith('_annotate') or not os.path.exists(settings):
+            continue
+        parameters = read_paramdict_file(settings)
+        parameters['config']['video_output']['output'][0] = False
+        parameters['config']['_hdf5_profile'] = 'default'
+        parameters['config']['_data_format'] = 'hdf5'
+        benchmark_settings = os.path.join(testdata, '_benchmark.param')
+        write_paramdict_file(parameters, benchmark_settings)
+        batchprocess(movie, benchmark_settings)
+        os.remove(benchmark_settings)
+        data_files.append(os.path.splitext(movie)[0] + '.hdf5')
+    shutil.rmtree(os.path.join(testdata, '_temp'), ignore_errors=True)
+    return data_files
+
+
+if __name__ == '__main__':
+    testdata = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'testdata')
+    data_files = _process_testdata(testdata)
+    results = benchmark_profiles(data_files, folder=sys.argv[1] if len(sys.argv) > 1 else None, min_rows=100000)
+    for data_file in data_files:
+        os.remove(data_file)
+    with pd.option_context('display.width', 200, 'display.max_columns', 20, 'display.float_format', '{:.2f}'.format):
+        print(results.to_string(index=False))
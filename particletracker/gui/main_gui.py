@@ -29,7 +29,7 @@ from .menubar import CustomButton, CustomToolBar
 from .custom_tab_widget import CustomTabWidget
 from ..project import PTWorkflow
 from ..general.writeread_param_dict import write_paramdict_file
-from ..general.parameters import parse_values
+from ..general.parameters import parse_values, parameters_changed
 from ..general.param_file_creator import create_param_file
 from ..customexceptions import flash_error_msg
 from ..general.dataframes import DataRead
@@ -39,6 +39,8 @@ from .pandas_view import PandasWidget
 
 from .file_io import check_filenames, open_movie_dialog, open_settings_dialog, save_settings_dialog
 
+#Time in ms after the last change of the settings before a preview is replaced by the full resolution frame
+PREVIEW_DELAY = 400
 
 
 
@@ -57,6 +59,11 @@ class MainWindow(QMainWindow):
         self.movie_filename, self.settings_filename = check_filenames(self, movie_filename, settings_filename)
         if 'default.param' in self.settings_filename:
             create_param_file(self.settings_filename)
+
+        #Restarted by every change of the settings so it only fires once they stop changing
+        self.full_resolution_timer = QTimer(self)
+        self.full_resolution_timer.setSingleShot(True)
+        self.full_resolution_timer.timeout.connect(self.full_resolution_update)
         self.reboot()
 
     def reboot(self):
@@ -460,7 +467,8 @@ class MainWindow(QMainWindow):
         which tells us where the signal has come from and hence what needs to be done with the value
 
         The values are sent to update the dictionary of settings and the viewer is reloaded with the image
-        processed with the new settings.
+        processed with the new settings. For large frames this is first a reduced resolution preview
+        (see project.preview) which is replaced once no setting has changed for PREVIEW_DELAY ms.
 
         """
         sender = self.sender()
@@ -493,6 +501,16 @@ class MainWindow(QMainWindow):
                 self.update_param_widgets('crop')
             if ('crop' in paramdict_location[1]) or ('mask' in paramdict_location[1]):
                 self.tracker.cap.set_mask()             
+        
+        #Large frames are shown at reduced resolution until the settings stop changing
+        if self.tracker.preview.scale() is not None:
+            self.update_viewer(preview=True)
+            self.full_resolution_timer.start(PREVIEW_DELAY)
+            return
+        self.full_resolution_update()
+
+    def full_resolution_update(self):
+        self.full_resolution_timer.stop()
         self.update_viewer()
         
         if self.pandas_read.isVisible():
@@ -583,6 +601,8 @@ class MainWindow(QMainWindow):
                 self.tracker.parameters[location[0]][location[1]][location[2]][0] = value 
             else:
                 self.tracker.parameters[location[0]][location[1]][location[2]] = value 
+        #The compiled methods are rebuilt with the new value
+        parameters_changed()
                 
     def update_param_widgets(self, title):
         for param_adjustor in self.toplevel_settings.list_param_adjustors:
@@ -590,11 +610,11 @@ class MainWindow(QMainWindow):
                 param_adjustor.remove_widgets()
                 param_adjustor.build_widgets(title, self.tracker.parameters[title])
 
-    def update_viewer(self):        
+    def update_viewer(self, preview=False):        
         if self.live_update_button.isChecked():
             frame_number = self.frame_selector.value()
 
-            annotated_img, proc_img = self.tracker.process(f_index=frame_number, lock_part=CustomButton.locked_part)
+            annotated_img, proc_img = self.tracker.process(f_index=frame_number, lock_part=CustomButton.locked_part, preview=preview)
 
             toggle = self.toggle_img.isChecked()
             if toggle:
@@ -4,6 +4,8 @@ from PyQt6.QtWidgets import *
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
 
+from ..general.dataframes import data_exists
+
 
 
 class CustomMenuBar(QMenuBar):
@@ -94,13 +96,13 @@ class CustomButton(QToolButton):
         prerequisite_files_ok=True
         #Trying to track requires no prerequisites
         if part >= 0:
-            prerequisite_files_ok = prerequisite_files_ok and os.path.exists(self.path + '/_temp/' + self.filename[:-4] + CustomButton.extension[0])
+            prerequisite_files_ok = prerequisite_files_ok and data_exists(self.path + '/_temp/' + self.filename[:-4] + CustomButton.extension[0])
         #Trying to link requires _track.hdf5
         if part >= 1:
-            prerequisite_files_ok = prerequisite_files_ok and os.path.exists(self.path + '/_temp/' + self.filename[:-4] + CustomButton.extension[1])
+            prerequisite_files_ok = prerequisite_files_ok and data_exists(self.path + '/_temp/' + self.filename[:-4] + CustomButton.extension[1])
         #Trying to postprocess requires _link.hdf5
         if part >=2: 
-            prerequisite_files_ok = prerequisite_files_ok and os.path.exists(self.path + '/_temp/' + self.filename[:-4] + CustomButton.extension[2])
+            prerequisite_files_ok = prerequisite_files_ok and data_exists(self.path + '/_temp/' + self.filename[:-4] + CustomButton.extension[2])
         return prerequisite_files_ok
     
     @classmethod
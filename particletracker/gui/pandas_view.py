@@ -5,7 +5,7 @@ import numpy as np
 from PyQt6 import QtCore, QtWidgets, QtGui
 from PyQt6.QtCore import Qt, pyqtSignal, pyqtSlot
 
-from ..general.dataframes import DataRead, combine_data_frames
+from ..general.dataframes import DataRead, combine_data_frames, write_data_file, data_format_of
 from ..customexceptions import *
 from ..gui.menubar import CustomButton
 
@@ -255,16 +255,17 @@ class PandasWidget(QtWidgets.QDialog):
 
 
         if write:
-            store._df.to_hdf(store.read_filename, key="data")
+            #Saved in the format the file is already stored in
+            write_data_file(store.read_filename, store._df, data_format=data_format_of(store.read_filename) or 'hdf5')
 
         self.data_updated_signal.emit(lock_index, store)
 
     def update_file(self, f_index):
         try:
             self.f_index=f_index
-            store = self.data.post_store
-            store.clear_temp_df()
-            temp_df = store.temp_df
+            #Single frame data is only written to _temp.hdf5 when it is being viewed
+            self.data.write_temp_df()
+            temp_df = self.data.temp_df
             title = f'Reading frame : '
             self.setWindowTitle(title + str(f_index))
         except Exception as e:
@@ -5,6 +5,7 @@ import pandas as pd
 
 from ..general.dataframes import DataWrite
 from ..general.parameters import  get_param_val
+from ..general.fingerprints import stage_fingerprint
 from ..customexceptions import *
 from ..user_methods import *
 from .link_methods import default, no_linking
@@ -12,12 +13,18 @@ from .link_methods import default, no_linking
 class LinkTrajectory:
     def __init__(self, data=None, parameters=None):
         self.track_store = data.track_store
+        self.storage = data.storage
         self.parameters=parameters
 
     #@error_handling
-    def link_trajectories(self, f_index=None, lock_part=-1):
+    def link_trajectories(self, f_index=None, lock_part=-1, df=None):
         print('Linking...')
-        """Implements the trackpy functions link_df and filter_stubs"""
+        """Implements the trackpy functions link_df and filter_stubs
+
+        When processing a single frame the linked dataframe is returned so it can be
+        handed to the postprocessor. df is the single frame output of the tracker and 
+        is only used if tracking was not locked. 
+        """
 
         assert lock_part < 1, 'PTWorkflow.process logic should guarantee this but it failed'
         # 3 cases:
@@ -27,16 +34,10 @@ class LinkTrajectory:
             # on whole movie.
             output_filename = self.track_store.output_filename
             df = self.track_store.df
-        else:
-            #process single frame f_index
-            output_filename = self.track_store.temp_filename   
-            if lock_part == -1:
-                #Tracking only operates on one frame producing _temp.hdf5, Linking reads from this temporary file
-                self.track_store.clear_temp_df()
-                df=self.track_store.temp_df
-            else:
-                #If lock_part == 0 The tracking data on whole movie is stored in a file _track.hdf5 created previously. We only want to operate on one frame of this. You load full tracking data and then grab a single frame process it and store result in a temporary file.
-                df=self.track_store.get_df(f_index=f_index)
+        elif lock_part == 0:
+            #The tracking data on whole movie is stored in a file _track.hdf5 created previously. We only want to operate on one frame of this. You load full tracking data and then grab a single frame.
+            df=self.track_store.get_df(f_index=f_index)
+        #else tracking only operated on one frame and handed over df.
 
         if df is not None and df.isna().all().all():
             #If it is an empty dataframe copy to _link.hdf5 file
@@ -48,9 +49,10 @@ class LinkTrajectory:
             #no linking - this takes place when analysing temp single frames or as an option on the whole movie.
             df = no_linking(df)
 
-        with DataWrite(output_filename) as store:
-            store.write_data(df)
-            
         print('Linking Complete')
- 
+        if f_index is not None:
+            return df
 
+        fingerprint = stage_fingerprint(self.parameters, 1, self.track_store.fingerprint)
+        with DataWrite(output_filename, fingerprint=fingerprint, storage=self.storage) as store:
+            store.write_data(df)
@@ -3,8 +3,9 @@ import os
 import pandas as pd
 import numpy as np
 
-from ..general.parameters import get_method_name, get_span
+from ..general.parameters import MethodChain, get_span
 from ..general.dataframes import DataWrite, combine_data_frames
+from ..general.fingerprints import stage_fingerprint
 from ..postprocess import postprocessing_methods as pm
 
 
@@ -12,29 +13,24 @@ class PostProcessor:
     def __init__(self, parameters=None, data=None):
         self.data=data
         self.link_store = data.link_store
-        self.parameters = parameters      
+        self.parameters = parameters
+        self.methods = MethodChain(pm, 'postprocess')
 
-    def process(self, f_index=None, lock_part=-1):
+    def process(self, f_index=None, lock_part=-1, df=None):
         """
         Data being processed can follow a number of scenarios
-        1)There may be no postprocessing methods in which case whatever comes in _temp.hdf5 or _link.hdf5 should simply be copied to the output filename - _temp.hdf5 for single frames or _postprocess.hdf5 for full
-        2) Single frame where there is only a single temporary file from the linking stage. Some postprocessing methods
-        require a range of frames in order to process e.g running mean. The code should "gracefully" error indicating which method has caused the issue at bottom of screen. If there is no error _temp.hdf5 should be postprocessed and output to _temp.hdf5 with the additional data.
+        1)There may be no postprocessing methods in which case whatever comes in from the linker or _link.hdf5 should simply be passed on - returned for single frames or copied to _postprocess.hdf5 for full
+        2) Single frame where the linker has handed over the data for that frame (df). Some postprocessing methods
+        require a range of frames in order to process e.g running mean. The code should "gracefully" error indicating which method has caused the issue at bottom of screen. If there is no error the postprocessed frame is returned with the additional data.
         3) Single frame where the data from the linking stage has been locked. It is only possible to lock if _link.hdf5 has been
-        previously created through processing all the data. Decorator on the postprocessing functions determines whether a single frame or range of frame data is sent to postprocessing function. Single frame data output to _temp.hdf5.
+        previously created through processing all the data. Decorator on the postprocessing functions determines whether a single frame or range of frame data is sent to postprocessing function. Single frame data is returned.
         4) Processing the entire movie or range of frames with or without locking of linking stage. Data output to _postprocess.hdf5     
         """
 
         print('Postprocessing...')
         assert lock_part < 2, 'PTWorkflow.process logic should guarantee this but it broke'
 
-        #Set output_filename
-        if f_index is None:
-            output_filename = self.link_store.output_filename
-        else:
-            output_filename = self.link_store.temp_filename
-        
-        #Choose whether to load full df or temp
+        #Choose whether to load full df or use the frame handed over by the linker
         if f_index is None:
             df = self.link_store.df
         elif lock_part == 1 and self.parameters['postprocess']['postprocess_method']:
@@ -48,32 +44,30 @@ class PostProcessor:
 
             #return a range
             df = full_df.loc[start:finish]
-        else:
-            self.link_store.clear_temp_df()
-            df = self.link_store.temp_df 
+        elif lock_part == 1:
+            df = self.link_store.get_df(f_index=f_index)
 
-        """This block either copies across the data if no postprocessing methods (if block) or the line in the else block containing getattr(pm, method_name() says call the method in postprocessing_methods.py with the name method_name and pass the parameters to it. Take the return value and add it to the postprocessing store.
+        """process_frames calls each of the selected methods in postprocessing_methods.py in turn, passing the parameters to it. If there are no postprocessing methods the data is simply passed on.
         See intro to postprocessing to understand how parameters and full dataframe are parsed by each function.
         """ 
-        
-        with DataWrite(output_filename) as store:
-            if not self.parameters['postprocess']['postprocess_method']:
-                #No methods selected copy data across
-                store.write_data(df)
-            else:
-                for method in self.parameters['postprocess']['postprocess_method']:
-                    method_name, call_num = get_method_name(method)
-                    df = getattr(pm, method_name)(df,f_index=f_index, parameters=self.parameters, call_num=call_num, section='postprocess')    
-
-                
-                if f_index is not None:
-                    store.write_data(df.loc[f_index])
-                else:
-                    store.write_data(df)
+        df = self.process_frames(df, f_index=f_index)
 
         print('Postprocessing complete')
+        if f_index is not None:
+            return df[df.index == f_index]
+
+        fingerprint = stage_fingerprint(self.parameters, 2, self.link_store.fingerprint)
+        with DataWrite(self.link_store.output_filename, fingerprint=fingerprint, storage=self.data.storage) as store:
+            store.write_data(df)
+
+    def process_frames(self, df, f_index=None):
+        """Applies all the postprocessing methods to df. f_index is None for all frames in df.
+        The methods are compiled once and reused until the parameters change (see MethodChain)"""
+        for method in self.methods.compile(self.parameters):
+            df = method(df, f_index=f_index)
+        return df
+
+    def fixed(self):
+        """Context in which the postprocessing methods are compiled once eg for a whole movie (see MethodChain)"""
+        return self.methods.fixed(self.parameters)
 
-                                        
-                    
-                    
-          
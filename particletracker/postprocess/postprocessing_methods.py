@@ -12,7 +12,7 @@ import scipy.optimize as opt
 from labvision import audio, video
 from moviepy.audio.io.AudioFileClip import AudioFileClip
 from ..general.parameters import param_parse
-from ..general.dataframes import df_single, df_range
+from ..general.dataframes import df_single, df_range, uses_columns
 from ..customexceptions import *
 from ..user_methods import *
 
@@ -35,6 +35,7 @@ All these methods operate on single frames
 
 @error_handling
 @param_parse
+@uses_columns(column_params=('column_name',))
 def absolute(df, *args,  parameters=None, **kwargs):
     """Returns new column with absolute value of input column
 
@@ -70,6 +71,7 @@ This function allows you to load data into a column opposite each frame number
 '''
 @error_handling
 @param_parse
+@uses_columns()
 def add_frame_data(df,  parameters=None, *args, **kwargs):
     '''
     Add frame data allows you to manually add a new column of df to the dfframe. 
@@ -128,6 +130,7 @@ def add_frame_data(df,  parameters=None, *args, **kwargs):
 
 @error_handling
 @param_parse
+@uses_columns(column_params=('x_column', 'y_column'))
 def angle(df,  *args,  parameters=None, **kwargs):
     '''
     Angle calculates the angle specified by two components.
@@ -180,6 +183,7 @@ def angle(df,  *args,  parameters=None, **kwargs):
 
 @error_handling
 @param_parse
+@uses_columns(column_params=('column_name',))
 def classify(df, *args,  parameters=None, **kwargs):
     '''
     Classifies particles based on values in a particular column
@@ -236,6 +240,7 @@ def _classify_fn(x, lower_threshold_value=None, upper_threshold_value=None):
 
 @error_handling
 @param_parse
+@uses_columns('contours')
 def contour_boxes(df, *args,  **kwargs):
     """
     Contour boxes calculates the rotated minimum area bounding box
@@ -335,6 +340,7 @@ def _rotated_bounding_rectangle(contour):
 
 @error_handling
 @param_parse
+@uses_columns('x', 'y')
 def hexatic_order(df, *args,  parameters=None, **kwargs):
     """
     Calculates the hexatic order parameter of each particle.
@@ -428,6 +434,7 @@ def _find_kdtree_for_hexatic(points, cutoff, num_neighbors):
 
 @error_handling
 @param_parse
+@uses_columns(column_params=('column_name', 'column_name2'))
 def logic_AND(df, *args,  parameters=None, **kwargs):
     '''
     Applys a logical and operation to two columns of boolean values.
@@ -468,6 +475,7 @@ def logic_AND(df, *args,  parameters=None, **kwargs):
 
 @error_handling
 @param_parse
+@uses_columns(column_params=('column_name',))
 def logic_NOT(df, *args,  parameters=None, **kwargs):
     '''
     Apply a logical not operation to a column of boolean values.
@@ -508,6 +516,7 @@ def logic_NOT(df, *args,  parameters=None, **kwargs):
 
 @error_handling
 @param_parse
+@uses_columns(column_params=('column_name', 'column_name2'))
 def logic_OR(df, *args,  parameters=None, **kwargs):
     '''
     Apply a logical or operation to two columns of boolean values.
@@ -546,6 +555,7 @@ def logic_OR(df, *args,  parameters=None, **kwargs):
 
 @error_handling
 @param_parse
+@uses_columns(column_params=('column_name', 'column_name2'))
 def magnitude(df, *args,  parameters=None, **kwargs):
     '''
     Calculates the magnitude of 2 input columns (x^2 + y^2)^0.5 = r
@@ -581,6 +591,7 @@ def magnitude(df, *args,  parameters=None, **kwargs):
 
 @error_handling
 @param_parse
+@uses_columns('x', 'y', 'particle')
 def neighbours(df, *args,  parameters=None, **kwargs):
     '''
     Find the nearest neighbours of a particle
@@ -715,6 +726,7 @@ def _find_delaunay(df, parameters=None):
 
 @error_handling
 @param_parse
+@uses_columns('x', 'y')
 def voronoi(df, *args,  **kwargs):
     """
     Calculate the voronoi network of particle.
@@ -798,6 +810,7 @@ def _voronoi_props(vor):
 
 @error_handling
 @param_parse
+@uses_columns(column_params=('column_name',))
 def real_imag(df, *args, parameters=None, **kwargs):
     """
     Extracts the real, imaginary, complex magnitude and complex angle from a complex number and puts them in
@@ -832,6 +845,7 @@ def real_imag(df, *args, parameters=None, **kwargs):
     return df
 
 @error_handling
+@uses_columns()
 def audio_frequency(df, *args,  parameters=None, **kwargs):
     """
     Decodes the audio frequency in our videos. We use this to 
@@ -872,6 +886,7 @@ def audio_frequency(df, *args,  parameters=None, **kwargs):
 
 @error_handling
 @param_parse
+@uses_columns('audio_frequency')
 def duty_to_acceleration(df,  parameters=None, *args, **kwargs):
     """
     Calculates dimensionless acceleration values of the system. Takes audio frequency 
@@ -929,6 +944,7 @@ multiple frames have been processed and you are using part.
 
 @error_with_hint("HINT: this func only works in the gui when locked. Span must be an odd value.")
 @param_parse
+@uses_columns('particle', column_params=('column_name',))
 def difference(df,  parameters=None, *args, **kwargs):
     '''
     Calculates the centered finite difference of a particle's values and
@@ -966,6 +982,7 @@ def difference(df,  parameters=None, *args, **kwargs):
 
 @error_with_hint("HINT: This method will not work in the gui unless you lock the link stage.")
 @param_parse
+@uses_columns('particle', column_params=('column_name',))
 def mean(df,  parameters=None, *args, **kwargs):
     '''
     Calculates the rolling mean of a particle's values and returns the result
@@ -992,6 +1009,7 @@ def mean(df,  parameters=None, *args, **kwargs):
 
 @error_with_hint("HINT: This method will not work in the gui unless you lock the link stage.")
 @param_parse
+@uses_columns('particle', column_params=('column_name',))
 def median(df,  parameters=None, *args, **kwargs):
     '''
     Calculates the rolling median of a particle's values and returns the result
@@ -1023,6 +1041,7 @@ def median(df,  parameters=None, *args, **kwargs):
 
 @error_with_hint("HINT: this func only works in the gui when locked. Span must be an odd value.")
 @param_parse
+@uses_columns('particle', column_params=('column_name',))
 def rate(df,  parameters=None, *args, **kwargs):
     '''
     Rate of change of a particle property with frame.
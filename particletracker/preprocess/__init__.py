@@ -1,5 +1,11 @@
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import os
+
 from ..preprocess import preprocessing_methods as pm
-from ..general.parameters import get_method_name
+from ..preprocess.buffers import FrameBuffers
+from ..preprocess.tiles import split_methods, process_tiled
+from ..general.parameters import MethodChain, get_param_val
 from ..user_methods import *
 
 class Preprocessor:
@@ -10,13 +16,115 @@ class Preprocessor:
 
     def __init__(self, parameters):
         self.parameters = parameters
+        self.methods = MethodChain(pm, 'preprocess')
+        self.buffers = None
+        self.cache = None
+        self._runs = (None, None)
+        self._executor = None
 
-    def process(self, frame):
+    def process(self, frame, previous_frames=None):
         '''
         Preprocesses single frame
+
+        If config['_preprocess_tiles'] > 1 large frames are split into that many strips 
+        which are preprocessed on separate threads (see tiles.py).
+
+        Methods such as subtract_rolling_bkg use the frames before this one (see rolling.py).
+        While a whole movie is processed (see fixed) these are the frames already processed
+        or those given to restart. 
+        Otherwise previous_frames is called with the number of frames needed (see history) 
+        and the frames it returns are processed first.
+        '''
+        if previous_frames is not None and self.cache is None and self.history() > 0:
+            with self.fixed():
+                for previous_frame in previous_frames(self.history()):
+                    self.process(previous_frame)
+                return self.process(frame)
+
+        methods = self.methods.compile(self.parameters)
+        num_tiles = self.parameters['config'].get('_preprocess_tiles', 1)
+        if num_tiles > 1:
+            return self.process_tiled(frame, methods, num_tiles)
+        for method in methods:
+            frame = self._apply(method, frame)
+        return frame
+
+    def restart(self, previous_frames):
+        '''
+        Replaces the frames kept by methods that use previous frames with those returned
+        by previous_frames. Used while a whole movie is processed (see fixed) when the next
+        frame doesn't follow the last one processed, eg a run resumed from a checkpoint.
+        '''
+        self.cache = {}
+        if self.history() > 0:
+            for previous_frame in previous_frames(self.history()):
+                self.process(previous_frame)
+
+    def process_tiled(self, frame, methods, num_tiles):
+        '''
+        Preprocesses a single frame in num_tiles strips. Methods that need the whole frame 
+        are applied to the whole frame between the runs of tiled methods.
         '''
-        for method in self.parameters['preprocess']['preprocess_method']:
-            method_name, call_num = get_method_name(method)
-            frame = getattr(pm, method_name)(frame, parameters=self.parameters, call_num=call_num, section='preprocess')
+        executor = self._thread_pool(min(num_tiles, os.cpu_count() or 1))
+        for run_methods, halo in self._split(methods):
+            if halo is None:
+                frame = self._apply(run_methods[0], frame)
+            else:
+                frame = process_tiled(frame, run_methods, halo, num_tiles, executor)
         return frame
 
+    def history(self):
+        '''
+        Number of frames before the current one that the preprocessing methods use
+        '''
+        frames = [get_param_val(self.parameters['preprocess'][method.method][method.func.window_param]) - 1
+                  for method in self.methods.compile(self.parameters) if getattr(method.func, 'window_param', None)]
+        return max(frames, default=0)
+
+    def halo(self):
+        '''
+        Total kernel radius of the preprocessing methods, ie how far the value of a pixel
+        can be changed by the pixels around it. None if a method uses the whole frame (see tiles.py)
+        '''
+        runs = self._split(self.methods.compile(self.parameters))
+        if any(halo is None for _, halo in runs):
+            return None
+        return sum(halo for _, halo in runs)
+
+    def _split(self, methods):
+        if self._runs[0] is not methods:
+            self._runs = (methods, split_methods(methods, self.parameters))
+        return self._runs[1]
+
+    def _thread_pool(self, num_threads):
+        if self._executor is None or self._executor[0] != num_threads:
+            if self._executor is not None:
+                self._executor[1].shutdown(wait=False)
+            self._executor = (num_threads, ThreadPoolExecutor(max_workers=num_threads))
+        return self._executor[1]
+
+    def _apply(self, method, frame):
+        if self.buffers is not None and getattr(method.func, 'writes_to_buffer', False):
+            return method(frame, buffers=self.buffers)
+        if getattr(method.func, 'window_param', None):
+            return method(frame, cache=self.cache)
+        return method(frame)
+
+    @contextlib.contextmanager
+    def fixed(self):
+        """Context in which the preprocessing methods are compiled once eg for a whole movie (see MethodChain).
+        Unless config['_preprocess_buffers'] is False the methods that support it (invert, distance, 
+        subtract_bkg) write into buffers that are reused for every frame (see buffers.py) so the 
+        preprocessed frame is only valid until the next one.
+        Methods that use previous frames keep them in cache until the end of the context."""
+        with self.methods.fixed(self.parameters):
+            if self.parameters['config'].get('_preprocess_buffers', True):
+                self.buffers = FrameBuffers()
+            self.cache = {}
+            try:
+                yield self
+            finally:
+                self.buffers = None
+                self.cache = None
+
+
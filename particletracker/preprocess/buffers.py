@@ -0,0 +1,57 @@
+import numpy as np
+
+
+"""
+Preallocated images the preprocessing methods can write their output into while a whole
+movie is processed, rather than allocating a new image on every frame. Every frame of a 
+movie is cropped to the same size so after the first frame no more images are allocated 
+by the methods that use them. Only invert, distance and subtract_bkg do; the other methods 
+call labvision functions which always return a new image.
+
+A method that can write into a buffer is decorated with @writes_to_buffer and is then
+called with buffers=FrameBuffers (see Preprocessor.process). Otherwise buffers is None
+and the method allocates its output as usual, eg
+
+    @error_handling
+    @writes_to_buffer
+    def invert(img, buffers=None, **kwargs):
+        return np.invert(img, out=output_buffer(buffers, img))
+
+The preprocessed frame is itself a buffer so it is overwritten by the next frame. It must
+not be kept after the frame is tracked.
+"""
+
+
+class FrameBuffers:
+    """Pairs of images of each shape and type the preprocessing methods have asked for.
+
+    A method reads its input, which may be the other buffer of the pair, and writes into
+    the buffer that isn't its input. Consecutive methods therefore take turns to use
+    the two buffers of a pair.
+    """
+
+    def __init__(self):
+        self._pairs = {}
+
+    def out(self, img, shape=None, dtype=None):
+        """A buffer for the output of a method whose input is img. It has the shape and dtype of img unless given."""
+        shape = img.shape if shape is None else tuple(shape)
+        dtype = img.dtype if dtype is None else np.dtype(dtype)
+        pair = self._pairs.get((shape, dtype))
+        if pair is None:
+            pair = (np.empty(shape, dtype=dtype), np.empty(shape, dtype=dtype))
+            self._pairs[(shape, dtype)] = pair
+        return pair[1] if np.may_share_memory(img, pair[0]) else pair[0]
+
+
+def output_buffer(buffers, img, shape=None, dtype=None):
+    """The buffer a method should write its output into or None if the output should be allocated"""
+    if buffers is None:
+        return None
+    return buffers.out(img, shape=shape, dtype=dtype)
+
+
+def writes_to_buffer(func):
+    """writes_to_buffer decorator marks a preprocessing method that accepts buffers (see FrameBuffers)"""
+    func.writes_to_buffer = True
+    return func
@@ -13,6 +13,9 @@ import labvision.images.colours as colours
 
 from ..general.parameters import param_parse, get_param_val, get_method_key
 from ..crop import crop
+from .buffers import output_buffer, writes_to_buffer
+from .tiles import tileable
+from .rolling import RollingBackground, uses_previous_frames
 from ..customexceptions import error_handling
 from ..user_methods import *
 from ..gui.file_io import img_name_wrangle
@@ -20,6 +23,7 @@ from ..gui.file_io import img_name_wrangle
 
 @error_handling
 @param_parse
+@tileable(kernel_param='block_size')
 def adaptive_threshold(img, parameters=None, *args, **kwargs):
     '''
     Perform an adaptive threshold on a grayscale image
@@ -56,6 +60,7 @@ def adaptive_threshold(img, parameters=None, *args, **kwargs):
 
 
 @error_handling
+@tileable(kernel_param='kernel')
 def blur(img, parameters=None, **kwargs):
     '''
     Performs a gaussian blur on the image
@@ -88,6 +93,7 @@ def blur(img, parameters=None, **kwargs):
 
 @error_handling
 @param_parse
+@tileable()
 def brightness_contrast(img, parameters=None, *args, **kwargs):
     """Brightness and Contrast control
 
@@ -112,6 +118,7 @@ def brightness_contrast(img, parameters=None, *args, **kwargs):
 
 @error_handling
 @param_parse
+@tileable()
 def colour_channel(img, parameters=None, *args, **kwargs):
     '''
     This selects the specified colour channel of a colour image
@@ -146,6 +153,7 @@ def colour_channel(img, parameters=None, *args, **kwargs):
 
 @error_handling
 @param_parse
+@tileable(kernel_param='kernel', iterations_param='iterations')
 def dilation(img, parameters=None, *args, **kwargs):
     '''
     Dilate a binary image
@@ -180,7 +188,8 @@ def dilation(img, parameters=None, *args, **kwargs):
 
 @error_handling
 @param_parse
-def distance(img, parameters=None, *args, **kwargs):
+@writes_to_buffer
+def distance(img, parameters=None, *args, buffers=None, **kwargs):
     '''
     Perform a distance transform on a binary image
 
@@ -206,13 +215,17 @@ def distance(img, parameters=None, *args, **kwargs):
         Grayscale image
 
     '''
-    img = transforms.distance(
-        img, normalise=parameters['normalise']).astype(np.uint8)
-    return img
+    dist_img = transforms.distance(img, normalise=parameters['normalise'])
+    out = output_buffer(buffers, img, shape=dist_img.shape, dtype=np.uint8)
+    if out is None:
+        return dist_img.astype(np.uint8)
+    np.copyto(out, dist_img, casting='unsafe')
+    return out
 
 
 @error_handling
 @param_parse
+@tileable(kernel_param='kernel', iterations_param='iterations')
 def erosion(img, parameters=None, *args, **kwargs):
     '''
     Perform an erosion operation on a binary image
@@ -252,6 +265,7 @@ def erosion(img, parameters=None, *args, **kwargs):
 
 @error_handling
 @param_parse
+@tileable()
 def gamma(img, parameters=None, *args, **kwargs):
     '''
     Apply look up table to image with power gamma
@@ -281,6 +295,7 @@ def gamma(img, parameters=None, *args, **kwargs):
 
 
 @error_handling
+@tileable()
 def grayscale(img, *args, **kwargs):
     '''
     This converts a colour image to a grayscale image
@@ -300,7 +315,9 @@ def grayscale(img, *args, **kwargs):
 
 
 @error_handling
-def invert(img, *args, **kwargs):
+@writes_to_buffer
+@tileable()
+def invert(img, *args, buffers=None, **kwargs):
     '''
     Invert image
 
@@ -321,11 +338,12 @@ def invert(img, *args, **kwargs):
         same as input image
 
     '''
-    return ~img
+    return np.invert(img, out=output_buffer(buffers, img))
 
 
 @error_handling
 @param_parse
+@tileable(kernel_param='kernel')
 def medianblur(img, parameters=None, *args, **kwargs):
     '''
     Performs a medianblur on the image. 
@@ -355,7 +373,8 @@ def medianblur(img, parameters=None, *args, **kwargs):
 
 
 @error_handling
-def subtract_bkg(img, *args, parameters=None, call_num=None, **kwargs):
+@writes_to_buffer
+def subtract_bkg(img, *args, parameters=None, call_num=None, buffers=None, **kwargs):
     '''
     Subtract a background
 
@@ -400,13 +419,10 @@ def subtract_bkg(img, *args, parameters=None, call_num=None, **kwargs):
     params = parameters['preprocess'][method_key]
 
     bkgtype = get_param_val(params['subtract_bkg_type'])
-    if bkgtype == 'mean':
-        mean_val = int(np.mean(img))
-        subtract_img = mean_val * np.ones(np.shape(img), dtype=np.uint8)
-        img2 = img
-    elif bkgtype == 'median':
-        median_val = int(np.median(img))
-        subtract_img = median_val * np.ones(np.shape(img), dtype=np.uint8)
+    if bkgtype in ('mean', 'median'):
+        bkg_val = int(np.mean(img)) if bkgtype == 'mean' else int(np.median(img))
+        # opencv subtracts a scalar from the first channel only
+        subtract_img = bkg_val if np.ndim(img) == 2 else np.full(np.shape(img), bkg_val, dtype=np.uint8)
         img2 = img
     else:
         # This option subtracts the previously created image which is added to dictionary.
@@ -440,16 +456,16 @@ def subtract_bkg(img, *args, parameters=None, call_num=None, **kwargs):
         subtract_img = blur(subtract_img, temp_params, call_num=None)
         subtract_img = subtract_img.astype(np.uint8)
 
-    if get_param_val(params['subtract_bkg_invert']):
-        img2 = cv2.subtract(subtract_img, img2)
-    else:
-        img2 = cv2.subtract(img2, subtract_img)
-
-    if np.max(img) == 0:
+    out = output_buffer(buffers, img, shape=np.shape(img2), dtype=np.uint8)
+    if (cv2.countNonZero(img) if np.ndim(img) == 2 else np.count_nonzero(img)) == 0:
         img2 = img
+    elif get_param_val(params['subtract_bkg_invert']):
+        img2 = cv2.subtract(subtract_img, img2, dst=out)
+    else:
+        img2 = cv2.subtract(img2, subtract_img, dst=out)
 
     if get_param_val(params['subtract_bkg_norm']):
-        img2 = cv2.normalize(img2, None, alpha=0, beta=255,
+        img2 = cv2.normalize(img2, out, alpha=0, beta=255,
                              norm_type=cv2.NORM_MINMAX)
 
     return img2
@@ -457,6 +473,65 @@ def subtract_bkg(img, *args, parameters=None, call_num=None, **kwargs):
 
 @error_handling
 @param_parse
+@uses_previous_frames('window')
+def subtract_rolling_bkg(img, parameters=None, *args, cache=None, call_num=None, **kwargs):
+    '''
+    Subtract a background calculated from the last few frames
+
+    Notes
+    -----
+    The background is the mean or median of each pixel over the current frame and
+    the window-1 frames before it. Anything that stays still for the length of the
+    window becomes part of the background so this removes uneven illumination or
+    stuck particles that change slowly during a movie, without making a background
+    image first (see subtract_bkg).
+
+    The frames are kept in memory so no extra frames are read while the whole movie 
+    is processed. The median is approximated by the median of 5 frames spread evenly 
+    through the window. When a single frame is processed the frames before it are 
+    read and preprocessed first.
+
+    window
+        Number of frames the background is calculated from
+    bkg_type
+        'mean' or 'median'
+    invert
+        Subtract bkg from image or image from background.
+    norm
+        Stretch range of outputted intensities on resultant image to fill 0-255 - True or False
+
+    Args
+    ----
+    img
+        This must be a grayscale / single colour channel image
+    parameters
+        dictionary like object corresponding to specific method. See param_parse for details.
+
+    Returns
+    -------
+        grayscale image
+    '''
+    key = get_method_key('subtract_rolling_bkg', call_num=call_num)
+    cache = {} if cache is None else cache
+    bkg = cache.get(key)
+    if bkg is None or bkg.window != parameters['window'] or bkg.frames.shape[1:] != np.shape(img):
+        bkg = cache[key] = RollingBackground(np.shape(img), parameters['window'])
+    bkg.add(img)
+    bkg_img = bkg.mean() if parameters['bkg_type'] == 'mean' else bkg.median()
+
+    if parameters['invert']:
+        img2 = cv2.subtract(bkg_img, img)
+    else:
+        img2 = cv2.subtract(img, bkg_img)
+
+    if parameters['norm']:
+        img2 = cv2.normalize(img2, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX)
+    return img2
+
+
+@error_handling
+@param_parse
+@tileable()
 def threshold(img, parameters=None, *args, **kwargs):
     '''
     Apply a global threshold
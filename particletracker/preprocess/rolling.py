@@ -0,0 +1,76 @@
+import numpy as np
+
+
+"""
+Preprocessing methods that use the frames before the current one, eg subtract_rolling_bkg.
+
+Such a method is decorated with @uses_previous_frames giving the name of its parameter
+that sets how many frames it uses. It is then called with cache, a dictionary it can keep
+its state in between frames (see RollingBackground). While a whole movie is processed
+each frame is added as it is preprocessed, so the frames that have already been decoded
+are reused and nothing extra is read. When a single frame is processed, eg in the gui,
+the frames a whole movie run would have preprocessed first are read and preprocessed
+before it (see Preprocessor.process) so the result is the same.
+"""
+
+#Number of frames whose median approximates the median of the window
+MEDIAN_SAMPLES = 5
+
+
+def uses_previous_frames(window_param):
+    """uses_previous_frames decorator marks a preprocessing method that uses the window_param frames up to the current one"""
+    def decorator(func):
+        func.window_param = window_param
+        return func
+    return decorator
+
+
+class RollingBackground:
+    """The last window frames in a ring buffer and their running sum.
+
+    Adding a frame replaces the oldest frame and updates the sum so the cost per frame
+    doesn't depend on window. The mean is calculated from the sum. The median of all
+    the frames would cost window times more so it is approximated by the median of
+    MEDIAN_SAMPLES frames spread evenly through the window.
+    """
+
+    def __init__(self, shape, window):
+        self.window = window
+        self.frames = np.empty((window,) + tuple(shape), dtype=np.uint8)
+        self.sum = np.zeros(shape, dtype=np.uint32)
+        self.count = 0
+        self._next = 0
+
+    def add(self, img):
+        if self.count == self.window:
+            self.sum -= self.frames[self._next]
+        else:
+            self.count += 1
+        self.frames[self._next] = img
+        self.sum += self.frames[self._next]
+        self._next = (self._next + 1) % self.window
+
+    def mean(self):
+        """Mean of the frames rounded to the nearest integer"""
+        return ((self.sum + self.count // 2) // self.count).astype(np.uint8)
+
+    def median(self):
+        """Approximate median of the frames"""
+        num_samples = min(self.count, MEDIAN_SAMPLES)
+        num_samples -= 1 - num_samples % 2
+        ages = np.round(np.linspace(0, self.count - 1, num_samples)).astype(int)
+        return median_of(self.frames[(self._next - 1 - ages) % self.window])
+
+
+def median_of(images):
+    """Pixelwise median of an odd number of images.
+
+    Sorts the images with a network of np.minimum / np.maximum which for a few images is
+    much faster than np.median along the first axis.
+    """
+    images = list(images)
+    num_images = len(images)
+    for i in range(num_images):
+        for j in range(i % 2, num_images - 1, 2):
+            images[j], images[j + 1] = np.minimum(images[j], images[j + 1]), np.maximum(images[j], images[j + 1])
+    return images[num_images // 2]
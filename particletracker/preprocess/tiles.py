@@ -0,0 +1,106 @@
+import numpy as np
+
+from ..general.parameters import get_param_val
+
+
+"""
+Tiled preprocessing of very large frames. The frame is split into horizontal strips which
+are preprocessed on a pool of threads (opencv releases the GIL) and stitched back together.
+
+Each strip is given extra rows (a halo) from the strips either side so that the pixels
+near its edges are calculated from the same neighbourhood as they would be in the whole
+frame. The halo is the total radius of the kernels of the methods applied. A method that
+can be applied to part of a frame is decorated with @tileable, giving the names of the
+parameters that set the size of its kernel, eg
+
+    @error_handling
+    @param_parse
+    @tileable(kernel_param='kernel', iterations_param='iterations')
+    def erosion(img, parameters=None, *args, **kwargs):
+
+Methods that use the whole frame, eg normalising the intensity, subtracting the mean or
+filling holes, are not tileable. The methods are split into runs of tileable methods
+which are tiled and the other methods which are applied to the whole frame in between.
+"""
+
+#Strips aren't made smaller than this, excluding the halo, so small frames aren't tiled
+MIN_TILE_ROWS = 64
+
+
+def tileable(kernel_param=None, iterations_param=None):
+    """tileable decorator marks a preprocessing method that can be applied to each tile separately.
+
+    Parameters
+    ----------
+    kernel_param : str or None
+        Name of the method's parameter giving the width of its kernel. None for methods
+        that change each pixel independently.
+    iterations_param : str or None
+        Name of the method's parameter giving the number of times the kernel is applied
+    """
+    def decorator(func):
+        func.tileable = True
+        func.kernel_param = kernel_param
+        func.iterations_param = iterations_param
+        return func
+    return decorator
+
+
+def tile_halo(method, parameters):
+    """Number of rows a compiled method (see CompiledMethod) needs either side of a tile or None if it can't be tiled"""
+    func = method.func
+    if not getattr(func, 'tileable', False):
+        return None
+    if func.kernel_param is None:
+        return 0
+    params = parameters['preprocess'][method.method]
+    halo = int(get_param_val(params[func.kernel_param])) // 2
+    if func.iterations_param is not None:
+        halo *= int(get_param_val(params[func.iterations_param]))
+    return halo
+
+
+def split_methods(methods, parameters):
+    """Splits the methods into runs that are applied in turn
+
+    Returns
+    -------
+    list of (list of methods, halo). halo is None for a single method that must be
+    applied to the whole frame.
+    """
+    runs = []
+    for method in methods:
+        halo = tile_halo(method, parameters)
+        if halo is None:
+            runs.append(([method], None))
+        elif runs and runs[-1][1] is not None:
+            runs[-1] = (runs[-1][0] + [method], runs[-1][1] + halo)
+        else:
+            runs.append(([method], halo))
+    return runs
+
+
+def process_tiled(frame, methods, halo, num_tiles, executor):
+    """Applies methods to frame in num_tiles horizontal strips with halo extra rows
+    each side, using executor to process the strips at the same time. Frames too small
+    to be split into num_tiles strips of at least MIN_TILE_ROWS rows are split into fewer."""
+    rows = np.shape(frame)[0]
+    num_tiles = min(num_tiles, rows // (MIN_TILE_ROWS + 2 * halo))
+    if num_tiles < 2:
+        return _apply(frame, methods)
+
+    bounds = np.linspace(0, rows, num_tiles + 1).astype(int)
+
+    def process_tile(i):
+        start, stop = bounds[i], bounds[i + 1]
+        halo_start, halo_stop = max(0, start - halo), min(rows, stop + halo)
+        tile = _apply(frame[halo_start:halo_stop], methods)
+        return tile[start - halo_start:stop - halo_start]
+
+    return np.concatenate(list(executor.map(process_tile, range(num_tiles))))
+
+
+def _apply(frame, methods):
+    for method in methods:
+        frame = method(frame)
+    return frame
@@ -1,16 +1,23 @@
 import os
 import numpy as np
 import pandas as pd
-import shutil
 import warnings
 
 warnings.filterwarnings('ignore', category=pd.io.pytables.PerformanceWarning)
 
+from tqdm import tqdm
+
 from ..crop import ReadCropVideo
 from .. import preprocess, track, link, postprocess, \
     annotate
+from ..link.link_methods import no_linking
 from ..general.writeread_param_dict import read_paramdict_file
-from ..general.dataframes import DataManager
+from ..general.parameters import frame_local
+from ..general.dataframes import DataManager, DataCheckpoint, read_fingerprint, data_exists, finalise_data_file
+from ..general.fingerprints import expected_fingerprints
+from ..annotate.render import render_scale
+from ..annotate.overlay import movie_output
+from .preview import Preview
 from ..customexceptions import BaseError, flash_error_msg, CsvError
 from ..gui.menubar import CustomButton
 
@@ -57,12 +64,16 @@ class PTWorkflow:
         self.ip = preprocess.Preprocessor(self.parameters)
 
         #Handles storage, access to and caching of data at each stage of process
-        self.data = DataManager(base_filename=self.base_filename)
+        self.data = DataManager(base_filename=self.base_filename,
+                                data_format=self.parameters['config'].get('_data_format', 'hdf5'),
+                                compact_dtypes=self.parameters['config'].get('_compact_dtypes', False),
+                                hdf5_profile=self.parameters['config'].get('_hdf5_profile', 'default'))
 
         self.pt = track.ParticleTracker(
             parameters=self.parameters,
             preprocessor=self.ip,
-            vidobject=self.cap)
+            vidobject=self.cap,
+            data=self.data)
 
         self.link = link.LinkTrajectory(
             data=self.data,
@@ -72,6 +83,9 @@ class PTWorkflow:
             data=self.data,
             parameters=self.parameters)
 
+        #Reduced resolution preprocessing and tracking of single frames for the gui
+        self.preview = Preview(self.parameters, self.cap)
+
         self.reset_annotator()
 
     def reset_annotator(self):
@@ -80,7 +94,7 @@ class PTWorkflow:
                                              parameters=self.parameters,
                                              frame=self.cap.read_frame(self.parameters['config']['_frame_range'][0]))
 
-    def process(self, f_index=None, lock_part=-1):
+    def process(self, f_index=None, lock_part=-1, preview=False):
         """Process an entire video
 
         Idea here is to call process with lock_part = -1 to indicate all steps of the process and then
@@ -89,7 +103,7 @@ class PTWorkflow:
         2 = postprocess locked  --> Creates the final file.
         annotation optional
 
-        - If you just process a single frame then you read a temp.hdf5 datafile from the _temp folder which contains the current frame=f_index data.
+        - If you just process a single frame then each stage hands its dataframe for the current frame=f_index directly to the next stage. The final result is kept in memory by DataManager and only written to _temp.hdf5 in the _temp folder when the pandas viewer needs it.
         - If you process everything with f_index=None then each stage creates its own file containing data for all frames in _temp folder. The subsequent stage reads from this datafile and saves to a new file. At the end this is copied to the directory containing the video and represents the processed data. An annotated video is optionally produced
         - Once a datafile has been completely processed if the _temp file folder is not cleaned up you can go back and edit things. Locking a particular stage results in data being drawn from a full datafile of previous stage containing complete data. Subsequent stages are either stored in a temporary file for single image processing or in new versions of the datafiles for the later stages if processing everything.
 
@@ -100,54 +114,180 @@ class PTWorkflow:
         One potentially confusing thing is that if you process a single frame then you move sequentially
         through preprocessor, tracker, linker, postprocessor and annotator. However, if you process the whole
         then the preprocessor is called from within tracker. All frames are tracked and then all frames are linked etc.
+
+        If preview is True a single frame of a large movie is preprocessed and tracked at reduced resolution
+        (see preview.py). The gui uses this while settings are being adjusted.
         """
-        if not os.path.exists(self.temp_folder):
-            os.mkdir(self.temp_folder)
+        #Several movies in the same folder may be processed at once by batchprocess
+        os.makedirs(self.temp_folder, exist_ok=True)
 
         try:
             # Whole movie or one frame
+            preview = preview and (f_index is not None) and (self.preview.scale() is not None)
             if f_index is None:
                 proc_frame = self.frame
+            elif preview:
+                proc_frame = self.preview.preprocess(f_index)
             else:
                 proc_frame = self.cap.read_frame(f_index)
                 # This will be overwritten below if annotation is required
-                proc_frame = self.ip.process(proc_frame)
+                proc_frame = self.ip.process(proc_frame, previous_frames=self.pt.previous_frames(f_index))
                 proc_frame = self.cap.apply_mask(proc_frame)
 
-            if lock_part < 0:
-                self.pt.track(f_index=f_index)
-
-            if lock_part < 1:
-                self.link.link_trajectories(
-                    f_index=f_index, lock_part=lock_part)
-
-            if lock_part < 2:
-                self.pp.process(f_index=f_index, lock_part=lock_part)
+            if f_index is None:
+                lock_part = max(lock_part, self.up_to_date_part())
 
-            if lock_part < 3:
-                annotated_frame = self.an.annotate(
-                    f_index=f_index, lock_part=lock_part)
+            if (f_index is None) and (lock_part < 0) and self.can_fuse():
+                annotated_frame = self.process_fused()
             else:
-                annotated_frame = self.frame
+                annotated_frame = self._process_stages(f_index=f_index, lock_part=lock_part, preview=preview)
+
             if f_index is None:
-                move_final_data(self.video_filename)
+                move_final_data(self.video_filename, keep_temp=self.parameters['config'].get('_keep_temp_data', True))
 
             
         except BaseError as e:
-            if self.error_reporting is not None:
-                print(e)
-                flash_error_msg(e, self.error_reporting)
-                self.error_reporting.toggle_img.setChecked(False)#Moved these two lines in if statement
-                self.error_reporting.toggle_img.setText("Captured Image")
+            #Without the gui to report to the caller is told, eg batchprocess records the movie as failed
+            if self.error_reporting is None:
+                raise
+            print(e)
+            flash_error_msg(e, self.error_reporting)
+            self.error_reporting.toggle_img.setChecked(False)#Moved these two lines in if statement
+            self.error_reporting.toggle_img.setText("Captured Image")
             proc_frame = self.frame
             annotated_frame = self.frame
 
         return annotated_frame, proc_frame
 
-def move_final_data(movie_filename):
+    def _process_stages(self, f_index=None, lock_part=-1, preview=False):
+        """Runs each unlocked stage in turn. 
+        
+        For a single frame each stage returns its dataframe which is handed directly
+        to the next stage. For the whole movie each stage writes its own file and df is None.
+        A preview only tracks at reduced resolution, the later stages are unchanged."""
+        df = None
+        if lock_part < 0:
+            df = self.preview.track(f_index) if preview else self.pt.track(f_index=f_index)
+
+        if lock_part < 1:
+            df = self.link.link_trajectories(
+                f_index=f_index, lock_part=lock_part, df=df)
+
+        if lock_part < 2:
+            df = self.pp.process(f_index=f_index, lock_part=lock_part, df=df)
+
+        if f_index is not None:
+            if df is None:
+                df = self.data.post_store.get_df(f_index=f_index)
+            self.data.set_temp_df(df)
+
+        if lock_part < 3:
+            annotated_frame = self.an.annotate(
+                f_index=f_index, lock_part=lock_part, df=df)
+        else:
+            annotated_frame = self.frame
+        return annotated_frame
+
+    def up_to_date_part(self):
+        """Returns the last stage whose stored data is up to date with the current settings
+        
+        Each whole movie datafile stores a fingerprint of the settings and inputs it was built from 
+        (see general.fingerprints). Stages are checked in order (0 = track, 1 = link, 2 = postprocess). A missing
+        file is skipped since the fused processing only writes _postprocess.hdf5 but the first
+        file that is out of date means it and all later stages must be rerun. Returns -1 if 
+        everything needs processing. Annotation is always rerun."""
+        if not self.parameters['config'].get('_incremental_processing', True):
+            return -1
+
+        up_to_date = -1
+        for part, fingerprint in enumerate(expected_fingerprints(self.parameters)):
+            filename = self.data.base_filename + CustomButton.extension[part]
+            if not data_exists(filename):
+                continue
+            if read_fingerprint(filename) != fingerprint:
+                break
+            up_to_date = part
+
+        if up_to_date >= 0:
+            print('Settings unchanged, reusing stored data for: ' + 
+                  ', '.join(['track', 'link', 'postprocess'][:up_to_date + 1]))
+        return up_to_date
+
+    def can_fuse(self):
+        """Whole movie can be processed in a single pass if no linking is required
+        and all the postprocessing and annotation methods only need data from the
+        current frame."""
+        return self.parameters['config'].get('_fused_processing', True) \
+            and ('default' not in self.parameters['link']['link_method']) \
+            and frame_local(self.parameters['postprocess'], 'postprocess') \
+            and frame_local(self.parameters['annotate'], 'annotate')
+
+    def process_fused(self):
+        """Processes the whole movie in a single pass. 
+        
+        Each frame is decoded once and preprocessed, tracked, given particle ids, 
+        postprocessed and annotated before moving on to the next frame. The annotated
+        frames are streamed to the output video, or recorded in the overlay file, exactly 
+        as TrackingAnnotator.annotate would (see movie_output). The data is written in 
+        chunks through a DataCheckpoint directly to _postprocess.hdf5 without the 
+        intermediate _track.hdf5 and _link.hdf5 files. Every frame is processed even if 
+        chunks from an interrupted run exist since the video and the particle ids need 
+        all the earlier frames. Only used when can_fuse is True, otherwise process runs 
+        each stage in turn."""
+        print('Processing in a single pass...')
+        start, stop, step = self.cap.frame_range
+        output = movie_output(self.parameters)
+        if output == 'overlay':
+            overlay = self.an.open_overlay()
+        elif output == 'video':
+            output_vid = self.an.open_video()
+            scale = render_scale(self.parameters)
+
+        num_particles = 0
+        self.cap.set_frame(start)
+        progress = tqdm(range(start, stop, step), 'Processing')
+        fingerprint = expected_fingerprints(self.parameters)[2]
+        interval = self.parameters['config'].get('_checkpoint_interval', 500)
+        #The parameters can't change during the run so the methods are compiled once
+        with DataCheckpoint(self.data.post_store.read_filename, range(start, stop, step), fingerprint=fingerprint, 
+                            interval=interval, storage=self.data.storage) as store, \
+                self.ip.fixed(), self.pp.fixed(), self.an.fixed():
+            for f in progress:
+                frame = self.cap.read_frame(n=f)
+                df = self.pt.analyse_frame(frame=frame)
+                df.index = pd.Index([f] * len(df), name='frame')
+                self.pt.track_progress.emit(f, start, stop, step)
+
+                #Particle ids continue across frames as they would if the whole movie were unlinked
+                df = no_linking(df)
+                df['particle'] += num_particles
+                num_particles += len(df)
+
+                df = self.pp.process_frames(df, f_index=f)
+                store.write_data(df, f_index=f)
+
+                if output == 'overlay':
+                    self.an.annotate_frame(df, overlay.canvas(f), f)
+                elif output == 'video':
+                    output_vid.add_frame(self.an.annotate_frame(df, frame, f, scale=scale))
+                    progress.set_postfix_str(output_vid.status(), refresh=False)
+
+            if output == 'overlay':
+                overlay.close()
+            elif output == 'video':
+                output_vid.close()
+        print('Processing complete')
+
+
+def move_final_data(movie_filename, keep_temp=True):
+    """Puts the postprocessed data next to the movie with a checksum file eg movie.hdf5.sha256.
+    
+    The data is hard linked rather than copied if the movie and _temp folder are on the 
+    same filesystem. If keep_temp is False the _temp data is moved instead, so the 
+    postprocessing stage can't be locked or reused afterwards. See finalise_data_file"""
     path, filename = os.path.split(movie_filename)
     postprocess_datafile = path + '/_temp/' + filename[:-4] + CustomButton.extension[2]
     output_datafile = path + '/' + filename[:-4] + '.hdf5'
 
-    if os.path.exists(postprocess_datafile):
-        shutil.copy(postprocess_datafile, output_datafile)
\ No newline at end of file
+    #Works with whichever format the data is stored in
+    finalise_data_file(postprocess_datafile, output_datafile, keep_source=keep_temp)
\ No newline at end of file
@@ -0,0 +1,150 @@
+import os
+import glob
+import time
+import json
+import hashlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import PTWorkflow
+from ..general.dataframes import data_exists
+
+
+"""
+Helpers for batchprocess. Each movie is processed independently, either in this
+process or in a pool of worker processes. The outcome of each movie is recorded in a
+manifest (batchprocess_manifest.json in the _temp folder next to the movies) so that if a
+batch is restarted the movies already completed with the same settings are skipped.
+"""
+
+
+def process_movie(filename, settings_filename):
+    """Processes a single movie. Runs in a worker process so must stay at module level.
+
+    Returns
+    -------
+    dict with status ('complete' or 'failed'), start time, duration in seconds and error traceback
+    """
+    start = time.time()
+    try:
+        tracker = PTWorkflow(video_filename=filename, param_filename=settings_filename)
+        tracker.process()
+        status, error = 'complete', None
+    except Exception:
+        status, error = 'failed', traceback.format_exc()
+    return {'status': status,
+            'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start)),
+            'duration': round(time.time() - start, 2),
+            'error': error}
+
+
+class BatchManifest:
+    def __init__(self, filenames, settings_filename=None):
+        """Record of the status of each movie in a batch stored as json on disk
+
+        Parameters
+        ----------
+        filenames : list of str
+            The movies in the batch
+        settings_filename : str or None
+            The .param file used. A movie processed with a different settings file is not
+            considered complete.
+        """
+        path = os.path.dirname(filenames[0]) if filenames else '.'
+        self.filename = os.path.join(path, '_temp', 'batchprocess_manifest.json')
+        self.settings = _settings_signature(settings_filename)
+        self.jobs = {}
+        if os.path.exists(self.filename):
+            try:
+                with open(self.filename, 'r') as f:
+                    self.jobs = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f'Error reading batch manifest, starting a new one: {e}')
+
+    def is_complete(self, filename):
+        """Movie previously completed with the same settings and its data file still exists"""
+        job = self.jobs.get(os.path.abspath(filename), {})
+        output_datafile = os.path.splitext(filename.replace('*', ''))[0] + '.hdf5'
+        return job.get('status') == 'complete' \
+            and job.get('settings') == self.settings \
+            and data_exists(output_datafile)
+
+    def update(self, filename, **job):
+        """Records the outcome of a movie and saves the manifest"""
+        job['settings'] = self.settings
+        self.jobs[os.path.abspath(filename)] = job
+        self.save()
+
+    def save(self):
+        """Written to a temporary file first so a crash never leaves a half written manifest"""
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        with open(self.filename + '.part', 'w') as f:
+            json.dump(self.jobs, f, indent=4)
+        os.replace(self.filename + '.part', self.filename)
+
+
+def run_batch(filenames, settings_filename=None, workers=1):
+    """Processes filenames, largest first, skipping those already completed.
+
+    If workers is 1 movies are processed one after another in this process, otherwise
+    a pool of worker processes is used. A movie that fails is recorded in the manifest
+    and the rest of the batch continues.
+
+    Returns
+    -------
+    BatchManifest
+    """
+    manifest = BatchManifest(filenames, settings_filename=settings_filename)
+
+    jobs = [filename for filename in filenames if not manifest.is_complete(filename)]
+    for filename in sorted(set(filenames) - set(jobs)):
+        print(f'Skipping {filename}, already processed with these settings')
+    #Longest jobs start first so a big file is not left running on its own at the end
+    jobs.sort(key=_file_size, reverse=True)
+
+    if workers == 1:
+        for filename in jobs:
+            manifest.update(filename, status='running')
+            _report(filename, manifest, process_movie(filename, settings_filename))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for filename in jobs:
+                manifest.update(filename, status='pending')
+                futures[pool.submit(process_movie, filename, settings_filename)] = filename
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception:
+                    #Worker process died eg out of memory
+                    result = {'status': 'failed', 'started': None, 'duration': None,
+                              'error': traceback.format_exc()}
+                _report(futures[future], manifest, result)
+
+    failed = [filename for filename in jobs if manifest.jobs[os.path.abspath(filename)]['status'] == 'failed']
+    if failed:
+        print(f'{len(failed)} of {len(jobs)} movies failed, see {manifest.filename}')
+    return manifest
+
+
+def _report(filename, manifest, result):
+    manifest.update(filename, **result)
+    if result['status'] == 'failed':
+        print(f"Error processing {filename}:\n{result['error']}")
+    else:
+        print(f"Processed {filename} in {result['duration']}s")
+
+
+def _file_size(filename):
+    """Size of movie or total size of an image sequence"""
+    if '*' in filename:
+        return sum(os.path.getsize(name) for name in glob.glob(filename))
+    return os.path.getsize(filename) if os.path.exists(filename) else 0
+
+
+def _settings_signature(settings_filename):
+    """Hash of the settings file contents"""
+    if settings_filename is None or not os.path.exists(settings_filename):
+        return None
+    with open(settings_filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
@@ -0,0 +1,206 @@
+import copy
+import cv2
+import numpy as np
+
+from .. import preprocess, track
+from ..crop import mask_box
+from ..general.parameters import get_param_val, parameters_version
+
+
+"""
+Reduced resolution previews of single frames for the gui. While the settings are being
+adjusted each change is first shown for a frame shrunk by config['_preview_scale'],
+which is preprocessed and tracked much faster than the full frame, and the full
+resolution result replaces it once the adjustments stop (see MainWindow.param_change).
+
+The preprocessing and tracking parameters measured in pixels (PIXEL_PARAMS) are scaled
+to match the shrunk frame and the particles found are moved back to the coordinates of
+the full resolution frame (see full_resolution). Linking, postprocessing and annotation
+then run on those as usual so the annotations are drawn on the full resolution frame.
+"""
+
+#Frames with fewer pixels than this are always shown at full resolution
+PREVIEW_MIN_PIXELS = 1000000
+
+#Parameters measured in pixels {section: {method: {parameter: (power, minimum, odd)}}}.
+#The value is multiplied by scale**power, so areas have power 2, and kept >= minimum and odd if required.
+PIXEL_PARAMS = {
+    'preprocess': {
+        'adaptive_threshold': {'block_size': (1, 3, True)},
+        'blur': {'kernel': (1, 1, True)},
+        'medianblur': {'kernel': (1, 1, True)},
+        'subtract_bkg': {'subtract_bkg_blur_kernel': (1, 1, True)},
+        'erosion': {'kernel': (1, 1, True)},
+        'dilation': {'kernel': (1, 1, True)},
+    },
+    'track': {
+        'trackpy': {'diameter': (1, 3, True),
+                    'minmass': (2, 0, False),
+                    'intensity_radius': (1, 1, False)},
+        'hough': {'min_dist': (1, 1, False),
+                  'min_rad': (1, 1, False),
+                  'max_rad': (1, 1, False)},
+        'contours': {'area_min': (2, 1, False),
+                     'area_max': (2, 1, False)},
+    },
+}
+
+#Columns added by the tracking methods that are measured in pixels {column: power}
+PIXEL_COLUMNS = {'x': 1, 'y': 1, 'r': 1, 'size': 1, 'area': 2, 'mass': 2, 'raw_mass': 2}
+
+
+def preview_scale(parameters, cap):
+    """Scale the frames of cap are shrunk by for a preview or None if they are shown at full resolution"""
+    scale = parameters['config'].get('_preview_scale', 0.5)
+    height, width = cap.mask.shape[:2]
+    if scale is None or scale >= 1 or height * width < PREVIEW_MIN_PIXELS or not previewable(parameters):
+        return None
+    return scale
+
+
+def previewable(parameters):
+    """False if the methods use something measured at full resolution, ie a background
+    image (subtract_bkg) or the points of the mask (hough remove_masked)"""
+    for method in parameters['preprocess']['preprocess_method']:
+        if method.split('*')[0] == 'subtract_bkg':
+            if get_param_val(parameters['preprocess'][method]['subtract_bkg_type']) not in ('mean', 'median'):
+                return False
+    for method in parameters['track']['track_method']:
+        if method.split('*')[0] == 'hough' and get_param_val(parameters['track'][method]['remove_masked']):
+            return False
+    return True
+
+
+def preview_parameters(parameters, scale):
+    """Copy of parameters with the preprocessing and tracking parameters in PIXEL_PARAMS scaled.
+    The other sections are shared with parameters."""
+    preview = dict(parameters)
+    for section, pixel_methods in PIXEL_PARAMS.items():
+        preview[section] = copy.deepcopy(parameters[section])
+        for method, params in preview[section].items():
+            pixel_params = pixel_methods.get(method.split('*')[0])
+            if pixel_params is None or not isinstance(params, dict):
+                continue
+            for name, (power, minimum, odd) in pixel_params.items():
+                if name in params:
+                    params[name] = _scale_param(params[name], scale ** power, minimum, odd)
+    return preview
+
+
+def _scale_param(param, scale, minimum, odd):
+    value = get_param_val(param)
+    if isinstance(value, int):
+        value = max(minimum, int(round(value * scale)))
+        if odd and value % 2 == 0:
+            value += 1
+    else:
+        value = max(minimum, value * scale)
+    if isinstance(param, list):
+        return [value] + param[1:]
+    return value
+
+
+def shrink(img, scale, interpolation=cv2.INTER_AREA):
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=interpolation)
+
+
+def full_resolution(df, scale):
+    """Moves the particles found in a preview frame to the coordinates of the full resolution frame"""
+    for column, power in PIXEL_COLUMNS.items():
+        if column in df.columns:
+            df[column] = df[column] / scale ** power
+    if 'contours' in df.columns:
+        df['contours'] = [np.round(contour / scale).astype(contour.dtype) if isinstance(contour, np.ndarray) else contour
+                          for contour in df['contours']]
+    return df
+
+
+class PreviewVideo:
+    """The frames of a ReadCropVideo shrunk by scale, with the mask shrunk to match.
+
+    Everything else, eg frame_range, is that of the ReadCropVideo.
+    """
+
+    def __init__(self, cap, scale=1):
+        self.cap = cap
+        self.scale = scale
+        self._mask = (None, None, None, None)
+
+    def __getattr__(self, name):
+        return getattr(self.cap, name)
+
+    def read_frame(self, n=None):
+        return shrink(self.cap.read_frame(n=n), self.scale)
+
+    @property
+    def mask(self):
+        return self._shrunk_mask()[0]
+
+    @property
+    def mask_box(self):
+        return self._shrunk_mask()[1]
+
+    def _shrunk_mask(self):
+        #The mask is replaced whenever it is changed, see ReadCropVideo.set_mask
+        if self._mask[0] is not self.cap.mask or self._mask[1] != self.scale:
+            mask = shrink(self.cap.mask, self.scale, interpolation=cv2.INTER_NEAREST)
+            box = None if self.cap.mask_box is None else mask_box(mask)
+            self._mask = (self.cap.mask, self.scale, mask, box)
+        return self._mask[2:]
+
+    def apply_mask(self, frame, region=None):
+        """Masks a shrunk frame (see ReadCropVideo.apply_mask)"""
+        if region is None:
+            return cv2.bitwise_and(frame, self.mask)
+        x0, y0, x1, y1 = region
+        return cv2.bitwise_and(frame, self.mask[y0:y1, x0:x1])
+
+
+class Preview:
+    """
+    Preprocesses and tracks single frames at reduced resolution.
+
+    It has its own Preprocessor and ParticleTracker which are given the preview_parameters
+    of the workflow's parameters and a PreviewVideo of its ReadCropVideo each time a frame is
+    previewed, so the settings can be changed in between. The preview_parameters are only
+    rebuilt when the settings or the scale change so the methods aren't compiled again for
+    every frame, and track uses the frame preprocess has just preprocessed.
+    """
+
+    def __init__(self, parameters, cap):
+        self.parameters = parameters
+        self.cap = PreviewVideo(cap)
+        self.ip = preprocess.Preprocessor(parameters)
+        self.pt = track.ParticleTracker(parameters=parameters, preprocessor=self.ip, vidobject=self.cap)
+        self._key = None
+        self._frames = (None, None, None, None)
+
+    def scale(self):
+        """See preview_scale"""
+        return preview_scale(self.parameters, self.cap.cap)
+
+    def preprocess(self, f_index):
+        """Preprocessed frame f_index enlarged back to the size of the full resolution frame"""
+        self._update()
+        frame = self.cap.read_frame(f_index)
+        preprocessed = self.ip.process(frame, previous_frames=self.pt.previous_frames(f_index))
+        preprocessed = self.cap.apply_mask(preprocessed)
+        self._frames = (f_index, self._key, frame, preprocessed)
+        height, width = self.cap.cap.mask.shape[:2]
+        return cv2.resize(preprocessed, (width, height), interpolation=cv2.INTER_NEAREST)
+
+    def track(self, f_index):
+        """Particles in frame f_index in the coordinates of the full resolution frame (see ParticleTracker.track)"""
+        self._update()
+        f, key, frame, preprocessed = self._frames
+        if f != f_index or key is not self._key:
+            frame = preprocessed = None
+        df = self.pt.track(f_index=f_index, frame=frame, preprocessed=preprocessed)
+        return full_resolution(df, self.cap.scale)
+
+    def _update(self):
+        self.cap.scale = self.scale()
+        key = (self.parameters, parameters_version(), self.cap.scale)
+        if self._key is None or any(a is not b for a, b in zip(key, self._key)):
+            self._key = key
+            self.ip.parameters = self.pt.parameters = preview_parameters(self.parameters, self.cap.scale)
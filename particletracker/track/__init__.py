@@ -1,11 +1,14 @@
+import contextlib
 import os
 from PyQt6.QtCore import pyqtSignal, QObject
 from tqdm import tqdm
 import numpy as np
 import pandas as pd
 
-from ..general.dataframes import DataWrite
+from ..general.dataframes import DataCheckpoint
+from ..general.fingerprints import stage_fingerprint
 from ..track import tracking_methods as tm
+from ..track.mask_region import tracking_region, offset_positions
 
 
 class ParticleTracker(QObject):
@@ -25,7 +28,7 @@ class ParticleTracker(QObject):
 
     """
 
-    def __init__(self, parameters=None, preprocessor=None, vidobject=None, *args, **kwargs):
+    def __init__(self, parameters=None, preprocessor=None, vidobject=None, data=None, *args, **kwargs):
         """
 
         Parameters
@@ -38,6 +41,8 @@ class ParticleTracker(QObject):
 
         vidobject: instance of ReadCropVideo()
 
+        data: instance of DataManager() or None. Sets how the tracking data is stored.
+
         data_filename: str
             Filepath for datastore
 
@@ -47,10 +52,11 @@ class ParticleTracker(QObject):
         self.parameters = parameters
         self.ip = preprocessor
         self.cap = vidobject
+        self.storage = None if data is None else data.storage
         path, filename = os.path.split(os.path.splitext(vidobject.filename)[0])
         self.base_filename = path + '/_temp/' + filename
         
-    def track(self, f_index=None, lock_part=-1):
+    def track(self, f_index=None, lock_part=-1, frame=None, preprocessed=None):
         """
         Method called by track.process() and track.process_frame()
 
@@ -59,57 +65,113 @@ class ParticleTracker(QObject):
         If track is called with f_index=None it will run a tracking method
         on all the frames specified by frame_range when the ReadVideo object was
         instantiated by PTWorkflow. If f_index is an integer value only that frame is
-        processed. A store is still created.
+        processed and the resulting dataframe is returned rather than stored.
 
         Parameters
         ---------
         f_index: int or None
+        frame, preprocessed: np.ndarray or None
+            Frame f_index and the same frame already preprocessed and masked, see analyse_frame
+
+        Returns
+        -------
+        Single frame dataframe if f_index is an integer else None
         """
         print('Tracking...')
         if lock_part == -1:
-            if f_index is None:
-                'When processing whole video store in file with same name as movie'
-                output_filename = f"{self.base_filename}_track.hdf5"
-            else:
-                'store temporarily'
-                output_filename = f"{self.base_filename}_temp.hdf5"
-
-            if f_index is None:
-                start = self.cap.frame_range[0]
-                stop = self.cap.frame_range[1]
-                step = self.cap.frame_range[2]
-            else:
-                start = f_index
-                stop = f_index + 1
-                step=1
+            if f_index is not None:
+                'Single frame is handed straight to the linker rather than stored in _temp.hdf5'
+                self.cap.set_frame(f_index)
+                df_frame = self.analyse_frame(n=f_index, frame=frame, preprocessed=preprocessed)
+                df_frame.index = pd.Index([f_index] * len(df_frame), name='frame')
+                self.track_progress.emit(f_index, f_index, f_index + 1, 1)
+                print('Tracking complete')
+                return df_frame
+
+            'When processing whole video store in file with same name as movie'
+            output_filename = f"{self.base_filename}_track.hdf5"
+            start = self.cap.frame_range[0]
+            stop = self.cap.frame_range[1]
+            step = self.cap.frame_range[2]
 
             self.cap.set_frame(start)
 
-            with DataWrite(output_filename) as store:    
-                for f in tqdm(range(start, stop, step), 'Tracking'):
-                    df_frame = self.analyse_frame(n=f)
+            #Frames are checkpointed so that an interrupted run resumes where it stopped
+            interval = self.parameters['config'].get('_checkpoint_interval', 500)
+            with DataCheckpoint(output_filename, range(start, stop, step),
+                                fingerprint=stage_fingerprint(self.parameters, 0),
+                                interval=interval, storage=self.storage) as store, self.preprocessing_fixed():
+                last_f = None
+                for f in tqdm(store.remaining_frames, 'Tracking'):
+                    #Frames already in a checkpoint are skipped so the previous frames may need reading again
+                    df_frame = self.analyse_frame(n=f, restart=f != start and f - step != last_f)
+                    last_f = f
                     store.write_data(df_frame, f_index=f)
                     #Signal to indicate how many frames tracked
                     self.track_progress.emit(f, start, stop, step)  
         print('Tracking complete')             
 
-    def analyse_frame(self, n=None):
+    def preprocessing_fixed(self):
+        """Context in which the preprocessing methods are compiled once for the whole movie"""
+        return contextlib.nullcontext() if self.ip is None else self.ip.fixed()
+
+    def previous_frames(self, n, region=None):
+        """Function that reads the num_frames frames that precede frame n when the whole movie
+        is processed, for preprocessing methods that use previous frames (see Preprocessor.process)"""
+        def read_frames(num_frames):
+            start, _, step = self.cap.frame_range
+            for f in range(max(start, n - num_frames * step), n, step):
+                frame = self.cap.read_frame(n=f)
+                if region is not None:
+                    x0, y0, x1, y1 = region
+                    frame = frame[y0:y1, x0:x1]
+                yield frame
+        return read_frames
+
+    def analyse_frame(self, n=None, frame=None, restart=False, preprocessed=None):
         """Analyses a single frame using a track method specified in PARAMETERS
+
+        Parameters
+        ----------
+        n: int or None
+            frame number to read from the video
+        frame: np.ndarray or None
+            An already decoded frame. If supplied no frame is read from the video.
+        restart: bool
+            True if frame n doesn't follow the last frame analysed while tracking the whole
+            movie. The preprocessing methods that use previous frames read them again (see Preprocessor.restart).
+        preprocessed: np.ndarray or None
+            The whole frame already preprocessed and masked, eg by a preview. If supplied it isn't preprocessed again.
+
         Returns
         -------
         Pandas dataframe with tracked data.
         """
-        frame = self.cap.read_frame(n=n)
-        method = self.parameters['track']['track_method'][0]
-        
+        if frame is None:
+            frame = self.cap.read_frame(n=n)
+        track_method = getattr(tm, self.parameters['track']['track_method'][0])
+
+        #Only the part of the frame around the mask is processed if that gives the same result
+        region = tracking_region(self.cap, self.ip, track_method, self.parameters)
+        if region is not None:
+            x0, y0, x1, y1 = region
+            frame = frame[y0:y1, x0:x1]
+
         if self.ip is None:
             preprocessed_frame = frame
+        elif preprocessed is not None:
+            preprocessed_frame = preprocessed if region is None else preprocessed[y0:y1, x0:x1]
         else:
-            preprocessed_frame = self.ip.process(frame)
-            preprocessed_frame = self.cap.apply_mask(preprocessed_frame)
+            previous_frames = None if n is None else self.previous_frames(n, region=region)
+            if restart:
+                self.ip.restart(previous_frames)
+            preprocessed_frame = self.ip.process(frame, previous_frames=previous_frames)
+            preprocessed_frame = self.cap.apply_mask(preprocessed_frame, region=region)
         
         #Apply tracking track method to frame
-        df_frame = getattr(tm, method)(preprocessed_frame, frame, self.parameters, section='track')
+        df_frame = track_method(preprocessed_frame, frame, self.parameters, section='track')
+        if region is not None:
+            df_frame = offset_positions(df_frame, x0, y0)
     
         if df_frame.empty:
             for column in df_frame.columns:
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+"""
+Tracking only the part of the frame around the mask. When the mask (mask_circle, 
+mask_polygon etc) covers a small part of the frame, eg a well in a wide field image, 
+most of the preprocessing and tracking is of pixels that are then masked. Instead the
+frame is cut down to the bounding box of the mask (see crop.mask_box) plus enough pixels
+for the preprocessing kernels to see the same neighbourhood as in the whole frame. The
+positions found are then moved back to the coordinates of the cropped frame.
+
+This only gives the same result as the whole frame if every preprocessing method only 
+uses nearby pixels (see preprocess.tiles) and the tracking method only uses the pixels 
+near each particle. Such tracking methods are decorated with @mask_bounded. trackpy
+is not, because its percentile threshold depends on the whole frame. Nor is hough. Its
+edges are local, but cv2.HoughCircles can find circles centred outside the region, which
+then remove nearby circles closer than min_dist. remove_masked also compares the centres 
+with the mask in the coordinates of the whole frame.
+"""
+
+
+def mask_bounded(func):
+    """mask_bounded decorator marks a tracking method which finds the same particles in any part of the frame that contains them"""
+    func.mask_bounded = True
+    return func
+
+
+def tracking_region(cap, preprocessor, track_method, parameters):
+    """Rectangle (x0, y0, x1, y1) of the cropped frame that is preprocessed and tracked or None for the whole frame.
+
+    This is the bounding box of the mask plus the total kernel radius of the preprocessing 
+    methods and a pixel so that the edge of the region is always outside the mask. 
+    config['_track_mask_region'] = False always uses the whole frame.
+    """
+    box = getattr(cap, 'mask_box', None)
+    if (box is None or preprocessor is None or not getattr(track_method, 'mask_bounded', False)
+            or not parameters['config'].get('_track_mask_region', True)):
+        return None
+    halo = preprocessor.halo()
+    if halo is None:
+        return None
+    x0, y0, x1, y1 = box
+    height, width = cap.mask.shape[:2]
+    return (max(0, x0 - halo - 1), max(0, y0 - halo - 1), min(width, x1 + halo + 1), min(height, y1 + halo + 1))
+
+
+def offset_positions(df, x0, y0):
+    """Moves the particles found in a region starting at (x0, y0) back to the coordinates of the cropped frame"""
+    if 'x' in df.columns:
+        df['x'] = df['x'] + x0
+    if 'y' in df.columns:
+        df['y'] = df['y'] + y0
+    if 'contours' in df.columns:
+        df['contours'] = [contour + np.array([x0, y0], dtype=contour.dtype) for contour in df['contours']]
+    return df
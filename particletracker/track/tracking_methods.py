@@ -5,6 +5,7 @@ import pandas as pd
 
 from ..general.parameters import get_param_val, get_method_key, param_parse
 from ..track import intensity_methods as im
+from ..track.mask_region import mask_bounded
 from ..customexceptions import *
 from ..user_methods import *
 
@@ -252,6 +253,7 @@ def hough(ppframe, frame, params=None, *args, **kwargs):
 
 
 @error_handling
+@mask_bounded
 def contours(pp_frame, frame, parameters=None, *args, **kwargs):
     '''
     Implementation of OpenCVs contours.
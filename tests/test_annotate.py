@@ -0,0 +1,106 @@
+import numpy as np
+import cv2
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from particletracker.annotate.primitives import draw_circles, draw_text, draw_lines, fill_polygons, draw_arrows, colour_groups
+
+
+"""---------------------------------------------------------------------------------------------------------
+The batch drawing primitives must draw the same pixels as the per shape OpenCV calls
+the annotation methods used to make. Circles, text and arrows skip rows containing nan.
+Lines and arrows are grouped by colour and drawn one colour after another (see primitives.py)
+so the OpenCV calls are made in that order.
+---------------------------------------------------------------------------------------------------------"""
+
+rng = np.random.default_rng(0)
+SHAPE = (200, 300, 3)
+NUM = 20
+
+
+def blank():
+    return np.zeros(SHAPE, dtype=np.uint8)
+
+
+def random_points(num=NUM, nan_rows=(3, 11)):
+    xy = rng.uniform(0, 300, (num, 2))
+    xy[:, 1] *= 200 / 300
+    for row in nan_rows:
+        xy[row, row % 2] = np.nan
+    return xy
+
+
+def random_colours(num=NUM):
+    #Few colours so several shapes share each one
+    return rng.choice([[255, 0, 0], [0, 255, 0], [0, 0, 255]], num)
+
+
+def colour_order(colours):
+    return np.concatenate([indices for _, indices in colour_groups(colours)])
+
+
+def test_draw_circles():
+    """Testing circles against cv2.circle for outlined and filled circles"""
+    xy = random_points()
+    radii = rng.uniform(2, 30, NUM)
+    radii[5] = np.nan
+    colours = random_colours()
+    for thickness in (2, -1):
+        expected = blank()
+        for (x, y), r, colour in zip(xy, radii, colours):
+            if np.isfinite([x, y, r]).all():
+                expected = cv2.circle(expected, (int(x), int(y)), int(r), tuple(int(c) for c in colour), thickness)
+        assert (draw_circles(blank(), xy, radii, colours, thickness=thickness) == expected).all(), thickness
+
+
+def test_draw_text():
+    """Testing text against cv2.putText"""
+    xy = random_points()
+    texts = [str(i) for i in range(NUM)]
+    colour = (255, 0, 255)
+    expected = blank()
+    for text, (x, y) in zip(texts, xy):
+        if np.isfinite([x, y]).all():
+            expected = cv2.putText(expected, text, (int(x), int(y)), cv2.FONT_HERSHEY_COMPLEX_SMALL,
+                                   1, colour, 2, cv2.LINE_AA)
+    assert (draw_text(blank(), texts, xy, colour, font_size=1, thickness=2) == expected).all()
+
+
+def test_draw_lines():
+    """Testing polylines grouped by colour against one cv2.polylines call per line"""
+    segments = [random_points(num, nan_rows=()) for num in rng.integers(2, 8, NUM)]
+    colours = random_colours()
+    for closed, line_type in ((False, cv2.LINE_8), (True, cv2.LINE_8), (False, cv2.LINE_AA)):
+        expected = blank()
+        for i in colour_order(colours):
+            expected = cv2.polylines(expected, [segments[i].astype(np.int32).reshape((-1, 1, 2))], closed,
+                                     tuple(int(c) for c in colours[i]), 2, lineType=line_type)
+        drawn = draw_lines(blank(), segments, colours, thickness=2, line_type=line_type, closed=closed)
+        assert (drawn == expected).all(), (closed, line_type)
+
+
+def test_fill_polygons():
+    """Testing filled polygons, some of which overlap, against one cv2.fillPoly call per polygon"""
+    polygons = [random_points(num, nan_rows=()) for num in rng.integers(3, 8, NUM)]
+    colours = random_colours()
+    expected = blank()
+    for polygon, colour in zip(polygons, colours):
+        expected = cv2.fillPoly(expected, [polygon.astype(np.int32).reshape((-1, 1, 2))], tuple(int(c) for c in colour))
+    assert (fill_polygons(blank(), polygons, colours) == expected).all()
+
+
+def test_draw_arrows():
+    """Testing arrows against cv2.arrowedLine"""
+    starts = random_points()
+    ends = random_points(nan_rows=(7,))
+    colours = random_colours()
+    valid = np.isfinite(starts).all(axis=1) & np.isfinite(ends).all(axis=1)
+    for line_type in (cv2.LINE_8, cv2.LINE_AA):
+        expected = blank()
+        for i in np.flatnonzero(valid)[colour_order(colours[valid])]:
+            expected = cv2.arrowedLine(expected, tuple(int(v) for v in starts[i]), tuple(int(v) for v in ends[i]),
+                                       tuple(int(c) for c in colours[i]), 2, line_type, tipLength=0.2)
+        drawn = draw_arrows(blank(), starts, ends, colours, thickness=2, line_type=line_type, tip_length=0.2)
+        assert (drawn == expected).all(), line_type
@@ -25,6 +25,8 @@ import subprocess
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from particletracker import suppress_warnings
 from particletracker import batchprocess
+from particletracker.project import PTWorkflow
+from particletracker.general.writeread_param_dict import read_paramdict_file, write_paramdict_file
 import pandas as pd
 
 """---------------------------------------------------------------------------------------------------------
@@ -72,6 +74,7 @@ def test_eyes():
         152.3), df.loc[3, ['x_mean']].to_numpy()[0][0]
     os.remove(output_video)
     os.remove(output_df)
+    os.remove(output_df + '.sha256')
     if os.path.exists(temp_dir):
         shutil.rmtree(temp_dir)
 
@@ -102,6 +105,7 @@ def test_colloids():
         1210.1742613661322), df.loc[0, ['mass']].to_numpy()[0][0]
     os.remove(output_video)
     os.remove(output_df)
+    os.remove(output_df + '.sha256')
     if os.path.exists(temp_dir):
         shutil.rmtree(temp_dir)
 
@@ -129,6 +133,7 @@ def test_hydrogel():
     assert int(df.loc[0, ['voronoi_area']].to_numpy()[2][0]) == int(1081609.2758450378), df.loc[0, ['voronoi_area']].to_numpy()[2][0]  # 'tested value in hydrogel df incorrect'
     os.remove(output_video)
     os.remove(output_df)
+    os.remove(output_df + '.sha256')
     if os.path.exists(temp_dir):
         shutil.rmtree(temp_dir)
 
@@ -155,6 +160,7 @@ def test_bacteria():
         4.0), df.loc[0, ['box_width']].to_numpy()[0][0]
     os.remove(output_video)
     os.remove(output_df)
+    os.remove(output_df + '.sha256')
     if os.path.exists(temp_dir):
         shutil.rmtree(temp_dir)
 
@@ -183,11 +189,533 @@ def test_discs():
         0][0]  # 'tested value in discs df incorrect'
     os.remove(output_video)
     os.remove(output_df)
+    os.remove(output_df + '.sha256')
 
     if os.path.exists(temp_dir):
         shutil.rmtree(temp_dir)
 
 
+def test_fused_processing():
+    """Test that processing the whole movie in a single pass, which happens when no linking
+    is required, gives the same data as running each stage in turn.
+    Test uses: discs with no_linking and neighbours
+    """
+    output_df = "testdata/discs.hdf5"
+    output_video = "testdata/discs_annotate.mp4"
+    settings = "testdata/_fused.param"
+    temp_dir = "testdata/_temp"
+
+    parameters = read_paramdict_file("testdata/test_discs.param")
+    parameters['link']['link_method'] = ('no_linking',)
+
+    dfs = []
+    for fused in (True, False):
+        clean_up(temp_dir)
+        parameters['config']['_fused_processing'] = fused
+        write_paramdict_file(parameters, settings)
+        batchprocess("testdata/discs.mp4", settings)
+        assert os.path.exists(output_video), 'Error Discs annotated video not created'
+        dfs.append(pd.read_hdf(output_df))
+    
+    pd.testing.assert_frame_equal(dfs[0][['x', 'y', 'r', 'particle']], dfs[1][['x', 'y', 'r', 'particle']])
+
+    os.remove(settings)
+    os.remove(output_video)
+    os.remove(output_df)
+    os.remove(output_df + '.sha256')
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+
+def test_fused_overlay():
+    """Test that the single pass makes the same overlay file and data as running each stage
+    in turn and, like the annotator, writes no overlay or video when no output is requested.
+    Test uses: discs with no_linking and the overlay encoder
+    """
+    output_df = "testdata/discs.hdf5"
+    output_video = "testdata/discs_annotate.mp4"
+    output_overlay = "testdata/discs_overlay.hdf5"
+    settings = "testdata/_fused.param"
+    temp_dir = "testdata/_temp"
+
+    parameters = read_paramdict_file("testdata/test_discs.param")
+    parameters['link']['link_method'] = ('no_linking',)
+    parameters['config']['video_output']['encoder'] = 'overlay'
+    #Several chunks so the data goes through the checkpoints
+    parameters['config']['_frame_range'] = (0, 5, 1)
+    parameters['config']['_checkpoint_interval'] = 2
+
+    dfs = []
+    shapes = []
+    for fused in (True, False):
+        clean_up(temp_dir)
+        parameters['config']['_fused_processing'] = fused
+        write_paramdict_file(parameters, settings)
+        batchprocess("testdata/discs.mp4", settings)
+        assert not os.path.exists(output_video), 'Error video created as well as the overlay'
+        dfs.append(pd.read_hdf(output_df))
+        shapes.append(pd.read_hdf(output_overlay, key='shapes'))
+        os.remove(output_overlay)
+
+    pd.testing.assert_frame_equal(dfs[0][['x', 'y', 'r', 'particle']], dfs[1][['x', 'y', 'r', 'particle']])
+    assert list(dfs[0].index.unique()) == list(range(5)), 'Error fused data missing frames'
+    pd.testing.assert_frame_equal(shapes[0], shapes[1])
+
+    clean_up(temp_dir)
+    parameters['config']['_fused_processing'] = True
+    parameters['config']['video_output']['output'][0] = False
+    write_paramdict_file(parameters, settings)
+    batchprocess("testdata/discs.mp4", settings)
+    assert not os.path.exists(output_overlay), 'Error overlay created when no output requested'
+    assert not os.path.exists(output_video), 'Error video created when no output requested'
+    pd.testing.assert_frame_equal(pd.read_hdf(output_df)[['x', 'y', 'r', 'particle']], dfs[0][['x', 'y', 'r', 'particle']])
+
+    os.remove(settings)
+    os.remove(output_df)
+    os.remove(output_df + '.sha256')
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+
+def test_mask_region():
+    """Test that tracking only the region around a small mask gives the same data as
+    tracking the whole frame.
+    Test uses: hydrogel (contours) with a circular mask
+    """
+    from particletracker.track import tracking_methods as tm
+    from particletracker.track.mask_region import tracking_region
+    output_df = "testdata/hydrogel.hdf5"
+    settings = "testdata/_mask_region.param"
+    temp_dir = "testdata/_temp"
+
+    parameters = read_paramdict_file("testdata/test_hydrogel.param")
+    parameters['crop']['crop_method'] = ('crop_box', 'mask_circle')
+    parameters['crop']['mask_circle'] = ((400, 300), (400, 450))
+    parameters['config']['video_output']['output'][0] = False
+
+    dfs = []
+    for restricted in (True, False):
+        clean_up(temp_dir)
+        parameters['config']['_track_mask_region'] = restricted
+        write_paramdict_file(parameters, settings)
+        workflow = PTWorkflow(video_filename="testdata/hydrogel.mp4", param_filename=settings)
+        region = tracking_region(workflow.cap, workflow.ip, tm.contours, workflow.parameters)
+        assert (region is not None) == restricted, region
+        batchprocess("testdata/hydrogel.mp4", settings)
+        dfs.append(pd.read_hdf(output_df))
+
+    assert len(dfs[0]) > 0
+    pd.testing.assert_frame_equal(dfs[0].drop(columns=['contours']), dfs[1].drop(columns=['contours']))
+    assert all((a == b).all() for a, b in zip(dfs[0]['contours'], dfs[1]['contours']))
+
+    os.remove(settings)
+    os.remove(output_df)
+    os.remove(output_df + '.sha256')
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+
+def test_preview(monkeypatch):
+    """Test that a reduced resolution preview of a frame finds about the same particles
+    in the coordinates of the full resolution frame.
+    Test uses: hydrogel (adaptive_threshold, contours) which is smaller than a preview is used for
+    """
+    from particletracker.project import preview
+    from particletracker.project.preview import preview_parameters
+    settings = "testdata/_preview.param"
+    temp_dir = "testdata/_temp"
+
+    clean_up(temp_dir)
+    parameters = read_paramdict_file("testdata/test_hydrogel.param")
+    parameters['config']['_preview_scale'] = 0.5
+    write_paramdict_file(parameters, settings)
+    workflow = PTWorkflow(video_filename="testdata/hydrogel.mp4", param_filename=settings)
+    assert workflow.preview.scale() is None
+
+    monkeypatch.setattr(preview, 'PREVIEW_MIN_PIXELS', 0)
+    assert workflow.preview.scale() == 0.5
+    scaled = preview_parameters(workflow.parameters, 0.5)
+    block_size = workflow.parameters['preprocess']['adaptive_threshold']['block_size'][0]
+    assert scaled['preprocess']['adaptive_threshold']['block_size'][0] == round(block_size / 2) | 1
+    assert scaled['track']['contours']['area_min'][0] == max(1, round(workflow.parameters['track']['contours']['area_min'][0] / 4))
+    assert scaled['postprocess'] is workflow.parameters['postprocess']
+
+    annotated, preprocessed = workflow.process(f_index=0)
+    df = workflow.data.temp_df
+    preview_annotated, preview_preprocessed = workflow.process(f_index=0, preview=True)
+    preview_df = workflow.data.temp_df
+    assert preview_annotated.shape == annotated.shape
+    assert preview_preprocessed.shape == preprocessed.shape
+    assert abs(len(preview_df) - len(df)) < 0.05 * len(df), (len(preview_df), len(df))
+    assert abs(preview_df['x'].mean() - df['x'].mean()) < 10
+    assert abs(preview_df['y'].mean() - df['y'].mean()) < 10
+
+    #Another frame with the same settings doesn't compile the methods again or preprocess the frame twice
+    from particletracker.general import parameters
+    compiled = []
+    compile_methods = parameters.compile_methods
+    def counted_compile(methods, params, section):
+        compiled.append(section)
+        return compile_methods(methods, params, section)
+    monkeypatch.setattr(parameters, 'compile_methods', counted_compile)
+    processed = []
+    process = workflow.preview.ip.process
+    def counted_process(*args, **kwargs):
+        processed.append(args[0].shape)
+        return process(*args, **kwargs)
+    workflow.preview.ip.process = counted_process
+    workflow.process(f_index=1, preview=True)
+    assert compiled == [], compiled
+    assert len(processed) == 1, processed
+
+    os.remove(settings)
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+
+def test_incremental_processing():
+    """Test that processing the whole movie a second time only reruns the stages
+    whose settings have changed.
+    Test uses: discs
+    """
+    output_df = "testdata/discs.hdf5"
+    output_video = "testdata/discs_annotate.mp4"
+    settings = "testdata/_incremental.param"
+    temp_dir = "testdata/_temp"
+    stage_files = [temp_dir + '/discs' + ext for ext in ('_track.hdf5', '_link.hdf5', '_postprocess.hdf5')]
+
+    clean_up(temp_dir)
+    parameters = read_paramdict_file("testdata/test_discs.param")
+    write_paramdict_file(parameters, settings)
+    batchprocess("testdata/discs.mp4", settings)
+    first_run = [os.stat(filename).st_mtime_ns for filename in stage_files]
+
+    parameters['postprocess']['neighbours']['cutoff'][0] = 100
+    write_paramdict_file(parameters, settings)
+    batchprocess("testdata/discs.mp4", settings)
+    second_run = [os.stat(filename).st_mtime_ns for filename in stage_files]
+
+    assert first_run[:2] == second_run[:2], 'Error unchanged stages were reprocessed'
+    assert first_run[2] != second_run[2], 'Error changed postprocess stage was not reprocessed'
+
+    os.remove(settings)
+    os.remove(output_video)
+    os.remove(output_df)
+    os.remove(output_df + '.sha256')
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+
+def test_checkpoint_resume():
+    """Test that tracking which is interrupted resumes from the last checkpoint and 
+    gives the same data as an uninterrupted run.
+    Test uses: discs
+    """
+    settings = "testdata/_checkpoint.param"
+    temp_dir = "testdata/_temp"
+    track_file = temp_dir + "/discs_track.hdf5"
+
+    parameters = read_paramdict_file("testdata/test_discs.param")
+    parameters['config']['_frame_range'] = (0, 6, 1)
+    parameters['config']['_checkpoint_interval'] = 2
+    write_paramdict_file(parameters, settings)
+
+    clean_up(temp_dir)
+    workflow = PTWorkflow(video_filename="testdata/discs.mp4", param_filename=settings)
+    os.makedirs(temp_dir, exist_ok=True)
+    workflow.pt.track()
+    expected_df = pd.read_hdf(track_file)
+
+    clean_up(temp_dir)
+    os.makedirs(temp_dir, exist_ok=True)
+    analyse_frame = workflow.pt.analyse_frame
+    def interrupted(*args, **kwargs):
+        if interrupted.calls == 5:
+            raise KeyboardInterrupt
+        interrupted.calls += 1
+        return analyse_frame(*args, **kwargs)
+    interrupted.calls = 0
+    workflow.pt.analyse_frame = interrupted
+    try:
+        workflow.pt.track()
+    except KeyboardInterrupt:
+        pass
+    assert not os.path.exists(track_file), 'Error interrupted run should not create the track file'
+
+    workflow = PTWorkflow(video_filename="testdata/discs.mp4", param_filename=settings)
+    analyse_frame = workflow.pt.analyse_frame
+    frames_analysed = []
+    def counted(*args, **kwargs):
+        frames_analysed.append(kwargs['n'])
+        return analyse_frame(*args, **kwargs)
+    workflow.pt.analyse_frame = counted
+    workflow.pt.track()
+
+    assert frames_analysed == [5], frames_analysed
+    pd.testing.assert_frame_equal(pd.read_hdf(track_file), expected_df)
+
+    os.remove(settings)
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+
+def test_batch_manifest(monkeypatch):
+    """Test that batchprocess records a movie that fails as failed, processes the largest
+    movies first and skips movies already completed with the same settings when restarted.
+    Test uses: copies of discs
+    """
+    from particletracker.project import batch
+    batch_dir = "testdata/_batch"
+    settings = "testdata/_batch.param"
+    small, large = batch_dir + "/small.mp4", batch_dir + "/large.mp4"
+
+    clean_up(batch_dir)
+    os.makedirs(batch_dir, exist_ok=True)
+    shutil.copy("testdata/discs.mp4", small)
+    parameters = read_paramdict_file("testdata/test_discs.param")
+    parameters['config']['_frame_range'] = (0, 2, 1)
+    #No annotated movies to be picked up by the filter below
+    parameters['config']['video_output']['output'][0] = False
+
+    #medianblur needs an odd kernel
+    parameters['preprocess']['medianblur']['kernel'][0] = 4
+    write_paramdict_file(parameters, settings)
+    manifest = batchprocess(small, settings)
+    job = manifest.jobs[os.path.abspath(small)]
+    assert job['status'] == 'failed', 'Error movie that failed not recorded as failed'
+    assert 'medianblur' in job['error']
+
+    parameters['preprocess']['medianblur']['kernel'][0] = 5
+    write_paramdict_file(parameters, settings)
+    manifest = batchprocess(small, settings)
+    assert manifest.jobs[os.path.abspath(small)]['status'] == 'complete'
+
+    with open(large, 'wb') as f:
+        f.write(b'0' * (os.path.getsize(small) + 1))
+    processed = []
+    def fake_process_movie(filename, settings_filename):
+        processed.append(filename)
+        return {'status': 'complete', 'started': None, 'duration': 0, 'error': None}
+    monkeypatch.setattr(batch, 'process_movie', fake_process_movie)
+    batchprocess(batch_dir + "/*.mp4", settings)
+    assert processed == [large], 'Error completed movie not skipped on restart'
+
+    processed.clear()
+    os.remove(batch_dir + "/small.hdf5")
+    batchprocess(batch_dir + "/*.mp4", settings)
+    assert processed == [large, small], 'Error movies not processed largest first'
+
+    os.remove(settings)
+    shutil.rmtree(batch_dir)
+
+
+def test_final_data():
+    """Test that the final data file is linked rather than copied from _temp, has a checksum
+    file and is not changed when the _temp data is rewritten.
+    Test uses: eyes
+    """
+    import hashlib
+    from particletracker.general.dataframes import DataWrite
+    output_df = "testdata/eyes.hdf5"
+    output_video = "testdata/eyes_annotate.mp4"
+    temp_dir = "testdata/_temp"
+    postprocess_file = temp_dir + "/eyes_postprocess.hdf5"
+
+    clean_up(temp_dir)
+    batchprocess("testdata/eyes.mp4", "testdata/test_eyes.param")
+    assert os.path.samefile(output_df, postprocess_file), 'Error final data should be linked to the _temp data'
+    with open(output_df, 'rb') as f:
+        checksum = hashlib.sha256(f.read()).hexdigest()
+    with open(output_df + '.sha256') as f:
+        assert f.read() == f'{checksum}  eyes.hdf5\n'
+
+    expected_df = pd.read_hdf(output_df)
+    with DataWrite(postprocess_file) as store:
+        store.write_data(expected_df.iloc[0:0])
+    pd.testing.assert_frame_equal(pd.read_hdf(output_df), expected_df)
+
+    os.remove(output_video)
+    os.remove(output_df)
+    os.remove(output_df + '.sha256')
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+
+def test_parallel_annotation():
+    """Test that rendering the annotated movie with several worker processes gives the
+    same frames in the same order as a single process.
+    Test uses: eyes with trajectories
+    """
+    import cv2
+    output_df = "testdata/eyes.hdf5"
+    output_video = "testdata/eyes_annotate.mp4"
+    settings = "testdata/_parallel.param"
+    temp_dir = "testdata/_temp"
+
+    parameters = read_paramdict_file("testdata/test_eyes.param")
+    parameters['config']['_frame_range'] = (0, 20, 1)
+    parameters['annotate']['annotate_method'] = ('circles', 'trajectories')
+
+    videos = []
+    for workers in (1, 2):
+        clean_up(temp_dir)
+        parameters['config']['_annotate_workers'] = workers
+        write_paramdict_file(parameters, settings)
+        batchprocess("testdata/eyes.mp4", settings)
+        cap = cv2.VideoCapture(output_video)
+        frames = []
+        ret, frame = cap.read()
+        while ret:
+            frames.append(frame)
+            ret, frame = cap.read()
+        cap.release()
+        videos.append(frames)
+
+    assert len(videos[0]) == 20, 'Error annotated video has wrong number of frames'
+    assert all((frame1 == frame2).all() for frame1, frame2 in zip(*videos)), 'Error parallel annotation differs'
+
+    os.remove(settings)
+    os.remove(output_video)
+    os.remove(output_df)
+    os.remove(output_df + '.sha256')
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+
+def test_render_at_scale():
+    """Test that annotating at the output scale gives a video the same size as annotating
+    at full size and shrinking each frame when it is written, with only small differences
+    due to the lines being drawn after rather than before shrinking.
+    Test uses: eyes with circles and particle labels at 50% scale
+    """
+    import cv2
+    import numpy as np
+    output_df = "testdata/eyes.hdf5"
+    output_video = "testdata/eyes_annotate.mp4"
+    settings = "testdata/_render_scale.param"
+    temp_dir = "testdata/_temp"
+
+    parameters = read_paramdict_file("testdata/test_eyes.param")
+    parameters['config']['_frame_range'] = (0, 5, 1)
+    parameters['config']['video_output']['scale'] = 50
+    parameters['config']['video_output']['encoder'] = ['labvision', ('labvision', 'ffmpeg', 'opencv', 'png', 'tiff', 'overlay')]
+    parameters['annotate']['annotate_method'] = ('circles', 'particle_labels')
+
+    videos = []
+    for render_at_scale in (False, True):
+        clean_up(temp_dir)
+        parameters['config']['_render_at_scale'] = render_at_scale
+        write_paramdict_file(parameters, settings)
+        batchprocess("testdata/eyes.mp4", settings)
+        cap = cv2.VideoCapture(output_video)
+        frames = []
+        ret, frame = cap.read()
+        while ret:
+            frames.append(frame.astype(int))
+            ret, frame = cap.read()
+        cap.release()
+        videos.append(frames)
+
+    height, width = PTWorkflow(video_filename="testdata/eyes.mp4", param_filename=settings).frame.shape[:2]
+    assert len(videos[1]) == 5, 'Error annotated video has wrong number of frames'
+    #The codec may round the size down to an even number of pixels
+    assert all(abs(frame.shape[0] - height // 2) <= 1 and abs(frame.shape[1] - width // 2) <= 1
+               for frame in videos[0] + videos[1]), 'Error video not at output scale'
+    assert all(frame1.shape == frame2.shape for frame1, frame2 in zip(*videos)), 'Error video not at output scale'
+    assert all(np.mean(np.abs(frame1 - frame2)) < 10 for frame1, frame2 in zip(*videos)), 'Error scaled annotation differs'
+
+    os.remove(settings)
+    os.remove(output_video)
+    os.remove(output_df)
+    os.remove(output_df + '.sha256')
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+
+def test_video_encoders():
+    """Test that the annotated movie can be written by each of the encoders. 
+    Test uses: eyes with circles and ffmpeg, opencv and png encoders
+    """
+    import cv2
+    output_df = "testdata/eyes.hdf5"
+    output_video = "testdata/eyes_annotate.mp4"
+    output_folder = "testdata/eyes_annotate"
+    settings = "testdata/_encoders.param"
+    temp_dir = "testdata/_temp"
+
+    parameters = read_paramdict_file("testdata/test_eyes.param")
+    parameters['config']['_frame_range'] = (0, 10, 1)
+    parameters['config']['video_output']['preset'] = 'ultrafast'
+    parameters['annotate']['annotate_method'] = ('circles',)
+
+    for encoder in ('ffmpeg', 'opencv'):
+        clean_up(temp_dir)
+        parameters['config']['video_output']['encoder'] = encoder
+        write_paramdict_file(parameters, settings)
+        batchprocess("testdata/eyes.mp4", settings)
+        cap = cv2.VideoCapture(output_video)
+        num_frames = 0
+        while cap.read()[0]:
+            num_frames += 1
+        cap.release()
+        assert num_frames == 10, f'Error {encoder} video has wrong number of frames'
+        os.remove(output_video)
+
+    clean_up(temp_dir)
+    parameters['config']['video_output']['encoder'] = 'png'
+    write_paramdict_file(parameters, settings)
+    batchprocess("testdata/eyes.mp4", settings)
+    assert len(os.listdir(output_folder)) == 10, 'Error png sequence has wrong number of frames'
+    assert cv2.imread(os.path.join(output_folder, 'frame_000000.png')) is not None, 'Error png sequence not readable'
+
+    os.remove(settings)
+    os.remove(output_df)
+    os.remove(output_df + '.sha256')
+    shutil.rmtree(output_folder)
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+
+def test_overlay_export():
+    """Test that drawing the shapes recorded in an overlay file over the movie frames
+    gives the same frames as annotating them directly.
+    Test uses: eyes with circles, particle_labels and trajectories
+    """
+    import cv2
+    from particletracker.crop import ReadCropVideo
+    from particletracker.annotate.overlay import Overlay
+    output_df = "testdata/eyes.hdf5"
+    output_overlay = "testdata/eyes_overlay.hdf5"
+    output_folder = "testdata/eyes_annotate"
+    settings = "testdata/_overlay.param"
+    temp_dir = "testdata/_temp"
+
+    parameters = read_paramdict_file("testdata/test_eyes.param")
+    parameters['config']['_frame_range'] = (0, 10, 1)
+    parameters['annotate']['annotate_method'] = ('circles', 'particle_labels', 'trajectories')
+
+    for encoder in ('png', 'overlay'):
+        clean_up(temp_dir)
+        parameters['config']['video_output']['encoder'] = encoder
+        write_paramdict_file(parameters, settings)
+        batchprocess("testdata/eyes.mp4", settings)
+
+    overlay = Overlay(output_overlay)
+    cap = ReadCropVideo(parameters=parameters, filename="testdata/eyes.mp4")
+    for f in range(10):
+        frame = overlay.draw(cap.read_frame(n=f), f)
+        annotated = cv2.imread(os.path.join(output_folder, f'frame_{f:06d}.png'))
+        assert (frame == annotated).all(), 'Error overlay differs from annotated frame'
+
+    os.remove(settings)
+    os.remove(output_df)
+    os.remove(output_df + '.sha256')
+    os.remove(output_overlay)
+    shutil.rmtree(output_folder)
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+
 """------------------------------------------------------------------------------------------
 These tests attempt to check all the methods in one section
 ------------------------------------------------------------------------------------------"""
@@ -32,6 +32,162 @@ def test_network_methods():
     assert int(100*df.loc[0,'hexatic_order_phase'].to_numpy()[3]) == int(18.2519), int(100*df.loc[0,'hexatic_order_phase'].to_numpy()[3])
 
     os.remove(output_df)
+
+    os.remove(output_df + '.sha256')
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+def test_read_columns():
+    """Testing that only the columns needed are loaded from a postprocessed file
+
+    Uses hydrogel which has large voronoi and neighbours columns
+
+    """
+    from particletracker.general.dataframes import read_columns, required_columns
+    from particletracker.general.writeread_param_dict import read_paramdict_file
+    from particletracker.annotate import annotation_methods as am
+    output_df = "testdata/hydrogel.hdf5"
+    temp_dir = "testdata/_temp"
+
+    clean_up(temp_dir)
+
+    batchprocess("testdata/hydrogel.mp4", "testdata/test_networks.param")
+
+    parameters = read_paramdict_file("testdata/test_networks.param")
+    parameters['annotate']['annotate_method'] = ('circles', 'trajectories')
+    columns = required_columns(am, parameters, 'annotate')
+    assert columns == ['particle', 'r', 'x', 'y'], columns
+    parameters['annotate']['annotate_method'] = ('networks',)
+    assert 'neighbours' in required_columns(am, parameters, 'annotate')
+
+    df = pd.read_hdf(output_df)
+    df_columns = read_columns(output_df, columns=['x', 'y', 'particle', 'not_a_column'])
+    assert list(df_columns.columns) == [column for column in df.columns if column in ('x', 'y', 'particle')], df_columns.columns
+    pd.testing.assert_frame_equal(df_columns, df[df_columns.columns])
+
+    os.remove(output_df)
+
+    os.remove(output_df + '.sha256')
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+def test_parquet_format():
+    """Testing that data stored in the parquet format matches the hdf5 data
+
+    Uses hydrogel which has object columns (voronoi, neighbours) that must be pickled
+
+    """
+    from particletracker.general.dataframes import read_columns, read_fingerprint, data_format_of, parquet_path
+    from particletracker.general.writeread_param_dict import read_paramdict_file, write_paramdict_file
+    output_df = "testdata/hydrogel.hdf5"
+    settings = "testdata/_parquet.param"
+    temp_dir = "testdata/_temp"
+
+    clean_up(temp_dir)
+    batchprocess("testdata/hydrogel.mp4", "testdata/test_networks.param")
+    expected_df = pd.read_hdf(output_df)
+    os.remove(output_df)
+    os.remove(output_df + '.sha256')
+
+    parameters = read_paramdict_file("testdata/test_networks.param")
+    parameters['config']['_data_format'] = 'parquet'
+    write_paramdict_file(parameters, settings)
+    clean_up(temp_dir)
+    batchprocess("testdata/hydrogel.mp4", settings)
+
+    assert not os.path.exists(output_df)
+    assert data_format_of(output_df) == 'parquet'
+    assert read_fingerprint(temp_dir + "/hydrogel_postprocess.hdf5") is not None
+    df = read_columns(output_df)
+    assert list(df.columns) == list(expected_df.columns)
+    pd.testing.assert_frame_equal(df.drop(columns=['voronoi', 'neighbours']),
+                                  expected_df.drop(columns=['voronoi', 'neighbours']), check_dtype=False)
+    assert all(np.array_equal(a, b) for a, b in zip(df['neighbours'], expected_df['neighbours']))
+
+    frames = read_columns(output_df, columns=['x', 'y'], frames=(2, 3))
+    pd.testing.assert_frame_equal(frames, expected_df.loc[2:3, ['x', 'y']], check_dtype=False)
+
+    os.remove(settings)
+    shutil.rmtree(parquet_path(output_df))
+    os.remove(parquet_path(output_df) + '.sha256')
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+def test_compact_dtypes():
+    """Testing that data is stored with the compact column types if asked and matches the full precision data
+
+    Uses hydrogel which has hexatic_order stored as python objects without the schema
+
+    """
+    from particletracker.general.writeread_param_dict import read_paramdict_file, write_paramdict_file
+    output_df = "testdata/hydrogel.hdf5"
+    settings = "testdata/_compact.param"
+    temp_dir = "testdata/_temp"
+
+    parameters = read_paramdict_file("testdata/test_networks.param")
+    parameters['config']['_compact_dtypes'] = True
+    write_paramdict_file(parameters, settings)
+    clean_up(temp_dir)
+    batchprocess("testdata/hydrogel.mp4", settings)
+    df = pd.read_hdf(output_df)
+    #The contours method finds integer positions
+    assert df['x'].dtype == np.int32
+    assert df['particle'].dtype == np.int32
+    assert df['hexatic_order_complex'].dtype == np.complex64
+    assert df['hexatic_order_magnitude'].dtype == np.float32
+
+    #Each project keeps its own settings, the default is the data as it is
+    from particletracker.general.dataframes import DataManager
+    compact, default = DataManager(output_df, compact_dtypes=True, hdf5_profile='small'), DataManager(output_df)
+    assert compact.storage.compact_dtypes and not default.storage.compact_dtypes
+    assert compact.storage.backend.complib == 'zlib' and default.storage.backend.complib is None
+
+    clean_up(temp_dir)
+    batchprocess("testdata/hydrogel.mp4", "testdata/test_networks.param")
+    wide_df = pd.read_hdf(output_df)
+    assert wide_df['x'].dtype == np.int64
+    assert np.array_equal(df['x'], wide_df['x'])
+    assert np.array_equal(df['particle'], wide_df['particle'])
+    assert np.allclose(df['hexatic_order_complex'], wide_df['hexatic_order_complex'].astype(complex), atol=1e-5)
+
+    os.remove(settings)
+    os.remove(output_df)
+    os.remove(output_df + '.sha256')
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+def test_hdf5_profiles():
+    """Testing that data written with the compressed and table hdf5 profiles matches the default
+
+    Uses eyes which has no object columns so can be stored as a table
+
+    """
+    from particletracker.general.dataframes import read_columns
+    from particletracker.general.writeread_param_dict import read_paramdict_file, write_paramdict_file
+    output_df = "testdata/eyes.hdf5"
+    settings = "testdata/_profile.param"
+    temp_dir = "testdata/_temp"
+
+    clean_up(temp_dir)
+    batchprocess("testdata/eyes.mp4", "testdata/test_rolling.param")
+    expected_df = pd.read_hdf(output_df)
+
+    parameters = read_paramdict_file("testdata/test_rolling.param")
+    for profile in ('small', 'table', {'complib': 'blosc:zstd', 'complevel': 3, 'format': 'table', 'chunk_frames': 2}):
+        parameters['config']['_hdf5_profile'] = profile
+        write_paramdict_file(parameters, settings)
+        clean_up(temp_dir)
+        batchprocess("testdata/eyes.mp4", settings)
+        pd.testing.assert_frame_equal(pd.read_hdf(output_df), expected_df)
+        with pd.HDFStore(output_df, 'r') as store:
+            assert store.get_storer('data').is_table == (profile != 'small')
+        frames = read_columns(output_df, columns=['x', 'particle'], frames=(2, 3))
+        pd.testing.assert_frame_equal(frames, expected_df.loc[2:3, frames.columns])
+        assert sorted(frames.columns) == ['particle', 'x']
+
+    os.remove(settings)
+    os.remove(output_df)
+    os.remove(output_df + '.sha256')
     if os.path.exists(temp_dir):
         shutil.rmtree(temp_dir)
 
@@ -57,5 +213,28 @@ def test_rolling_methods():
     assert df.loc[3,'vx'].to_numpy()[0] == np.float32(100.0), df.loc[3,'vx'].to_numpy()[0]
 
     os.remove(output_df)
+
+    os.remove(output_df + '.sha256')
     if os.path.exists(temp_dir):
-        shutil.rmtree(temp_dir)
\ No newline at end of file
+        shutil.rmtree(temp_dir)
+
+def test_frame_slicer():
+    """Testing that slicing frames with FrameSlicer gives the same rows as df.loc
+
+    Uses a small unsorted dataframe with a missing frame and a frame with a single row
+
+    """
+    from particletracker.general.dataframes import FrameSlicer
+    df = pd.DataFrame({'x': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0], 'particle': [0, 1, 2, 3, 4, 5]},
+                      index=pd.Index([3, 0, 0, 3, 1, 3], name='frame'))
+    frames_df = FrameSlicer(df)
+
+    for f in (0, 1, 3):
+        pd.testing.assert_frame_equal(frames_df.frame(f), df.sort_index(kind='stable').loc[[f]])
+    assert len(frames_df.frame(1)) == 1
+    for f in (-1, 2, 4):
+        missing = frames_df.frame(f)
+        assert missing.empty and list(missing.columns) == list(df.columns), f
+
+    pd.testing.assert_frame_equal(frames_df.window(1, 3), df.sort_index(kind='stable').loc[1:3])
+    pd.testing.assert_frame_equal(frames_df.window(2, 2), df.iloc[0:0])
@@ -80,5 +80,183 @@ def test_preprocess():
     
     os.remove(output_video)
     os.remove(output_df)
+    os.remove(output_df + '.sha256')
     if os.path.exists(temp_dir):
-        shutil.rmtree(temp_dir)
\ No newline at end of file
+        shutil.rmtree(temp_dir)
+
+def test_compiled_methods():
+    """Testing that the compiled preprocessing methods match calling each method in turn
+    and are recompiled when a parameter is changed in place as the gui does"""
+    from particletracker.general.parameters import get_method_name, parameters_changed
+    from particletracker.general.writeread_param_dict import read_paramdict_file
+    from particletracker.preprocess import Preprocessor
+
+    parameters = read_paramdict_file("testdata/test_preprocess.param")
+    parameters['preprocess']['preprocess_method'] = ('grayscale', 'blur', 'medianblur', 'gamma', 'threshold', 'dilation')
+    img = cv2.imread("testdata/bkg_test.png")
+
+    def uncompiled(frame):
+        for method in parameters['preprocess']['preprocess_method']:
+            method_name, call_num = get_method_name(method)
+            frame = getattr(pm, method_name)(frame, parameters=parameters, call_num=call_num, section='preprocess')
+        return frame
+
+    ip = Preprocessor(parameters)
+    assert np.array_equal(ip.process(img), uncompiled(img))
+    compiled = ip.methods.compile(parameters)
+    assert ip.methods.compile(parameters) is compiled
+
+    parameters['preprocess']['threshold']['threshold'][0] = 50
+    parameters_changed()
+    assert np.array_equal(ip.process(img), uncompiled(img))
+    assert ip.methods.compile(parameters) is not compiled
+
+    with ip.fixed():
+        compiled = ip.methods.compile(parameters)
+        parameters['preprocess']['threshold']['threshold'][0] = 100
+        parameters_changed()
+        assert ip.methods.compile(parameters) is compiled
+    assert ip.methods.compile(parameters) is not compiled
+    compiled = ip.methods.compile(parameters)
+    assert ip.methods.compile(dict(parameters)) is not compiled
+
+
+def test_preprocess_buffers():
+    """Testing that preprocessing into reused buffers gives the same images as allocating them"""
+    from particletracker.general.writeread_param_dict import read_paramdict_file
+    from particletracker.preprocess import Preprocessor
+
+    parameters = read_paramdict_file("testdata/test_preprocess.param")
+    parameters['preprocess']['subtract_bkg'] = {'subtract_bkg_type': ['median', ('mean', 'median', 'grayscale', 'red', 'green', 'blue')],
+                                                'subtract_bkg_filename': None,
+                                                'subtract_bkg_blur_kernel': [3, 1, 15, 2],
+                                                'subtract_bkg_invert': [False, ('True', 'False')],
+                                                'subtract_bkg_norm': [True, ('True', 'False')]
+                                                }
+    parameters['preprocess']['preprocess_method'] = ('grayscale', 'invert', 'subtract_bkg', 'invert', 'threshold', 'distance', 'invert')
+    imgs = [cv2.imread("testdata/bkg_test.png"), np.zeros((20, 30, 3), dtype=np.uint8)]
+
+    ip = Preprocessor(parameters)
+    expected = [ip.process(img).copy() for img in imgs]
+    with ip.fixed():
+        for img, expected_img in zip(imgs * 2, expected * 2):
+            assert np.array_equal(ip.process(img), expected_img)
+        assert ip.process(imgs[0]) is ip.process(imgs[0])
+
+
+def test_tiled_preprocess():
+    """Testing that preprocessing a frame in strips on several threads gives the same image as the whole frame"""
+    from particletracker.general.writeread_param_dict import read_paramdict_file
+    from particletracker.preprocess import Preprocessor
+    from particletracker.preprocess.tiles import split_methods
+
+    parameters = read_paramdict_file("testdata/test_preprocess.param")
+    parameters['preprocess']['preprocess_method'] = ('grayscale', 'blur', 'medianblur', 'gamma', 'adaptive_threshold',
+                                                     'erosion', 'dilation', 'distance', 'threshold', 'fill_holes', 'invert')
+    img = np.concatenate([cv2.imread("testdata/bkg_test.png")] * 4)
+
+    ip = Preprocessor(parameters)
+    expected = ip.process(img)
+    runs = split_methods(ip.methods.compile(parameters), parameters)
+    assert [halo for _, halo in runs] == [2 + 1 + 36 + 10 + 2, None, 0, None, 0]
+
+    parameters['config']['_preprocess_tiles'] = 4
+    assert np.array_equal(ip.process(img), expected)
+    with ip.fixed():
+        assert np.array_equal(ip.process(img), expected)
+    #Too small to tile
+    assert np.array_equal(ip.process(img[:200]), Preprocessor({**parameters, 'config': {}}).process(img[:200]))
+
+
+def test_subtract_rolling_bkg():
+    """Testing that the rolling background of a single frame is the same as when the whole movie is tracked
+
+    Uses eyes with a median rolling background
+    """
+    from particletracker.project import PTWorkflow
+    from particletracker.general.writeread_param_dict import read_paramdict_file, write_paramdict_file
+    settings = "testdata/_rolling_bkg.param"
+    temp_dir = "testdata/_temp"
+    track_file = temp_dir + "/eyes_track.hdf5"
+
+    clean_up(temp_dir)
+    parameters = read_paramdict_file("testdata/test_eyes.param")
+    parameters['preprocess']['preprocess_method'] = ('grayscale', 'subtract_rolling_bkg', 'medianblur')
+    parameters['preprocess']['subtract_rolling_bkg'] = {'window': [4, 2, 200, 1],
+                                                        'bkg_type': ['median', ('mean', 'median')],
+                                                        'invert': [True, ('True', 'False')],
+                                                        'norm': [True, ('True', 'False')]}
+    write_paramdict_file(parameters, settings)
+
+    workflow = PTWorkflow(video_filename="testdata/eyes.mp4", param_filename=settings)
+    os.makedirs(temp_dir, exist_ok=True)
+    workflow.pt.track()
+    df = pd.read_hdf(track_file)
+    for f in (0, 2, 5):
+        single_df = workflow.pt.track(f_index=f)
+        pd.testing.assert_frame_equal(single_df, df.loc[[f]], check_dtype=False)
+
+    frames = [workflow.cap.read_frame(n=f) for f in range(6)]
+    with workflow.ip.fixed():
+        expected = [workflow.ip.process(frame).copy() for frame in frames]
+    assert np.array_equal(workflow.ip.process(frames[5], previous_frames=lambda num_frames: frames[5 - num_frames:5]), expected[5])
+
+    os.remove(settings)
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+
+
+def test_rolling_bkg_resume():
+    """Testing that tracking with a rolling background which is interrupted and resumed from 
+    a checkpoint gives the same data as an uninterrupted run
+
+    Uses eyes with a median rolling background
+    """
+    from particletracker.project import PTWorkflow
+    from particletracker.general.writeread_param_dict import read_paramdict_file, write_paramdict_file
+    settings = "testdata/_rolling_bkg.param"
+    temp_dir = "testdata/_temp"
+    track_file = temp_dir + "/eyes_track.hdf5"
+
+    clean_up(temp_dir)
+    parameters = read_paramdict_file("testdata/test_eyes.param")
+    parameters['config']['_frame_range'] = (0, 10, 1)
+    parameters['config']['_checkpoint_interval'] = 2
+    parameters['preprocess']['preprocess_method'] = ('grayscale', 'subtract_rolling_bkg', 'medianblur')
+    parameters['preprocess']['subtract_rolling_bkg'] = {'window': [4, 2, 200, 1],
+                                                        'bkg_type': ['median', ('mean', 'median')],
+                                                        'invert': [True, ('True', 'False')],
+                                                        'norm': [True, ('True', 'False')]}
+    write_paramdict_file(parameters, settings)
+
+    workflow = PTWorkflow(video_filename="testdata/eyes.mp4", param_filename=settings)
+    os.makedirs(temp_dir, exist_ok=True)
+    workflow.pt.track()
+    expected_df = pd.read_hdf(track_file)
+
+    #Resumed part way through and, without the first chunk, with a gap in the frames left to track
+    for remove_first_chunk in (False, True):
+        clean_up(temp_dir)
+        os.makedirs(temp_dir, exist_ok=True)
+        workflow = PTWorkflow(video_filename="testdata/eyes.mp4", param_filename=settings)
+        analyse_frame = workflow.pt.analyse_frame
+        def interrupted(*args, **kwargs):
+            if kwargs['n'] == 5:
+                raise KeyboardInterrupt
+            return analyse_frame(*args, **kwargs)
+        workflow.pt.analyse_frame = interrupted
+        try:
+            workflow.pt.track()
+        except KeyboardInterrupt:
+            pass
+        if remove_first_chunk:
+            checkpoint_folder = temp_dir + "/eyes_track_checkpoints/"
+            os.remove(checkpoint_folder + sorted(os.listdir(checkpoint_folder))[0])
+
+        workflow = PTWorkflow(video_filename="testdata/eyes.mp4", param_filename=settings)
+        workflow.pt.track()
+        pd.testing.assert_frame_equal(pd.read_hdf(track_file), expected_df)
+
+    os.remove(settings)
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)